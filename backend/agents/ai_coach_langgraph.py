@@ -586,13 +586,18 @@ def _connect_spending_goals(state: CoachState) -> CoachState:
 
 def _fetch_anomalies(state: CoachState) -> CoachState:
     try:
-        alerts_ref = db.collection('users').document(state.get('user_id')).collection('alerts')
-        docs = alerts_ref.order_by('created_at', direction=firestore.Query.DESCENDING).limit(50).stream()
-        alerts = []
-        for doc in docs:
-            a = doc.to_dict()
-            a['alert_id'] = doc.id
-            alerts.append(a)
+        user_ref = db.collection('users').document(state.get('user_id'))
+        # Newest alerts are materialized in one snapshot doc by the anomaly agent
+        snapshot = user_ref.collection('snapshots').document('alerts').get()
+        if snapshot.exists:
+            alerts = snapshot.to_dict().get('alerts', [])
+        else:
+            docs = user_ref.collection('alerts').order_by('created_at', direction=firestore.Query.DESCENDING).limit(50).stream()
+            alerts = []
+            for doc in docs:
+                a = doc.to_dict()
+                a['alert_id'] = doc.id
+                alerts.append(a)
         by_severity: Dict[str, int] = {}
         by_type: Dict[str, int] = {}
         for a in alerts:
@@ -737,11 +742,18 @@ def _write_memory(state: CoachState) -> CoachState:
     try:
         if memory_client:
             response = json.dumps(state.get('coach_response', {}))
-            memory_client.add_coaching_session(user_id=state.get('user_id'), query=state.get('user_query'), response=response, session_id=f"coach_session_{datetime.now().strftime('%Y%m%d')}", agent_id="financial_coach_meta_agent", metadata={"session_type": "financial_coaching", "timestamp": datetime.now().isoformat(), "query_type": "general"}, infer=True)
+            # Queued rather than awaited so the reply is not held up by Mem0's
+            # inference; flush_memory() sends anything left on shutdown
+            memory_client.queue_coaching_session(user_id=state.get('user_id'), query=state.get('user_query'), response=response, session_id=f"coach_session_{datetime.now().strftime('%Y%m%d')}", agent_id="financial_coach_meta_agent", metadata={"session_type": "financial_coaching", "timestamp": datetime.now().isoformat(), "query_type": "general"}, infer=True)
     except Exception as e:
         state.setdefault('errors', []).append(str(e))
     return state
 
+def flush_memory() -> None:
+    """Send coaching sessions still queued for Mem0; called on app shutdown."""
+    if memory_client:
+        memory_client.flush()
+
 def build_coach_pipeline():
     """
     Manual orchestration of the financial coaching pipeline using AI agents.
@@ -8,6 +8,7 @@ from crewai.tools import BaseTool
 from crewai.project import CrewBase, agent, task, crew
 from typing import Type
 import os
+from google.api_core.exceptions import AlreadyExists
 from datetime import datetime
 # Load environment variables from .env file
 load_dotenv()
@@ -26,6 +27,41 @@ if not firebase_admin._apps:
 
 db = firestore.client()
 
+# Newest alerts kept in the users/{id}/snapshots/alerts doc, so readers
+# fetch one document instead of streaming the alerts collection
+ALERTS_SNAPSHOT_SIZE = 50
+
+
+@firestore.transactional
+def _add_user_alert(transaction, user_id: str, alert_data: dict, alert_id: str = None) -> None:
+    """
+    Create a user alert and prepend it to the alerts snapshot in one transaction.
+
+    With an alert_id the write is idempotent: if that alert already exists
+    nothing is written, so a re-run for the same event adds no duplicate.
+    """
+    user_ref = db.collection('users').document(user_id)
+    alerts_ref = user_ref.collection('alerts')
+    snapshot_ref = user_ref.collection('snapshots').document('alerts')
+    alert_ref = alerts_ref.document(alert_id) if alert_id else alerts_ref.document()
+
+    if alert_id and alert_ref.get(transaction=transaction).exists:
+        return
+
+    snapshot = snapshot_ref.get(transaction=transaction)
+    if snapshot.exists:
+        alerts = snapshot.to_dict().get('alerts', [])
+    else:
+        # First snapshot for this user: seed it from the existing alerts
+        query = alerts_ref.order_by('created_at', direction=firestore.Query.DESCENDING).limit(ALERTS_SNAPSHOT_SIZE)
+        alerts = [{**doc.to_dict(), 'alert_id': doc.id} for doc in transaction.get(query)]
+
+    transaction.set(alert_ref, alert_data)
+    transaction.set(snapshot_ref, {
+        'alerts': [{**alert_data, 'alert_id': alert_ref.id}] + alerts[:ALERTS_SNAPSHOT_SIZE - 1],
+        'updated_at': datetime.now().isoformat()
+    })
+
 # API Key rotation for rate limiting
 API_KEYS = [
     os.getenv("GEMINI_API_KEY"),
@@ -111,10 +147,22 @@ class AddAnomalyTool(BaseTool):
     args_schema: Type[BaseModel] = AddAnomalyInput
 
     def _run(self, user_id: str, transaction_id: str, anomaly_details: dict) -> dict:
-        """Add anomaly to Firestore."""
+        """
+        Add anomaly to Firestore.
+
+        Documents are keyed on the transaction ID, so when the monitor
+        re-processes a transaction (after a failed categorization or a 429)
+        the anomaly and its alerts are not written a second time.
+        """
         try:
             # Add to anomalies collection under user
-            anomaly_ref = db.collection('users').document(user_id).collection('anomalies').document()
+            anomaly_ref = db.collection('users').document(user_id).collection('anomalies').document(transaction_id)
+            if anomaly_ref.get().exists:
+                print(f"ℹ️  Anomaly already recorded for transaction {transaction_id}")
+                return {
+                    "success": True,
+                    "message": "Anomaly already recorded"
+                }
             anomaly_data = {
                 'user_id': user_id,
                 'transaction_id': transaction_id,
@@ -126,10 +174,9 @@ class AddAnomalyTool(BaseTool):
                 'email_sent': anomaly_details.get('email_sent', False),
                 **anomaly_details
             }
-            anomaly_ref.set(anomaly_data)
 
             # Add to alerts collection top level
-            alert_ref = db.collection('alerts').document()
+            alert_ref = db.collection('alerts').document(f"anomaly_{user_id}_{transaction_id}")
             alert_data = {
                 'user_id': user_id,
                 'type': 'anomaly',
@@ -140,10 +187,12 @@ class AddAnomalyTool(BaseTool):
                 'email_content': anomaly_details.get('email_content', ''),
                 'email_sent': anomaly_details.get('email_sent', False)
             }
-            alert_ref.set(alert_data)
+            try:
+                alert_ref.create(alert_data)
+            except AlreadyExists:
+                pass
             
             # Add to alerts collection under user
-            alert_ref = db.collection('users').document(user_id).collection('alerts').document()
             alert_data = {
                 'user_id': user_id,
                 'type': 'anomaly',
@@ -154,7 +203,10 @@ class AddAnomalyTool(BaseTool):
                 'email_content': anomaly_details.get('email_content', ''),
                 'email_sent': anomaly_details.get('email_sent', False)
             }
-            alert_ref.set(alert_data)
+            _add_user_alert(db.transaction(), user_id, alert_data, f"anomaly_{transaction_id}")
+
+            # Written last, so a run that failed part-way is completed on retry
+            anomaly_ref.set(anomaly_data)
             
             print(f"✅ Anomaly and alert added to Firestore for transaction {transaction_id}")
             return {
@@ -1,7 +1,14 @@
 import os
 import asyncio
+import functools
+import itertools
 import json
+import logging
+import queue
 import re
+import threading
+import time
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Dict, Any, List
 from dotenv import load_dotenv
@@ -10,28 +17,119 @@ from crewai.tools import BaseTool
 from pydantic import BaseModel, Field, ValidationError
 from typing import Type
 from crewai.project import CrewBase, agent, task, crew
-from crewai_tools import SerperDevTool
-from firebase_admin import firestore
-import firebase_admin
-from firebase_admin import credentials
+from google.api_core.exceptions import ResourceExhausted, RetryError
 from pydantic import BaseModel
 
-# Load environment variables from .env file
-load_dotenv()
+try:
+    from litellm.exceptions import RateLimitError
+except ImportError:
+    RateLimitError = None
 
-# Initialize Firebase if not already initialized
-if not firebase_admin._apps:
-    try:
-        cred_path = os.path.join(os.path.dirname(__file__), '..', 'mumbaihacks-63c0c-firebase-adminsdk-fbsvc-a7a6cd0780.json')
-        if os.path.exists(cred_path):
-            cred = credentials.Certificate(cred_path)
-            firebase_admin.initialize_app(cred)
+from transaction_fields import normalize_merchant
+
+logger = logging.getLogger(__name__)
+
+# Load environment variables from .env file (skipped when the env is already populated)
+if not os.getenv("GEMINI_API_KEY"):
+    load_dotenv()
+
+_db_client = None
+
+def _db():
+    """Initialize Firebase and the Firestore client on first use, not at import."""
+    global _db_client
+    if _db_client is None:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        if not firebase_admin._apps:
+            try:
+                cred_path = os.path.join(os.path.dirname(__file__), '..', 'mumbaihacks-63c0c-firebase-adminsdk-fbsvc-a7a6cd0780.json')
+                if os.path.exists(cred_path):
+                    cred = credentials.Certificate(cred_path)
+                    firebase_admin.initialize_app(cred)
+                else:
+                    firebase_admin.initialize_app()
+            except Exception as e:
+                logger.exception("Firebase initialization error: %s", e)
+        _db_client = firestore.client()
+    return _db_client
+
+# Categorization updates share WriteBatch commits: up to UPDATE_BATCH_SIZE
+# writes gathered for at most UPDATE_FLUSH_INTERVAL seconds
+UPDATE_BATCH_SIZE = 500
+UPDATE_FLUSH_INTERVAL = 1.0
+
+# Seconds submit() waits for its batch before giving up on the update
+UPDATE_RESULT_TIMEOUT = 30.0
+
+class _UpdateBatcher:
+    """
+    Background thread that commits queued transaction updates together.
+
+    submit() blocks until the batch holding its update is committed, so
+    callers still see write errors, but concurrent categorizations share
+    one commit RPC instead of paying for one each.
+    """
+
+    def __init__(self):
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, ref, updates: dict) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="categorization-updates", daemon=True)
+                self._thread.start()
+        future: Future = Future()
+        self._queue.put((ref, updates, future))
+        future.result(timeout=UPDATE_RESULT_TIMEOUT)
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + UPDATE_FLUSH_INTERVAL
+            while len(items) < UPDATE_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            try:
+                self._commit(items)
+            except Exception as e:
+                # Keep the thread alive; fail whatever this round left pending
+                logger.exception("Error committing categorization updates: %s", e)
+                for _, _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, items):
+        try:
+            batch = _db().batch()
+            for ref, updates, _ in items:
+                batch.update(ref, updates)
+            batch.commit()
+        except Exception:
+            # One bad update fails the whole batch (or could not be added to
+            # it); apply them one by one so the rest still land and each
+            # caller gets its own error
+            for ref, updates, future in items:
+                try:
+                    ref.update(updates)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(None)
         else:
-            firebase_admin.initialize_app()
-    except Exception as e:
-        print(f"Firebase initialization error: {e}")
+            for _, _, future in items:
+                future.set_result(None)
 
-db = firestore.client()
+_update_batcher = _UpdateBatcher()
 
 # API Key rotation for rate limiting
 API_KEYS = [
@@ -41,21 +139,24 @@ API_KEYS = [
     os.getenv("GEMINI_API_KEY4")
 ]
 API_KEYS = [key for key in API_KEYS if key]  # Filter out None values
-current_api_key_index = 0
+
+# itertools.cycle + lock so concurrent callers never hand out the same key twice
+_KEY_CYCLE = itertools.cycle(API_KEYS)
+_KEY_LOCK = threading.Lock()
+_current_api_key = next(_KEY_CYCLE) if API_KEYS else None
 
 def get_next_api_key():
     """Rotate to next available API key."""
-    global current_api_key_index
+    global _current_api_key
     if not API_KEYS:
         return None
-    current_api_key_index = (current_api_key_index + 1) % len(API_KEYS)
-    return API_KEYS[current_api_key_index]
+    with _KEY_LOCK:
+        _current_api_key = next(_KEY_CYCLE)
+        return _current_api_key
 
 def get_current_api_key():
     """Get current API key."""
-    if not API_KEYS:
-        return None
-    return API_KEYS[current_api_key_index]
+    return _current_api_key
 
 
 REQUIRED_RESULT_FIELDS = {
@@ -145,17 +246,44 @@ def _extract_structured_output(raw_output: Any) -> Dict[str, Any]:
     return {}
 
 
+_RATE_LIMIT_ERRORS = (ResourceExhausted, RateLimitError) if RateLimitError is not None else (ResourceExhausted,)
+
+
+def _is_rate_limit_error(exc: Exception) -> bool:
+    """
+    Detect quota/429 errors from LiteLLM or the Gemini client by type or HTTP
+    status, following the cause chain of errors CrewAI or a retry wrapper raised.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, _RATE_LIMIT_ERRORS) or getattr(exc, 'status_code', None) == 429:
+            return True
+        if isinstance(exc, RetryError) and exc.cause is not None:
+            exc = exc.cause
+        else:
+            exc = exc.__cause__ or exc.__context__
+    return False
+
+
 def _is_valid_categorization_payload(data: Dict[str, Any]) -> bool:
     """Ensure parsed dict contains all mandatory categorization fields."""
     if not data:
         return False
     return all(field in data for field in REQUIRED_RESULT_FIELDS)
 
-llm = LLM(
-    model="gemini/gemini-2.5-flash-lite",
-    temperature=0.1,
-    api_key=get_current_api_key()
-)
+_llm = None
+
+def _get_llm(rotate: bool = False) -> LLM:
+    """Build the shared LLM lazily; `rotate=True` rebuilds it on the next API key."""
+    global _llm
+    if _llm is None or rotate:
+        _llm = LLM(
+            model="gemini/gemini-2.5-flash-lite",
+            temperature=0.1,
+            api_key=get_next_api_key() if rotate else get_current_api_key()
+        )
+    return _llm
 
 # MISTRAL_API_KEY=os.getenv("MISTRAL_API_KEY"),
 # llm = LLM(
@@ -188,14 +316,14 @@ class DetectRecurringTransactionTool(BaseTool):
     def _run(self, user_id: str, transaction_data: dict) -> dict:
         """Detect if this transaction is part of a recurring pattern."""
         try:
-            transactions_ref = db.collection('users').document(user_id).collection('transactions')
+            transactions_ref = _db().collection('users').document(user_id).collection('transactions')
             
-            merchant = transaction_data.get('merchant', '').lower().strip()
+            merchant_key = normalize_merchant(transaction_data.get('merchant', ''))
             amount = transaction_data.get('amount', 0)
             
             # Query for similar transactions
             similar_transactions = []
-            docs = transactions_ref.where('merchant', '==', merchant).limit(10).stream()
+            docs = transactions_ref.where('merchant_normalized', '==', merchant_key).limit(10).stream()
             
             for doc in docs:
                 trans = doc.to_dict()
@@ -211,7 +339,7 @@ class DetectRecurringTransactionTool(BaseTool):
             return {"is_recurring": False, "frequency": len(similar_transactions)}
         
         except Exception as e:
-            print(f"Error detecting recurring pattern: {e}")
+            logger.exception("Error detecting recurring pattern: %s", e)
             return {"is_recurring": False, "error": str(e)}
 
 class UpdateTransactionInFirestoreTool(BaseTool):
@@ -222,29 +350,38 @@ class UpdateTransactionInFirestoreTool(BaseTool):
     def _run(self, user_id: str, transaction_id: str, updates: dict) -> dict:
         """Update transaction document in Firestore."""
         try:
-            transaction_ref = db.collection('users').document(user_id).collection('transactions').document(transaction_id)
+            transaction_ref = _db().collection('users').document(user_id).collection('transactions').document(transaction_id)
             
             updates['categorized_at'] = datetime.now().isoformat()
             updates['uncategorized'] = False
+            # The key is derived from `merchant`, the field recurring detection
+            # queries with; producers write it, so only refresh it on a rename
+            if 'merchant' in updates:
+                updates['merchant_normalized'] = normalize_merchant(updates['merchant'])
             
-            transaction_ref.update(updates)
+            _update_batcher.submit(transaction_ref, updates)
             
             return {
                 "success": True,
                 "message": "Transaction updated successfully"
             }
         except Exception as e:
-            print(f"Error updating transaction: {e}")
+            logger.exception("Error updating transaction: %s", e)
             return {
                 "success": False,
                 "error": str(e)
             }
 
-search_tool = SerperDevTool(
-              country="in",
-              location="India",
-              n_results=2,
-)
+@functools.cache
+def _get_search_tool():
+    """Construct the Serper search tool on first use."""
+    from crewai_tools import SerperDevTool
+
+    return SerperDevTool(
+        country="in",
+        location="India",
+        n_results=2,
+    )
 
 # -----------------------
 # Output model
@@ -275,7 +412,7 @@ class CategorizationCrew():
     def recurring_detection_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['recurring_detection_agent'],
-            llm=llm,
+            llm=_get_llm(),
             verbose=True,
             allow_delegation=False,
             tools=[DetectRecurringTransactionTool()],
@@ -286,10 +423,10 @@ class CategorizationCrew():
     def categorization_agent(self) -> Agent:
         return Agent(
             config=self.agents_config['categorization_agent'],
-            llm=llm,
+            llm=_get_llm(),
             verbose=True,
             allow_delegation=False,
-            tools=[UpdateTransactionInFirestoreTool(),search_tool],
+            tools=[UpdateTransactionInFirestoreTool(), _get_search_tool()],
             max_retry_limit=3
         )
 
@@ -334,19 +471,25 @@ async def categorize_transaction_agent(
         else:  # Already a string
             date = str(date_raw)
         
-        print(f"🤖 Categorizing transaction: {narration}")
+        logger.info("🤖 Categorizing transaction: %s", narration)
         
-        # Create crew instance and kickoff
-        crew_instance = CategorizationCrew()
-        crew = crew_instance.crew()
-        result = crew.kickoff(inputs={
+        inputs = {
             'transaction_id': transaction_id,
             'user_id': user_id,
             'amount': amount,
             'type': transaction_type,
             'description': narration,
             'date': date
-        })
+        }
+        try:
+            result = CategorizationCrew().crew().kickoff(inputs=inputs)
+        except Exception as e:
+            if not _is_rate_limit_error(e) or len(API_KEYS) < 2:
+                raise
+            # Rotate to the next key right away and retry once instead of failing the whole run
+            _get_llm(rotate=True)
+            logger.warning("🔄 Rate limited during categorization, retrying with next API key")
+            result = CategorizationCrew().crew().kickoff(inputs=inputs)
         
         # Get the structured result with graceful fallbacks
         structured_output = _model_to_dict(getattr(result, "pydantic", None))
@@ -375,8 +518,8 @@ async def categorize_transaction_agent(
         except ValidationError as e:
             raise ValueError(f"Categorization output validation failed: {e}") from e
         
-        # Serialize the output to ensure valid JSON
-        output = {
+        # All fields are native scalars from the validated model, so the dict is JSON-safe as-is
+        return {
             "status": "completed",
             "success": True,
             "category": categorization.category,
@@ -388,12 +531,9 @@ async def categorize_transaction_agent(
             "insights": categorization.ai_insights,
             "model": "gemini-2.5-flash-lite"
         }
-        
-        # Ensure clean JSON serialization
-        return json.loads(json.dumps(output))
     
     except Exception as e:
-        print(f"❌ Error in categorization: {e}")
+        logger.exception("❌ Error in categorization: %s", e)
         return {
             "status": "failed",
             "success": False,
@@ -9,13 +9,476 @@ Official Documentation: https://docs.mem0.ai/
 """
 
 import os
+import functools
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+import httpx
 from mem0 import MemoryClient
 from dotenv import load_dotenv
 
+try:
+    import numpy as np
+except ImportError:  # semantic cache is optional
+    np = None
+
+try:
+    import hnswlib
+except ImportError:  # ANN index is only used for large caches
+    hnswlib = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# The semantic search cache is opt-in: set MEM0_SEMANTIC_CACHE=1 and install
+# numpy and sentence-transformers. Each process (gunicorn worker) keeps its
+# own cache and memory writes only invalidate the worker that made them, so
+# other workers can serve search results up to the cache ttl old.
+SEMANTIC_CACHE_ENABLED = os.getenv("MEM0_SEMANTIC_CACHE", "").lower() in ("1", "true", "yes")
+# Local embedding model used only for the semantic search cache
+EMBED_MODEL_NAME = os.getenv("MEM0_CACHE_EMBED_MODEL", "all-MiniLM-L6-v2")
+# Optional SQLite file for a semantic cache that survives restarts (needs sqlite-vec)
+DISK_CACHE_PATH = os.getenv("MEM0_CACHE_DB")
+_embedder = None
+
+# Default semantic cache capacity per client. With hnswlib installed the
+# cache may grow past _SemanticCache.HNSW_THRESHOLD and switch to the ANN
+# index; without it every lookup is a dense scan, so it stays small.
+CACHE_MAX_SIZE = 8192 if hnswlib is not None else 1024
+
+
+def _get_embedder():
+    global _embedder
+    if _embedder is None:
+        from sentence_transformers import SentenceTransformer
+        _embedder = SentenceTransformer(EMBED_MODEL_NAME)
+    return _embedder
+
+
+@functools.lru_cache(maxsize=4096)
+def _local_embed(text: str):
+    """
+    Embed text with a local sentence-transformers model, L2-normalized float32.
+    Memoized so repeated query strings skip the model entirely; the returned
+    array is shared between callers and marked read-only.
+    """
+    vector = _get_embedder().encode(text, normalize_embeddings=True).astype(np.float32)
+    vector.setflags(write=False)
+    return vector
+
+
+def _canonical_filters(filters: Dict[str, Any]) -> bytes:
+    """Serialize filters with sorted keys so equal dicts give equal bytes."""
+    if orjson is not None:
+        return orjson.dumps(filters, option=orjson.OPT_SORT_KEYS, default=str)
+    return json.dumps(filters, sort_keys=True, default=str, separators=(",", ":")).encode()
+
+
+def _hash_blob(blob: bytes) -> int:
+    """64-bit hash masked to 63 bits so it fits a signed SQLite INTEGER."""
+    if xxhash is not None:
+        digest = xxhash.xxh3_64_intdigest(blob)
+    else:
+        digest = int.from_bytes(hashlib.blake2b(blob, digest_size=8).digest(), "big")
+    return digest & 0x7FFFFFFFFFFFFFFF
+
+
+def _scope_blob(ids: tuple, filters: Dict[str, Any]) -> bytes:
+    return b"\x00".join(part.encode() for part in ids) + b"\x00" + _canonical_filters(filters)
+
+
+@functools.lru_cache(maxsize=4096)
+def _flat_scope_key(ids: tuple, flat_filters: tuple) -> int:
+    return _hash_blob(_scope_blob(ids, dict(flat_filters)))
+
+
+def _scope_key(
+    user_id: Optional[str],
+    agent_id: Optional[str],
+    session_id: Optional[str],
+    run_id: Optional[str],
+    filters: Optional[Dict[str, Any]],
+    limit: int,
+    rerank: bool
+) -> int:
+    """
+    Hash the search scope so cached results are only reused for identical filters.
+    Stable across processes so it can key the on-disk cache as well.
+    """
+    ids = (user_id or "", agent_id or "", session_id or "", run_id or "", str(limit), str(rerank))
+    if filters and any(isinstance(value, (dict, list)) for value in filters.values()):
+        # AND/OR and operator filters are unhashable, so skip the memo for them
+        return _hash_blob(_scope_blob(ids, filters))
+    return _flat_scope_key(ids, tuple(sorted((filters or {}).items())))
+
+
+def _build_search_filters(
+    user_id: Optional[str],
+    agent_id: Optional[str],
+    session_id: Optional[str],
+    run_id: Optional[str],
+    filters: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    Build a single AND filter: scope ids first (user_id is the most selective),
+    then any caller-supplied filters, without mutating the caller's dict.
+    """
+    clauses = [
+        {key: value}
+        for key, value in (("user_id", user_id), ("agent_id", agent_id),
+                           ("session_id", session_id), ("run_id", run_id))
+        if value
+    ]
+    if filters:
+        if "AND" in filters:
+            clauses.extend(filters["AND"])
+        elif "OR" in filters:
+            clauses.append({"OR": filters["OR"]})
+        else:
+            clauses.extend({key: value} for key, value in filters.items())
+    return {"AND": clauses} if clauses else {}
+
+
+def _extract_results(response: Any) -> List[Dict[str, Any]]:
+    """Pull the memory list out of a Mem0 search/get_all response."""
+    if isinstance(response, dict):
+        return response.get("results", [])
+    if isinstance(response, list):
+        return response
+    return []
+
+
+# Mem0 batch endpoints accept at most this many items per request
+MAX_BATCH_SIZE = 1000
+
+# Exchanges shorter than this are stored raw rather than sent through LLM inference
+MIN_INFER_CHARS = 40
+# Identical exchanges stored within this window are skipped
+DEDUP_WINDOW_SECONDS = 600
+DEDUP_MAX_ENTRIES = 4096
+
+
+def _chunks(items: List[Any], size: int):
+    """Yield consecutive slices of at most `size` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+_ts_cache = (0, "")
+
+
+def _now_iso_cached(ttl_ms: int = 100) -> str:
+    """
+    ISO timestamp reused for up to ttl_ms, so tight add loops share one
+    clock read and format instead of paying for both per call.
+    """
+    global _ts_cache
+    now = time.monotonic_ns()
+    if now - _ts_cache[0] > ttl_ms * 1_000_000:
+        _ts_cache = (now, datetime.now().isoformat())
+    return _ts_cache[1]
+
+
+def _cached_response(query: str, results: list) -> Dict[str, Any]:
+    return {
+        "success": True,
+        "results": results,
+        "count": len(results),
+        "query": query,
+        "cached": True
+    }
+
+
+def _empty_context() -> Dict[str, List[str]]:
+    return {
+        "financial_priorities": [],
+        "past_insights": [],
+        "behavioral_patterns": [],
+        "user_preferences": [],
+        "recent_queries": []
+    }
+
+
+# Keyword buckets in priority order; the first bucket that matches wins
+_CONTEXT_PATTERNS = tuple(
+    (category, re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE))
+    for category, keywords in (
+        ("financial_priorities", ("goal", "target", "saving for", "priority")),
+        ("behavioral_patterns", ("overspend", "pattern", "habit", "behavior")),
+        ("user_preferences", ("prefer", "like", "visual", "chart", "style")),
+    )
+)
+
+
+def _categorize_memories(memories: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Bucket memory texts into financial context types by keyword."""
+    context = _empty_context()
+    for memory in memories:
+        memory_text = memory.get("memory", "")
+        for category, pattern in _CONTEXT_PATTERNS:
+            if pattern.search(memory_text):
+                context[category].append(memory_text)
+                break
+        else:
+            context["past_insights"].append(memory_text)
+    return context
+
+
+def _quantize(vectors):
+    """Symmetric per-row int8 quantization; returns (int8 matrix, float32 scales)."""
+    scale = np.abs(vectors).max(axis=1) / 127.0
+    scale[scale == 0] = 1.0
+    q8 = np.round(vectors / scale[:, None]).astype(np.int8)
+    return q8, scale.astype(np.float32)
+
+
+class _SemanticCache:
+    """
+    In-process semantic cache in front of Mem0 search (opt-in, see
+    SEMANTIC_CACHE_ENABLED; one per worker process).
+
+    Query embeddings are stored int8-quantized with a per-row scale
+    (max|v| / 127), a quarter of the float32 footprint; a lookup is one
+    int8 matrix product accumulated in int32 and rescaled to cosine
+    similarity. Cached results are returned when the similarity is >= tau
+    for the same search scope and the entry has not expired. Least
+    recently used entries are evicted past max_size.
+
+    Past HNSW_THRESHOLD entries (and with hnswlib installed) lookups switch
+    from the dense scan to an HNSW approximate nearest-neighbour index.
+    """
+
+    HNSW_THRESHOLD = 2048
+    HNSW_CANDIDATES = 8
+
+    def __init__(self, tau: float = 0.92, ttl: float = 300.0, max_size: int = CACHE_MAX_SIZE):
+        self.tau = tau
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._q8 = None  # (N, d) int8
+        self._scale = None  # (N,) float32
+        self._scopes: List[int] = []
+        self._users: List[Optional[str]] = []
+        self._results: List[list] = []
+        self._expiry: List[float] = []
+        self._last_used: List[float] = []
+        self._ids: List[int] = []  # stable labels for the HNSW index
+        self._row_of: Dict[int, int] = {}
+        self._next_id = 0
+        self._hnsw = None
+
+    def get(self, embedding, scope: int) -> Optional[list]:
+        return self.get_many(embedding.reshape(1, -1), [scope])[0]
+
+    def get_many(self, embeddings, scopes: List[int]) -> List[Optional[list]]:
+        """Look up k queries at once with a single (N, d) @ (d, k) product."""
+        with self._lock:
+            if self._q8 is None:
+                return [None] * len(scopes)
+            now = time.monotonic()
+            if self._hnsw is not None:
+                return self._get_many_hnsw(embeddings, scopes, now)
+            query_q8, query_scale = _quantize(embeddings)
+            raw = np.matmul(self._q8, query_q8.T, dtype=np.int32)
+            sims = raw * np.outer(self._scale, query_scale)
+            return [self._best(sims[:, col], scope, now) for col, scope in enumerate(scopes)]
+
+    def _best(self, sims, scope: int, now: float) -> Optional[list]:
+        for idx in np.argsort(-sims):
+            if sims[idx] < self.tau:
+                break
+            if self._scopes[idx] == scope and self._expiry[idx] > now:
+                self._last_used[idx] = now
+                return self._results[idx]
+        return None
+
+    def _get_many_hnsw(self, embeddings, scopes: List[int], now: float) -> List[Optional[list]]:
+        k = min(self.HNSW_CANDIDATES, len(self._ids))
+        labels, distances = self._hnsw.knn_query(embeddings, k=k)
+        hits: List[Optional[list]] = []
+        for row_labels, row_distances, scope in zip(labels, distances, scopes):
+            hit = None
+            for label, distance in zip(row_labels, row_distances):
+                if 1.0 - distance < self.tau:
+                    break
+                idx = self._row_of.get(int(label))
+                if idx is not None and self._scopes[idx] == scope and self._expiry[idx] > now:
+                    self._last_used[idx] = now
+                    hit = self._results[idx]
+                    break
+            hits.append(hit)
+        return hits
+
+    def _index_row(self, idx: int) -> None:
+        """Keep the HNSW index in step with the dense rows once past the threshold."""
+        if hnswlib is None or len(self._ids) <= self.HNSW_THRESHOLD:
+            return
+        if self._hnsw is None:
+            vectors = self._q8.astype(np.float32) * self._scale[:, None]
+            self._hnsw = hnswlib.Index(space="cosine", dim=vectors.shape[1])
+            self._hnsw.init_index(max_elements=max(self.max_size, len(self._ids)) + 1, ef_construction=200, M=16)
+            self._hnsw.set_ef(64)
+            self._hnsw.add_items(vectors, self._ids)
+            return
+        if self._hnsw.get_current_count() >= self._hnsw.get_max_elements():
+            if self._hnsw.get_current_count() > 2 * len(self._ids):
+                # Mostly evicted/expired labels: rebuild from the live rows
+                # rather than growing the index around deleted ones
+                self._hnsw = None
+                self._index_row(idx)
+                return
+            self._hnsw.resize_index(self._hnsw.get_max_elements() * 2)
+        vector = self._q8[idx].astype(np.float32) * self._scale[idx]
+        self._hnsw.add_items(vector.reshape(1, -1), [self._ids[idx]])
+
+    def put(self, embedding, scope: int, user_id: Optional[str], results: list) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._drop([i for i, exp in enumerate(self._expiry) if exp <= now])
+            if len(self._scopes) >= self.max_size:
+                self._drop([min(range(len(self._last_used)), key=self._last_used.__getitem__)])
+            row_q8, row_scale = _quantize(embedding.reshape(1, -1))
+            if self._q8 is None:
+                self._q8, self._scale = row_q8, row_scale
+            else:
+                self._q8 = np.vstack([self._q8, row_q8])
+                self._scale = np.concatenate([self._scale, row_scale])
+            self._scopes.append(scope)
+            self._users.append(user_id)
+            self._results.append(results)
+            self._expiry.append(now + self.ttl)
+            self._last_used.append(now)
+            self._ids.append(self._next_id)
+            self._row_of[self._next_id] = len(self._ids) - 1
+            self._next_id += 1
+            self._index_row(len(self._ids) - 1)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """
+        Forget cached searches for a user after their memories change, along
+        with searches cached without a user_id (filter-scoped), which may
+        include that user's memories.
+        """
+        with self._lock:
+            self._drop([i for i, uid in enumerate(self._users) if uid == user_id or uid is None])
+
+    def clear(self) -> None:
+        """Forget every cached search."""
+        with self._lock:
+            self._drop(list(range(len(self._users))))
+
+    def _drop(self, indices: List[int]) -> None:
+        if not indices:
+            return
+        if self._hnsw is not None:
+            for idx in indices:
+                self._hnsw.mark_deleted(self._ids[idx])
+        keep = sorted(set(range(len(self._scopes))) - set(indices))
+        if keep:
+            self._q8, self._scale = self._q8[keep], self._scale[keep]
+        else:
+            self._q8 = self._scale = None
+        for column in (self._scopes, self._users, self._results, self._expiry, self._last_used, self._ids):
+            column[:] = [column[i] for i in keep]
+        self._row_of = {label: row for row, label in enumerate(self._ids)}
+        if self._hnsw is not None and len(self._ids) <= self.HNSW_THRESHOLD:
+            self._hnsw = None
+
+
+class _DiskSemanticCache:
+    """
+    Durable semantic cache tier stored in SQLite via the sqlite-vec extension.
+
+    Rows hold the float32 query embedding, scope hash, user id and the JSON
+    results; lookups rank same-scope, unexpired rows by vec_distance_cosine.
+    Survives restarts so the first searches after a redeploy can still hit.
+    """
+
+    _PURGE_EVERY = 100
+
+    def __init__(self, path: str, tau: float = 0.92, ttl: float = 300.0):
+        self.tau = tau
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.enable_load_extension(True)
+        try:
+            import sqlite_vec
+            sqlite_vec.load(self._conn)
+        except ImportError:
+            self._conn.load_extension("vec0")
+        finally:
+            self._conn.enable_load_extension(False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            "embedding BLOB NOT NULL, query TEXT, filters_hash INTEGER NOT NULL, "
+            "user_id TEXT, results TEXT NOT NULL, created_at INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_semantic_cache_scope "
+            "ON semantic_cache (filters_hash, created_at)"
+        )
+        self._conn.commit()
+
+    def get(self, embedding, scope: int) -> Optional[list]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, vec_distance_cosine(embedding, ?) AS distance FROM semantic_cache "
+                "WHERE filters_hash = ? AND created_at > ? ORDER BY distance LIMIT 1",
+                (embedding.tobytes(), scope, int(time.time() - self.ttl))
+            ).fetchone()
+        if row is None or 1.0 - row[1] < self.tau:
+            return None
+        return json.loads(row[0])
+
+    def put(self, embedding, scope: int, user_id: Optional[str], query: str, results: list) -> None:
+        now = int(time.time())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO semantic_cache (embedding, query, filters_hash, user_id, results, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (embedding.tobytes(), query, scope, user_id, json.dumps(results, default=str), now)
+            )
+            self._inserts += 1
+            if self._inserts % self._PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM semantic_cache WHERE created_at < ?", (now - self.ttl,))
+            self._conn.commit()
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Forget a user's cached searches and the filter-scoped ones (user_id NULL)."""
+        with self._lock:
+            self._conn.execute("DELETE FROM semantic_cache WHERE user_id = ? OR user_id IS NULL", (user_id,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Forget every cached search."""
+        with self._lock:
+            self._conn.execute("DELETE FROM semantic_cache")
+            self._conn.commit()
+
 
 class FinancialCoachMemory:
     """
@@ -33,13 +496,32 @@ class FinancialCoachMemory:
     - Session Memory: Short-term context for ongoing conversations
     """
    
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        tau: float = 0.92,
+        ttl: float = 300.0,
+        max_size: int = CACHE_MAX_SIZE,
+        flush_ms: int = 50,
+        max_batch: int = 32,
+        disk_cache_path: Optional[str] = DISK_CACHE_PATH,
+        semantic_cache: bool = SEMANTIC_CACHE_ENABLED
+    ):
         """
         Initialize Mem0 Platform client.
        
         Args:
             api_key: Mem0 API key (get from https://app.mem0.ai/settings/api-keys)
                     Falls back to MEM0_API_KEY environment variable
+            tau: Cosine similarity threshold for semantic search cache hits
+            ttl: Seconds a cached search result stays valid
+            max_size: Maximum number of cached search results
+            flush_ms: Coalescing window for queued adds in milliseconds
+            max_batch: Queued items that trigger an immediate flush
+            disk_cache_path: SQLite file for the persistent semantic cache tier
+                    (defaults to MEM0_CACHE_DB; disabled when unset)
+            semantic_cache: Cache searches per process (defaults to MEM0_SEMANTIC_CACHE);
+                    needs numpy and sentence-transformers
        
         Raises:
             ValueError: If no API key is provided or found in environment
@@ -52,7 +534,27 @@ class FinancialCoachMemory:
             )
        
         self.client = MemoryClient(api_key=self.api_key)
-        print(f"✅ Mem0 client initialized")
+        self._install_pooled_transport()
+        self._cache = _SemanticCache(tau=tau, ttl=ttl, max_size=max_size) if semantic_cache and np is not None else None
+        self._disk_cache = None
+        if self._cache is not None and disk_cache_path:
+            try:
+                self._disk_cache = _DiskSemanticCache(disk_cache_path, tau=tau, ttl=ttl)
+            except Exception as e:
+                logger.warning("⚠️ Persistent semantic cache disabled: %s", e)
+       
+        # Write coalescer for queue_coaching_session
+        self._flush_interval = flush_ms / 1000
+        self._max_batch = max_batch
+        self._flush_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._add_buffer: List[tuple] = []
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="mem0")
+       
+        # Recently stored exchanges, (user_id, content hash) -> stored_at, LRU-bounded
+        self._recent_adds: "OrderedDict[tuple, float]" = OrderedDict()
+        self._recent_lock = threading.Lock()
+        logger.info("✅ Mem0 client initialized")
    
     # ===========================
     # ADD MEMORY OPERATIONS
@@ -67,7 +569,8 @@ class FinancialCoachMemory:
         agent_id: Optional[str] = None,
         run_id: Optional[str] = None,
         metadata: Optional[Dict[str, Any]] = None,
-        infer: bool = True
+        infer: bool = True,
+        force: bool = False
     ) -> Dict[str, Any]:
         """
         Store a coaching session in Mem0 with automatic memory inference.
@@ -88,12 +591,15 @@ class FinancialCoachMemory:
             metadata: Additional metadata for filtering (e.g., {"category": "spending"})
             infer: If True (default), Mem0 extracts structured memories.
                    If False, stores raw messages without inference.
+                   Skipped automatically for exchanges shorter than 40 chars.
+            force: Store even if the same exchange was stored in the last 10 minutes
        
         Returns:
             dict: {
                 "success": bool,
                 "memory_ids": list,  # IDs of created memories
-                "user_id": str
+                "user_id": str,
+                "deduped": bool  # only present when a duplicate was skipped
             }
        
         Example:
@@ -105,39 +611,100 @@ class FinancialCoachMemory:
             ...     metadata={"category": "spending_analysis"}
             ... )
         """
-        try:
-            # Format messages for Mem0 (conversation format)
-            messages = [
-                {"role": "user", "content": query},
-                {"role": "assistant", "content": response}
-            ]
-           
-            # Prepare request parameters
-            request_params = {
-                "messages": messages,
-                "user_id": user_id,
-                "infer": infer
-            }
+        dedup_key = self._dedup_key(user_id, query, response)
+        if not force and self._recently_added(dedup_key):
+            return {"success": True, "memory_ids": [], "user_id": user_id, "deduped": True}
+        infer = infer and len(query) + len(response) >= MIN_INFER_CHARS
+        return self._store_session(self._build_session_params(
+            user_id, query, response, session_id, agent_id, run_id, metadata, infer
+        ), dedup_key)
+   
+    def queue_coaching_session(
+        self,
+        user_id: str,
+        query: str,
+        response: str,
+        session_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+        run_id: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        infer: bool = True,
+        force: bool = False
+    ) -> Future:
+        """
+        Buffer a coaching session and store it with the next coalesced flush.
+       
+        Same arguments as add_coaching_session. Adds are flushed after
+        flush_ms or once max_batch items are queued, and sent concurrently
+        so a chatty loop pays roughly one round-trip instead of N.
+       
+        Returns:
+            Future: resolves to the add_coaching_session result dict
+        """
+        dedup_key = self._dedup_key(user_id, query, response)
+        if not force and self._recently_added(dedup_key):
+            future: Future = Future()
+            future.set_result({"success": True, "memory_ids": [], "user_id": user_id, "deduped": True})
+            return future
+        infer = infer and len(query) + len(response) >= MIN_INFER_CHARS
+        params = self._build_session_params(
+            user_id, query, response, session_id, agent_id, run_id, metadata, infer
+        )
+        return self._enqueue(self._add_buffer, (params, dedup_key))
+   
+    @staticmethod
+    def _build_session_params(
+        user_id: str,
+        query: str,
+        response: str,
+        session_id: Optional[str],
+        agent_id: Optional[str],
+        run_id: Optional[str],
+        metadata: Optional[Dict[str, Any]],
+        infer: bool
+    ) -> Dict[str, Any]:
+        """Build the Mem0 add payload for a coaching session."""
+        # Format messages for Mem0 (conversation format)
+        messages = [
+            {"role": "user", "content": query},
+            {"role": "assistant", "content": response}
+        ]
            
-            # Add optional identifiers
-            if session_id:
-                request_params["session_id"] = session_id
-            if agent_id:
-                request_params["agent_id"] = agent_id
-            if run_id:
-                request_params["run_id"] = run_id
+        # Prepare request parameters
+        request_params = {
+            "messages": messages,
+            "user_id": user_id,
+            "infer": infer
+        }
            
-            # Add metadata
-            if metadata:
-                request_params["metadata"] = metadata
-            else:
-                request_params["metadata"] = {
-                    "session_type": "financial_coaching",
-                    "timestamp": datetime.now().isoformat()
-                }
+        # Add optional identifiers
+        if session_id:
+            request_params["session_id"] = session_id
+        if agent_id:
+            request_params["agent_id"] = agent_id
+        if run_id:
+            request_params["run_id"] = run_id
            
+        # Add metadata
+        if metadata:
+            request_params["metadata"] = metadata
+        else:
+            request_params["metadata"] = {
+                "session_type": "financial_coaching",
+                "timestamp": _now_iso_cached()
+            }
+        return request_params
+   
+    def _store_session(self, request_params: Dict[str, Any], dedup_key: Optional[tuple] = None) -> Dict[str, Any]:
+        """Send one add payload to Mem0 and normalize the response."""
+        user_id = request_params["user_id"]
+        infer = request_params["infer"]
+        try:
             # Add to Mem0 Platform
             result = self.client.add(**request_params)
+            self._invalidate_cache(user_id)
+            if dedup_key is not None:
+                self._remember_add(dedup_key)
            
             # Extract memory IDs from response
             memory_ids = []
@@ -146,7 +713,7 @@ class FinancialCoachMemory:
                 if isinstance(memory_ids, list):
                     memory_ids = [m.get("id") if isinstance(m, dict) else m for m in memory_ids]
            
-            print(f"✅ Stored {len(memory_ids)} memories for user: {user_id}")
+            logger.debug("✅ Stored %d memories for user: %s", len(memory_ids), user_id)
            
             return {
                 "success": True,
@@ -156,7 +723,7 @@ class FinancialCoachMemory:
             }
        
         except Exception as e:
-            print(f"❌ Error storing memory in Mem0: {e}")
+            logger.warning("❌ Error storing memory in Mem0: %s", e)
             return {
                 "success": False,
                 "error": str(e),
@@ -229,60 +796,28 @@ class FinancialCoachMemory:
             ... )
         """
         try:
-            # Build filters dict
-            search_filters = filters or {}
-           
-            # Add ID filters to filters dict (Platform API style)
-            if not search_filters and user_id:
-                search_filters = {"user_id": user_id}
-            elif user_id and "AND" not in search_filters and "OR" not in search_filters:
-                search_filters["user_id"] = user_id
-           
-            # Add other identifiers if provided
-            if agent_id:
-                if "AND" in search_filters:
-                    search_filters["AND"].append({"agent_id": agent_id})
-                else:
-                    search_filters["agent_id"] = agent_id
+            search_filters = _build_search_filters(user_id, agent_id, session_id, run_id, filters)
+            scope = _scope_key(user_id, agent_id, session_id, run_id, filters, limit, rerank)
            
-            if session_id:
-                if "AND" in search_filters:
-                    search_filters["AND"].append({"session_id": session_id})
-                else:
-                    search_filters["session_id"] = session_id
-           
-            if run_id:
-                if "AND" in search_filters:
-                    search_filters["AND"].append({"run_id": run_id})
-                else:
-                    search_filters["run_id"] = run_id
-           
-            # Execute search
-            results = self.client.search(
-                query=query,
-                filters=search_filters,
-                limit=limit,
-                rerank=rerank
-            )
-           
-            # Extract results
-            memories = []
-            if isinstance(results, dict):
-                memories = results.get("results", [])
-            elif isinstance(results, list):
-                memories = results
+            # Serve near-duplicate queries from the semantic cache
+            embedding = None
+            if self._cache is not None:
+                try:
+                    embedding = _local_embed(query)
+                except Exception as e:
+                    logger.warning("⚠️ Semantic cache disabled: %s", e)
+                    self._cache = None
+            if embedding is not None:
+                cached = self._cache.get(embedding, scope)
+                if cached is None:
+                    cached = self._disk_lookup(embedding, scope, user_id)
+                if cached is not None:
+                    return _cached_response(query, cached)
            
-            print(f"✅ Found {len(memories)} memories for query: '{query[:50]}...'")
-           
-            return {
-                "success": True,
-                "results": memories,
-                "count": len(memories),
-                "query": query
-            }
+            return self._fetch_and_cache(query, search_filters, scope, embedding, user_id, limit, rerank)
        
         except Exception as e:
-            print(f"❌ Error searching memories: {e}")
+            logger.warning("❌ Error searching memories: %s", e)
             return {
                 "success": False,
                 "error": str(e),
@@ -290,6 +825,56 @@ class FinancialCoachMemory:
                 "count": 0
             }
    
+    def _get_all_memories(self, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        List a user's memories through the SDK's public get_all, which sends
+        the org/project scoping; handles both the {"results": [...]} and the
+        bare-list response shapes.
+        """
+        return _extract_results(self.client.get_all(user_id=user_id, limit=limit))
+   
+    def _disk_lookup(self, embedding, scope: int, user_id: Optional[str]) -> Optional[list]:
+        """Check the persistent cache tier and promote hits into memory."""
+        if self._disk_cache is None:
+            return None
+        cached = self._disk_cache.get(embedding, scope)
+        if cached is not None:
+            self._cache.put(embedding, scope, user_id, cached)
+        return cached
+   
+    def _fetch_and_cache(
+        self,
+        query: str,
+        search_filters: Dict[str, Any],
+        scope: int,
+        embedding: Any,
+        user_id: Optional[str],
+        limit: int,
+        rerank: bool
+    ) -> Dict[str, Any]:
+        """Run the Mem0 search and record the results in the cache tiers."""
+        results = self.client.search(
+            query=query,
+            filters=search_filters,
+            limit=limit,
+            rerank=rerank
+        )
+        memories = _extract_results(results)
+       
+        if embedding is not None and self._cache is not None:
+            self._cache.put(embedding, scope, user_id, memories)
+            if self._disk_cache is not None:
+                self._disk_cache.put(embedding, scope, user_id, query, memories)
+       
+        logger.debug("✅ Found %d memories for query: '%s...'", len(memories), query[:50])
+       
+        return {
+            "success": True,
+            "results": memories,
+            "count": len(memories),
+            "query": query
+        }
+   
     def get_user_context(
         self,
         user_id: str,
@@ -332,45 +917,16 @@ class FinancialCoachMemory:
                 )
             else:
                 # Get all memories for user
-                search_result = self.client.get_all(
-                    user_id=user_id,
-                    limit=limit
-                )
-                if isinstance(search_result, dict):
-                    memories = search_result.get("results", [])
-                else:
-                    memories = search_result if isinstance(search_result, list) else []
-                search_result = {"success": True, "results": memories}
+                search_result = {"success": True, "results": self._get_all_memories(user_id, limit)}
            
             if not search_result.get("success"):
                 raise Exception(search_result.get("error", "Search failed"))
            
             memories = search_result.get("results", [])
            
-            # Categorize memories
-            context = {
-                "financial_priorities": [],
-                "past_insights": [],
-                "behavioral_patterns": [],
-                "user_preferences": [],
-                "recent_queries": []
-            }
+            context = _categorize_memories(memories)
            
-            for memory in memories:
-                memory_text = memory.get("memory", "")
-                categories = memory.get("categories", [])
-               
-                # Categorize based on content and categories
-                if any(kw in memory_text.lower() for kw in ["goal", "target", "saving for", "priority"]):
-                    context["financial_priorities"].append(memory_text)
-                elif any(kw in memory_text.lower() for kw in ["overspend", "pattern", "habit", "behavior"]):
-                    context["behavioral_patterns"].append(memory_text)
-                elif any(kw in memory_text.lower() for kw in ["prefer", "like", "visual", "chart", "style"]):
-                    context["user_preferences"].append(memory_text)
-                else:
-                    context["past_insights"].append(memory_text)
-           
-            print(f"✅ Retrieved and categorized {len(memories)} memories for user: {user_id}")
+            logger.debug("✅ Retrieved and categorized %d memories for user: %s", len(memories), user_id)
            
             return {
                 "success": True,
@@ -380,17 +936,11 @@ class FinancialCoachMemory:
             }
        
         except Exception as e:
-            print(f"❌ Error retrieving user context: {e}")
+            logger.warning("❌ Error retrieving user context: %s", e)
             return {
                 "success": False,
                 "error": str(e),
-                "context": {
-                    "financial_priorities": [],
-                    "past_insights": [],
-                    "behavioral_patterns": [],
-                    "user_preferences": [],
-                    "recent_queries": []
-                },
+                "context": _empty_context(),
                 "memory_count": 0
             }
    
@@ -445,9 +995,13 @@ class FinancialCoachMemory:
                     "error": "Must provide either text or metadata to update"
                 }
            
-            result = self.client.update(**update_params)
+            try:
+                result = self.client.update(**update_params)
+            finally:
+                # Even a failed call may have applied the update
+                self._invalidate_cache(None)
            
-            print(f"✅ Updated memory: {memory_id}")
+            logger.debug("✅ Updated memory: %s", memory_id)
            
             return {
                 "success": True,
@@ -457,7 +1011,7 @@ class FinancialCoachMemory:
             }
        
         except Exception as e:
-            print(f"❌ Error updating memory: {e}")
+            logger.warning("❌ Error updating memory: %s", e)
             return {
                 "success": False,
                 "error": str(e),
@@ -469,7 +1023,7 @@ class FinancialCoachMemory:
         updates: List[Dict[str, Any]]
     ) -> Dict[str, Any]:
         """
-        Update multiple memories in a single request (up to 1000).
+        Update multiple memories, split into requests of up to 1000.
        
         From Official Docs:
         - Batch operation for efficiency
@@ -495,29 +1049,34 @@ class FinancialCoachMemory:
             ...     {"memory_id": "mem_2", "metadata": {"category": "sports"}}
             ... ])
         """
+        if not updates:
+            return {"success": True, "updated_count": 0, "results": []}
+       
+        updated = 0
         try:
-            if len(updates) > 1000:
-                return {
-                    "success": False,
-                    "error": "Batch update limited to 1000 memories. Please split into multiple batches."
-                }
+            # Mem0 caps batches at 1000; split larger requests transparently
+            results = []
+            try:
+                for chunk in _chunks(updates, MAX_BATCH_SIZE):
+                    results.append(self.client.batch_update(chunk))
+                    updated += len(chunk)
+            finally:
+                self._invalidate_cache(None)
            
-            result = self.client.batch_update(updates)
-           
-            print(f"✅ Batch updated {len(updates)} memories")
+            logger.debug("✅ Batch updated %d memories", updated)
            
             return {
                 "success": True,
-                "updated_count": len(updates),
-                "results": result
+                "updated_count": updated,
+                "results": results[0] if len(results) == 1 else results
             }
        
         except Exception as e:
-            print(f"❌ Error in batch update: {e}")
+            logger.warning("❌ Error in batch update: %s", e)
             return {
                 "success": False,
                 "error": str(e),
-                "updated_count": 0
+                "updated_count": updated
             }
    
     # ===========================
@@ -550,9 +1109,12 @@ class FinancialCoachMemory:
             >>> memory.delete_memory("mem_abc123")
         """
         try:
-            result = self.client.delete(memory_id=memory_id)
+            try:
+                result = self.client.delete(memory_id=memory_id)
+            finally:
+                self._invalidate_cache(None)
            
-            print(f"✅ Deleted memory: {memory_id}")
+            logger.debug("✅ Deleted memory: %s", memory_id)
            
             return {
                 "success": True,
@@ -562,7 +1124,7 @@ class FinancialCoachMemory:
             }
        
         except Exception as e:
-            print(f"❌ Error deleting memory: {e}")
+            logger.warning("❌ Error deleting memory: %s", e)
             return {
                 "success": False,
                 "error": str(e),
@@ -574,7 +1136,7 @@ class FinancialCoachMemory:
         memory_ids: List[str]
     ) -> Dict[str, Any]:
         """
-        Delete multiple memories in a single request (up to 1000).
+        Delete multiple memories, split into requests of up to 1000.
        
         From Official Docs:
         - Efficient bulk deletion
@@ -594,32 +1156,34 @@ class FinancialCoachMemory:
         Example:
             >>> memory.batch_delete_memories(["mem_1", "mem_2", "mem_3"])
         """
+        if not memory_ids:
+            return {"success": True, "deleted_count": 0, "results": []}
+       
+        deleted = 0
         try:
-            if len(memory_ids) > 1000:
-                return {
-                    "success": False,
-                    "error": "Batch delete limited to 1000 memories. Please split into multiple batches."
-                }
-           
-            # Format for batch delete
-            delete_list = [{"memory_id": mid} for mid in memory_ids]
+            # Mem0 caps batches at 1000; split larger requests transparently
+            results = []
+            try:
+                for chunk in _chunks(memory_ids, MAX_BATCH_SIZE):
+                    results.append(self.client.batch_delete([{"memory_id": mid} for mid in chunk]))
+                    deleted += len(chunk)
+            finally:
+                self._invalidate_cache(None)
            
-            result = self.client.batch_delete(delete_list)
-           
-            print(f"✅ Batch deleted {len(memory_ids)} memories")
+            logger.debug("✅ Batch deleted %d memories", deleted)
            
             return {
                 "success": True,
-                "deleted_count": len(memory_ids),
-                "results": result
+                "deleted_count": deleted,
+                "results": results[0] if len(results) == 1 else results
             }
        
         except Exception as e:
-            print(f"❌ Error in batch delete: {e}")
+            logger.warning("❌ Error in batch delete: %s", e)
             return {
                 "success": False,
                 "error": str(e),
-                "deleted_count": 0
+                "deleted_count": deleted
             }
    
     def delete_user_memories(
@@ -659,19 +1223,24 @@ class FinancialCoachMemory:
             ...     session_id="session_xyz"
             ... )
         """
+        if not user_id:
+            return {
+                "success": False,
+                "error": "user_id is required to delete user memories"
+            }
+       
         try:
-            delete_params = {"user_id": user_id}
-           
-            if agent_id:
-                delete_params["agent_id"] = agent_id
-            if run_id:
-                delete_params["run_id"] = run_id
-            if session_id:
-                delete_params["session_id"] = session_id
+            delete_params = {
+                key: value
+                for key, value in (("user_id", user_id), ("agent_id", agent_id),
+                                   ("run_id", run_id), ("session_id", session_id))
+                if value
+            }
            
             result = self.client.delete_all(**delete_params)
+            self._invalidate_cache(user_id)
            
-            print(f"✅ Deleted all memories for user: {user_id}")
+            logger.debug("✅ Deleted all memories for user: %s", user_id)
            
             return {
                 "success": True,
@@ -680,12 +1249,48 @@ class FinancialCoachMemory:
             }
        
         except Exception as e:
-            print(f"❌ Error deleting user memories: {e}")
+            logger.warning("❌ Error deleting user memories: %s", e)
             return {
                 "success": False,
                 "error": str(e)
             }
    
+    # ===========================
+    # WRITE COALESCING
+    # ===========================
+   
+    def flush(self) -> None:
+        """
+        Send all queued adds now and resolve their futures.
+       
+        Call on shutdown: adds still waiting for the coalescing timer are
+        otherwise lost when the process exits.
+        """
+        with self._flush_lock:
+            adds, self._add_buffer = self._add_buffer, []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+        if adds:
+            pending = [(self._executor.submit(self._store_session, *item), future) for item, future in adds]
+            for task, future in pending:
+                future.set_result(task.result())
+   
+    def _enqueue(self, buffer: List[tuple], item: Any) -> Future:
+        """Append to a write buffer and schedule a flush."""
+        future: Future = Future()
+        with self._flush_lock:
+            buffer.append((item, future))
+            full = len(buffer) >= self._max_batch
+            if not full and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self._flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        if full:
+            threading.Thread(target=self.flush, daemon=True).start()
+        return future
+   
     # ===========================
     # HELPER METHODS
     # ===========================
@@ -724,7 +1329,7 @@ class FinancialCoachMemory:
                 "user_id": user_id,
                 "metadata": {
                     "pattern_type": "behavioral",
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": _now_iso_cached()
                 }
             }
            
@@ -732,20 +1337,76 @@ class FinancialCoachMemory:
                 request_params["session_id"] = session_id
            
             result = self.client.add(**request_params)
+            self._invalidate_cache(user_id)
            
-            print(f"✅ Stored behavioral pattern for user: {user_id}")
+            logger.debug("✅ Stored behavioral pattern for user: %s", user_id)
             return {
                 "success": True,
                 "memory_ids": result.get("results", []) if isinstance(result, dict) else []
             }
        
         except Exception as e:
-            print(f"❌ Error storing behavioral pattern: {e}")
+            logger.warning("❌ Error storing behavioral pattern: %s", e)
             return {
                 "success": False,
                 "error": str(e)
             }
    
+    @staticmethod
+    def _dedup_key(user_id: str, query: str, response: str) -> tuple:
+        return (user_id, _hash_blob(f"{query}\x00{response}".encode()))
+   
+    def _recently_added(self, key: tuple) -> bool:
+        with self._recent_lock:
+            stored_at = self._recent_adds.get(key)
+            return stored_at is not None and time.time() - stored_at < DEDUP_WINDOW_SECONDS
+   
+    def _remember_add(self, key: tuple) -> None:
+        with self._recent_lock:
+            self._recent_adds[key] = time.time()
+            self._recent_adds.move_to_end(key)
+            while len(self._recent_adds) > DEDUP_MAX_ENTRIES:
+                self._recent_adds.popitem(last=False)
+   
+    def set_verbose(self, verbose: bool = True) -> None:
+        """Toggle per-operation debug logging for this module."""
+        logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+   
+    def _install_pooled_transport(self) -> None:
+        """
+        Swap the SDK's HTTP client for one with a larger keep-alive pool and
+        connection retries, so successive calls reuse TLS connections.
+        """
+        sdk_http = getattr(self.client, "client", None)
+        if not isinstance(sdk_http, httpx.Client):
+            return
+        self.client.client = httpx.Client(
+            base_url=sdk_http.base_url,
+            headers=sdk_http.headers,
+            timeout=sdk_http.timeout,
+            # httpx ignores a client-level limits= when transport= is given,
+            # so the pool size goes on the transport itself
+            transport=httpx.HTTPTransport(
+                retries=3,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=50)
+            )
+        )
+        sdk_http.close()
+   
+    def _invalidate_cache(self, user_id: Optional[str]) -> None:
+        """
+        Drop cached searches for a user whose memories just changed. Writes
+        addressed by memory ID do not know the owner (user_id=None) and clear
+        both cache tiers.
+        """
+        for cache in (self._cache, self._disk_cache):
+            if cache is None:
+                continue
+            if user_id:
+                cache.invalidate_user(user_id)
+            else:
+                cache.clear()
+   
     def _format_insights(self, insights: Dict[str, Any]) -> str:
         """
         Format insights dict into readable text for memory storage.
@@ -780,7 +1441,8 @@ class FinancialCoachMemory:
 # SINGLETON INSTANCE
 # ===========================
 
-_memory_instance = None
+_memory_instance: Optional[FinancialCoachMemory] = None
+_memory_lock = threading.Lock()
 
 def get_memory_client(api_key: Optional[str] = None) -> FinancialCoachMemory:
     """
@@ -793,8 +1455,13 @@ def get_memory_client(api_key: Optional[str] = None) -> FinancialCoachMemory:
         FinancialCoachMemory: Memory client instance
     """
     global _memory_instance
-    if _memory_instance is None:
-        _memory_instance = FinancialCoachMemory(api_key=api_key)
+    # Fast path without the lock once constructed; double-check under it so
+    # concurrent first callers never build two clients
+    if _memory_instance is not None:
+        return _memory_instance
+    with _memory_lock:
+        if _memory_instance is None:
+            _memory_instance = FinancialCoachMemory(api_key=api_key)
     return _memory_instance
 
 
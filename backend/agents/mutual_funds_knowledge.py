@@ -5,30 +5,261 @@ Uses funds.json as the data source for recommendations
 """
 
 import os
+import re
+import sys
 import json
-from typing import Dict, List, Optional, Any
+import heapq
+import functools
+import pickle
+import tempfile
+from typing import Dict, FrozenSet, List, Optional, Any, Tuple
+from dataclasses import asdict, dataclass
 from datetime import datetime
-from dotenv import load_dotenv
+from operator import itemgetter
 import logging
 
-load_dotenv()
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    from firebase_admin import firestore
+except ImportError:
+    firestore = None
 
 logger = logging.getLogger(__name__)
 
+# funds.json files at least this large are streamed with ijson (when
+# installed) instead of being read into memory before parsing
+STREAM_PARSE_MIN_BYTES = int(os.getenv('MF_STREAM_PARSE_MIN_BYTES', 8 * 1024 * 1024))
+
+# Firestore collection the ingest scripts write fund documents to
+MF_COLLECTION = 'mutual_funds'
+
+# Attempts per fund document before the ingest BulkWriter gives up on it
+MAX_WRITE_ATTEMPTS = 5
+
+# Runs of characters not allowed in a fund document ID
+_FUND_ID_JUNK = re.compile(r'[^a-z0-9]+')
+
+# Source of the mutual funds knowledge base
+FUNDS_JSON_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'funds.json')
+
+# Bump when the snapshot layout changes so older funds.pkl files are ignored
+_PKL_VERSION = 1
+
 # Load the mutual funds data from JSON
 def _load_funds_data() -> Dict[str, Any]:
-    """Load mutual funds data from JSON file"""
+    """
+    Load mutual funds data from JSON file.
+
+    A pickled snapshot (funds.pkl) is kept next to funds.json and reused
+    while it was taken from the JSON's current size and mtime; set
+    MF_DISABLE_PKL_CACHE to always parse the JSON.
+    """
     try:
-        data_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'funds.json')
-        with open(data_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        data_path = FUNDS_JSON_PATH
+        pkl_path = os.path.splitext(data_path)[0] + '.pkl'
+        use_pkl = not os.getenv('MF_DISABLE_PKL_CACHE')
+        source = os.stat(data_path)
+        stamp = (_PKL_VERSION, source.st_mtime_ns, source.st_size)
+
+        if use_pkl:
+            try:
+                with open(pkl_path, 'rb') as f:
+                    snapshot = pickle.load(f)
+                if snapshot['stamp'] == stamp:
+                    return snapshot['data']
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                # Unpickling can fail in many ways (renamed classes, truncated
+                # or foreign files); the JSON is always the fallback
+                logger.warning(f"Ignoring unreadable funds snapshot: {e}")
+
+        if ijson is not None and source.st_size >= STREAM_PARSE_MIN_BYTES:
+            # Build each top-level value straight from the file so the raw
+            # bytes and the parsed tree are never held together
+            with open(data_path, 'rb') as f:
+                data = dict(ijson.kvitems(f, '', use_float=True))
+        else:
+            with open(data_path, 'rb') as f:
+                raw = f.read()
+            data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+        if use_pkl:
+            _write_pickle_snapshot({'stamp': stamp, 'data': data}, pkl_path)
+        return data
     except Exception as e:
         logger.error(f"Error loading funds data: {e}")
         return {"meta": {}, "categories": []}
 
+
+def _write_pickle_snapshot(snapshot: Dict[str, Any], pkl_path: str) -> None:
+    """Atomically write the stamped funds data next to the JSON source."""
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(pkl_path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, pkl_path)
+    except OSError as e:
+        logger.warning(f"Could not write funds snapshot: {e}")
+
 FUNDS_DATA = _load_funds_data()
 
 
+@dataclass(slots=True, frozen=True)
+class _Category:
+    """Immutable view of one funds.json category"""
+    id: str
+    name: str
+    role: str
+    funds: Tuple[Dict[str, Any], ...]
+
+
+def _freeze_categories(data: Dict[str, Any]) -> Tuple[_Category, ...]:
+    """Resolve the category fields once so later passes use attribute access"""
+    return tuple(
+        _Category(
+            id=sys.intern(category.get('id', '')),
+            name=sys.intern(category.get('display_name', '')),
+            role=category.get('role_in_portfolio', ''),
+            funds=tuple(category.get('funds', []))
+        )
+        for category in data.get('categories', [])
+    )
+
+
+def _build_tag_bits(categories: Tuple[_Category, ...]) -> Dict[str, int]:
+    """Assign one bit to every known sector name and lowercase fund tag"""
+    names = list(SECTORS)
+    for category in categories:
+        for fund in category.funds:
+            names.extend(t.lower() for t in fund.get('tags', []))
+
+    tag_bit: Dict[str, int] = {}
+    for name in names:
+        if name not in tag_bit:
+            tag_bit[name] = 1 << len(tag_bit)
+    return tag_bit
+
+
+def _tag_mask(tags: List[str]) -> int:
+    """Bitmask of a fund's tags; unknown names contribute no bits"""
+    mask = 0
+    for tag in tags:
+        mask |= _TAG_BIT.get(tag.lower(), 0)
+    return mask
+
+
+def _query_mask(terms: Tuple[str, ...]) -> int:
+    """
+    Bitmask of every tag a lowercased preferred-sector term appears in.
+
+    Terms match tags by substring, as they did against the comma-joined tag
+    string, so 'cap' still selects 'large_cap' and 'mid_cap' funds; an
+    unknown term contributes no bits.
+    """
+    mask = 0
+    for term in terms:
+        for tag, bit in _TAG_BIT.items():
+            if term in tag:
+                mask |= bit
+    return mask
+
+
+def _build_fund_index(categories: Tuple[_Category, ...]):
+    """
+    Flatten the categories into one list of fund records plus per-category
+    row indexes. The loaded fund dicts are enriched in place rather than
+    copied; records are shared between calls and must be treated as
+    read-only.
+    """
+    flat_funds: List[Dict[str, Any]] = []
+    by_category: Dict[str, List[int]] = {}
+
+    for category in categories:
+        rows = by_category.setdefault(category.id, [])
+
+        for fund_data in category.funds:
+            fund_data['category_id'] = category.id
+            fund_data['category_name'] = category.name
+            fund_data['role_in_portfolio'] = category.role
+            # Intern the short, heavily repeated strings so set and dict
+            # lookups can match on identity
+            for key in ('risk_level', 'amc'):
+                if isinstance(fund_data.get(key), str):
+                    fund_data[key] = sys.intern(fund_data[key])
+            fund_data['_risk_level'] = fund_data.get('risk_level', 'Very High')
+            fund_data['_tag_mask'] = _tag_mask(fund_data.get('tags', []))
+            rows.append(len(flat_funds))
+            flat_funds.append(fund_data)
+
+    return flat_funds, by_category
+
+
+_COMMODITY_CATEGORIES = frozenset({'gold', 'silver'})
+
+
+def _as_float(value: Any) -> float:
+    """Numeric JSON value as float, NaN when missing or not a number"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return float('nan')
+
+
+def _build_fund_arrays(flat_funds: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Column-wise (structure of arrays) copy of the numeric fund fields used
+    for filtering and scoring. Missing values are NaN. Returns None when
+    NumPy is unavailable.
+    """
+    if np is None:
+        return None
+
+    risk_codes: Dict[str, int] = {}
+    returns = [f.get('trailing_returns_cagr_percent') or {} for f in flat_funds]
+    metrics = [f.get('risk_metrics_est') or {} for f in flat_funds]
+
+    return {
+        'r1y': np.array([_as_float(r.get('1y')) for r in returns], dtype=np.float64),
+        'r3y': np.array([_as_float(r.get('3y')) for r in returns], dtype=np.float64),
+        'r5y': np.array([_as_float(r.get('5y')) for r in returns], dtype=np.float64),
+        'sharpe': np.array([_as_float(m.get('sharpe')) for m in metrics], dtype=np.float64),
+        'alpha': np.array([_as_float(m.get('alpha')) for m in metrics], dtype=np.float64),
+        'is_index': np.array([bool(f.get('is_index_fund')) for f in flat_funds], dtype=bool),
+        'risk_code': np.array(
+            [risk_codes.setdefault(f['_risk_level'], len(risk_codes)) for f in flat_funds],
+            dtype=np.int16
+        ),
+        'risk_codes': risk_codes,
+        'is_commodity': np.array(
+            [f['category_id'] in _COMMODITY_CATEGORIES for f in flat_funds], dtype=bool
+        ),
+        # Python ints past 64 bits need an object array
+        'tag_mask': np.array(
+            [f['_tag_mask'] for f in flat_funds],
+            dtype=np.uint64 if len(_TAG_BIT) <= 64 else object
+        ),
+    }
+
+
 # Mutual Fund Categories and Sectors
 MF_CATEGORIES = {
     "equity": {
@@ -72,6 +303,156 @@ SECTORS = {
     "telecom": "Telecommunications, Media"
 }
 
+# Optional JIT-compiled scoring kernel over the fund column arrays. It
+# mirrors _score_short/_score_medium/_score_long + _score_bonuses exactly
+# (same operation order, no fastmath) so rounded scores stay identical.
+_HORIZON_CODES = {'short': 0, 'medium': 1, 'long': 2}
+
+if njit is not None and np is not None:
+    @njit(cache=True)
+    def _score_kernel(horizon_code, r1y, r3y, r5y, sharpe, alpha, is_index, sector_match, use_sector):
+        out = np.empty(r1y.size)
+        for i in range(r1y.size):
+            score = 0.0
+            if horizon_code == 0:
+                if not np.isnan(r1y[i]):
+                    score += r1y[i] * 2.0
+            elif horizon_code == 1:
+                if not np.isnan(r3y[i]):
+                    score += r3y[i] * 1.5
+                elif not np.isnan(r1y[i]):
+                    score += r1y[i] * 1.0
+            elif horizon_code == 2:
+                if not np.isnan(r5y[i]):
+                    score += r5y[i] * 1.8
+                elif not np.isnan(r3y[i]):
+                    score += r3y[i] * 1.2
+
+            if not np.isnan(sharpe[i]) and sharpe[i] != 0:
+                score += sharpe[i] * 10
+            if alpha[i] > 0:
+                score += alpha[i] * 2
+            if is_index[i]:
+                score += 5.0
+            if use_sector and sector_match[i]:
+                score += 10.0
+            out[i] = score
+        return out
+else:
+    _score_kernel = None
+
+# Precomputed fund index: tag bits, flattened records and column arrays
+_CATEGORIES = _freeze_categories(FUNDS_DATA)
+_TAG_BIT = _build_tag_bits(_CATEGORIES)
+_FLAT_FUNDS, _BY_CATEGORY = _build_fund_index(_CATEGORIES)
+_FUND_ARRAYS = _build_fund_arrays(_FLAT_FUNDS)
+
+# Risk levels each risk profile may be offered (None = no restriction)
+_ALLOWED_RISK: Dict[str, Optional[frozenset]] = {
+    'low': frozenset(map(sys.intern, ('Low', 'Moderately Low', 'Moderate'))),
+    'moderate': None,
+    'high': frozenset(map(sys.intern, ('High', 'Very High'))),
+    'very_high': frozenset(map(sys.intern, ('Very High',))),
+}
+
+
+def _score_bonuses(fund: Dict[str, Any], tag_matched: bool, score: float) -> float:
+    """Add the horizon-independent bonuses to a returns score and round it"""
+    risk_metrics = fund.get('risk_metrics_est', {})
+
+    # Bonus for risk-adjusted returns (weight: 30%)
+    sharpe = risk_metrics.get('sharpe', 0)
+    alpha = risk_metrics.get('alpha', 0)
+
+    if sharpe:
+        score += sharpe * 10  # Sharpe ratio bonus
+
+    if alpha and alpha > 0:
+        score += alpha * 2  # Alpha generation bonus
+
+    # Bonus for index funds (lower cost) (weight: 10%)
+    if fund.get('is_index_fund'):
+        score += 5
+
+    # Bonus for sector/tag match (weight: 10%)
+    if tag_matched:
+        score += 10
+
+    return round(score, 2)
+
+
+# Per-horizon scorers (returns weight: 50%), chosen once per request
+def _score_short(fund: Dict[str, Any], tag_matched: bool) -> float:
+    score = 0.0
+    ret_1y = fund.get('trailing_returns_cagr_percent', {}).get('1y')
+    if ret_1y is not None:
+        score += ret_1y * 2.0  # Emphasize short-term returns
+    return _score_bonuses(fund, tag_matched, score)
+
+
+def _score_medium(fund: Dict[str, Any], tag_matched: bool) -> float:
+    score = 0.0
+    returns = fund.get('trailing_returns_cagr_percent', {})
+    ret_3y = returns.get('3y')
+    if ret_3y is not None:
+        score += ret_3y * 1.5
+    else:
+        ret_1y = returns.get('1y')
+        if ret_1y is not None:
+            score += ret_1y * 1.0
+    return _score_bonuses(fund, tag_matched, score)
+
+
+def _score_long(fund: Dict[str, Any], tag_matched: bool) -> float:
+    score = 0.0
+    returns = fund.get('trailing_returns_cagr_percent', {})
+    ret_5y = returns.get('5y')
+    if ret_5y is not None:
+        score += ret_5y * 1.8
+    else:
+        ret_3y = returns.get('3y')
+        if ret_3y is not None:
+            score += ret_3y * 1.2
+    return _score_bonuses(fund, tag_matched, score)
+
+
+def _score_no_horizon(fund: Dict[str, Any], tag_matched: bool) -> float:
+    return _score_bonuses(fund, tag_matched, 0.0)
+
+
+_SCORE_FNS = {
+    'short': _score_short,
+    'medium': _score_medium,
+    'long': _score_long,
+}
+
+# Ranking key for (score, fund) pairs; a C-level getter instead of a lambda
+_SCORE_KEY = itemgetter(0)
+
+# Return period and reason template per investment horizon
+_RETURN_REASONS = {
+    'short': ('1y', "1Y return: {}%"),
+    'medium': ('3y', "3Y CAGR: {}%"),
+    'long': ('5y', "5Y CAGR: {}%"),
+}
+
+
+@dataclass(slots=True, frozen=True)
+class FundRec:
+    """One formatted fund recommendation; converted to a dict at the API boundary"""
+    fund_name: Optional[str]
+    amc: Optional[str]
+    category: Optional[str]
+    role: Optional[str]
+    risk_level: Optional[str]
+    is_index_fund: Optional[bool]
+    returns: Dict[str, Any]
+    risk_metrics: Dict[str, Any]
+    tags: List[str]
+    benchmark: Optional[str]
+    recommendation_score: float
+    why_recommended: str
+
 
 class MutualFundKnowledge:
     """Manages mutual fund knowledge base and recommendations"""
@@ -103,87 +484,23 @@ class MutualFundKnowledge:
             specific_categories: Specific fund category IDs to filter (e.g., ['nifty_50_index', 'small_cap'])
         """
         try:
-            all_funds = []
-
-            # Iterate through all categories in the JSON data
-            for category in self.funds_data.get('categories', []):
-                category_id = category.get('id', '')
-                category_name = category.get('display_name', '')
-                role = category.get('role_in_portfolio', '')
-
-                # If specific categories are requested, only include those
-                if specific_categories and category_id not in specific_categories:
-                    continue
-
-                # Iterate through funds in this category
-                for fund in category.get('funds', []):
-                    fund_data = dict(fund)
-                    fund_data['category_id'] = category_id
-                    fund_data['category_name'] = category_name
-                    fund_data['role_in_portfolio'] = role
-
-                    # Apply filters
-                    fund_risk = fund_data.get('risk_level', 'Very High')
-
-                    # Risk profile filtering
-                    if risk_profile == 'low' and fund_risk not in ['Low', 'Moderately Low', 'Moderate']:
-                        continue
-                    elif risk_profile == 'moderate' and fund_risk not in ['Moderate', 'High', 'Very High']:
-                        # Allow moderate to access most funds except extremely risky
-                        pass
-                    elif risk_profile == 'high' and fund_risk not in ['High', 'Very High']:
-                        continue
-                    elif risk_profile == 'very_high' and fund_risk != 'Very High':
-                        continue
-
-                    # Category preference filtering (only if specific categories not provided)
-                    if not specific_categories and category_preference:
-                        if category_preference == 'equity':
-                            if category_id in ['gold', 'silver']:
-                                continue
-                        elif category_preference == 'commodity':
-                            if category_id not in ['gold', 'silver']:
-                                continue
-
-                    # Sector filtering (from tags)
-                    if sectors:
-                        tags = fund_data.get('tags', [])
-                        if not any(s.lower() in ','.join(tags).lower() for s in sectors):
-                            continue
-
-                    # Calculate recommendation score
-                    score = self._calculate_fund_score(fund_data, investment_horizon, sectors)
-                    fund_data['recommendation_score'] = score
-                    all_funds.append(fund_data)
-
-            # Sort by recommendation score
-            all_funds.sort(key=lambda x: x.get('recommendation_score', 0), reverse=True)
-
-            # Get top 5 recommendations
-            top_recommendations = all_funds[:5]
-
-            # Format recommendations with clean output
-            formatted_recs = []
-            for fund in top_recommendations:
-                formatted_recs.append({
-                    'fund_name': fund.get('scheme_name'),
-                    'amc': fund.get('amc'),
-                    'category': fund.get('category_name'),
-                    'role': fund.get('role_in_portfolio'),
-                    'risk_level': fund.get('risk_level'),
-                    'is_index_fund': fund.get('is_index_fund'),
-                    'returns': fund.get('trailing_returns_cagr_percent', {}),
-                    'risk_metrics': fund.get('risk_metrics_est', {}),
-                    'tags': fund.get('tags', []),
-                    'benchmark': fund.get('benchmark'),
-                    'recommendation_score': fund.get('recommendation_score', 0),
-                    'why_recommended': self._generate_reason(fund, investment_horizon)
-                })
+            # Normalize the criteria into hashable cache keys; the amount
+            # does not influence ranking so it stays out of the key.
+            sectors_key = tuple(s.lower() for s in sectors) if sectors else None
+            categories_key = frozenset(specific_categories) if specific_categories else None
+
+            recommendations, total_found = self._compute(
+                risk_profile,
+                investment_horizon,
+                sectors_key,
+                category_preference,
+                categories_key
+            )
 
             return {
                 "success": True,
-                "recommendations": formatted_recs,
-                "total_found": len(all_funds),
+                "recommendations": [asdict(rec) for rec in recommendations],
+                "total_found": total_found,
                 "criteria": {
                     "risk_profile": risk_profile,
                     "investment_horizon": investment_horizon,
@@ -197,82 +514,285 @@ class MutualFundKnowledge:
             self.logger.error(f"Error getting fund recommendations: {e}")
             return {"success": False, "error": str(e), "recommendations": []}
 
+    @functools.lru_cache(maxsize=512)
+    def _compute(
+        self,
+        risk_profile: str,
+        investment_horizon: str,
+        sectors_lower: Optional[Tuple[str, ...]],
+        category_preference: Optional[str],
+        specific_categories: Optional[FrozenSet[str]]
+    ) -> Tuple[Tuple[FundRec, ...], int]:
+        """
+        Filter, score and format the top 5 funds for normalized criteria.
+
+        Results are cached per criteria tuple since the funds data is static
+        for the process; call MutualFundKnowledge._compute.cache_clear() if
+        it is ever reloaded. The records are frozen; asdict() deep-copies
+        them for callers.
+        """
+        # Queries without sector or category filters are served from the
+        # rankings precomputed at import
+        precomputed = None
+        if sectors_lower is None and not specific_categories:
+            precomputed = _PRECOMPUTED.get((risk_profile, investment_horizon, category_preference))
+
+        if precomputed is not None:
+            ranked, total_found = precomputed
+            top_recommendations = ranked[:5]
+        else:
+            # Sector terms are matched against tags via bitmasks (None = no filter)
+            sector_mask = _query_mask(sectors_lower) if sectors_lower else None
+            all_funds = self._scan(
+                risk_profile, investment_horizon, sector_mask,
+                category_preference, specific_categories
+            )
+            total_found = len(all_funds)
+
+            # Get top 5 recommendations by score
+            top_recommendations = heapq.nlargest(5, all_funds, key=_SCORE_KEY)
+
+        # Format recommendations with clean output
+        formatted_recs = []
+        for score, fund in top_recommendations:
+            formatted_recs.append(FundRec(
+                fund_name=fund.get('scheme_name'),
+                amc=fund.get('amc'),
+                category=fund.get('category_name'),
+                role=fund.get('role_in_portfolio'),
+                risk_level=fund.get('risk_level'),
+                is_index_fund=fund.get('is_index_fund'),
+                returns=fund.get('trailing_returns_cagr_percent', {}),
+                risk_metrics=fund.get('risk_metrics_est', {}),
+                tags=fund.get('tags', []),
+                benchmark=fund.get('benchmark'),
+                recommendation_score=score,
+                why_recommended=self._generate_reason(fund, investment_horizon)
+            ))
+
+        return tuple(formatted_recs), total_found
+
+    def _scan(
+        self,
+        risk_profile: str,
+        investment_horizon: str,
+        sector_mask: Optional[int],
+        category_preference: Optional[str],
+        specific_categories: Optional[FrozenSet[str]]
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Filter and score every candidate fund, vectorized when possible"""
+        if _FUND_ARRAYS is not None:
+            return self._filter_and_score_vectorized(
+                risk_profile, investment_horizon, sector_mask,
+                category_preference, specific_categories
+            )
+        return self._filter_and_score(
+            risk_profile, investment_horizon, sector_mask,
+            category_preference, specific_categories
+        )
+
+    def _filter_and_score(
+        self,
+        risk_profile: str,
+        investment_horizon: str,
+        sector_mask: Optional[int],
+        category_preference: Optional[str],
+        specific_categories: Optional[FrozenSet[str]]
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """Pure-Python scan returning (score, fund) pairs in index order"""
+        all_funds = []
+
+        # If specific categories are requested, only scan those rows
+        if specific_categories:
+            rows = sorted({
+                i for category_id in specific_categories
+                for i in _BY_CATEGORY.get(category_id, ())
+            })
+            candidates = [_FLAT_FUNDS[i] for i in rows]
+        else:
+            candidates = _FLAT_FUNDS
+
+        allowed_risk = _ALLOWED_RISK.get(risk_profile)
+        score_fn = _SCORE_FNS.get(investment_horizon, _score_no_horizon)
+
+        # Category preference filtering (only if specific categories not
+        # provided): True keeps only commodities, False excludes them
+        want_commodity = None
+        if not specific_categories and category_preference in ('equity', 'commodity'):
+            want_commodity = category_preference == 'commodity'
+
+        # Every fund that survives the sector filter earns the sector bonus
+        tag_matched = sector_mask is not None
+
+        # Cheapest filters first; only survivors are scored
+        for fund_data in candidates:
+            if allowed_risk is not None and fund_data['_risk_level'] not in allowed_risk:
+                continue
+
+            if want_commodity is not None and (fund_data['category_id'] in _COMMODITY_CATEGORIES) != want_commodity:
+                continue
+
+            if tag_matched and not fund_data['_tag_mask'] & sector_mask:
+                continue
+
+            score = score_fn(fund_data, tag_matched)
+            all_funds.append((score, fund_data))
+
+        return all_funds
+
+    def _filter_and_score_vectorized(
+        self,
+        risk_profile: str,
+        investment_horizon: str,
+        sector_mask: Optional[int],
+        category_preference: Optional[str],
+        specific_categories: Optional[FrozenSet[str]]
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        NumPy equivalent of _filter_and_score: the filters become boolean
+        masks and scores are computed for all funds at once over the
+        column arrays. Only the survivors are rounded and paired with their
+        records, so results match the pure-Python scan exactly.
+        """
+        arrays = _FUND_ARRAYS
+        size = len(_FLAT_FUNDS)
+        mask = np.ones(size, dtype=bool)
+
+        # If specific categories are requested, only keep those rows
+        if specific_categories:
+            mask[:] = False
+            for category_id in specific_categories:
+                mask[_BY_CATEGORY.get(category_id, [])] = True
+
+        # Risk profile filtering
+        allowed_risk = _ALLOWED_RISK.get(risk_profile)
+        if allowed_risk is not None:
+            codes = [arrays['risk_codes'][r] for r in allowed_risk if r in arrays['risk_codes']]
+            mask &= np.isin(arrays['risk_code'], codes)
+
+        # Category preference filtering (only if specific categories not provided)
+        if not specific_categories and category_preference:
+            if category_preference == 'equity':
+                mask &= ~arrays['is_commodity']
+            elif category_preference == 'commodity':
+                mask &= arrays['is_commodity']
+
+        # Sector filtering (from tags)
+        if sector_mask is not None:
+            sector_match = (arrays['tag_mask'] & arrays['tag_mask'].dtype.type(sector_mask)) != 0
+            mask &= sector_match
+
+        rows = np.flatnonzero(mask)
+        if not rows.size:
+            return []
+
+        if _score_kernel is not None:
+            score = _score_kernel(
+                _HORIZON_CODES.get(investment_horizon, -1),
+                arrays['r1y'], arrays['r3y'], arrays['r5y'],
+                arrays['sharpe'], arrays['alpha'], arrays['is_index'],
+                sector_match if sector_mask is not None else np.zeros(size, dtype=bool),
+                sector_mask is not None
+            )
+        else:
+            # Score based on returns and horizon
+            r1y, r3y, r5y = arrays['r1y'], arrays['r3y'], arrays['r5y']
+            if investment_horizon == "short":
+                score = np.where(np.isnan(r1y), 0.0, r1y * 2.0)
+            elif investment_horizon == "medium":
+                score = np.where(~np.isnan(r3y), r3y * 1.5, np.where(np.isnan(r1y), 0.0, r1y * 1.0))
+            elif investment_horizon == "long":
+                score = np.where(~np.isnan(r5y), r5y * 1.8, np.where(np.isnan(r3y), 0.0, r3y * 1.2))
+            else:
+                score = np.zeros(size)
+
+            # Risk-adjusted, index fund and sector bonuses
+            sharpe = np.nan_to_num(arrays['sharpe'])
+            alpha = np.nan_to_num(arrays['alpha'])
+            score = score + np.where(sharpe != 0, sharpe * 10, 0.0)
+            score = score + np.where(alpha > 0, alpha * 2, 0.0)
+            score = score + np.where(arrays['is_index'], 5.0, 0.0)
+            if sector_mask is not None:
+                score = score + np.where(sector_match, 10.0, 0.0)
+
+        return [
+            (round(value, 2), _FLAT_FUNDS[i])
+            for i, value in zip(rows.tolist(), score[rows].tolist())
+        ]
+
     def _calculate_fund_score(
         self,
         fund: Dict[str, Any],
         horizon: str,
-        preferred_sectors: Optional[List[str]] = None
+        sector_mask: Optional[int] = None
     ) -> float:
-        """Calculate recommendation score for a fund based on returns and risk metrics"""
-        score = 0.0
-        returns = fund.get('trailing_returns_cagr_percent', {})
-        risk_metrics = fund.get('risk_metrics_est', {})
+        """
+        Calculate recommendation score for a fund based on returns and risk metrics
 
-        # Score based on returns and horizon (weight: 50%)
-        if horizon == "short":
-            ret_1y = returns.get('1y')
-            if ret_1y is not None:
-                score += ret_1y * 2.0  # Emphasize short-term returns
-        elif horizon == "medium":
-            ret_3y = returns.get('3y')
-            if ret_3y is not None:
-                score += ret_3y * 1.5
-            else:
-                ret_1y = returns.get('1y')
-                if ret_1y is not None:
-                    score += ret_1y * 1.0
-        elif horizon == "long":
-            ret_5y = returns.get('5y')
-            if ret_5y is not None:
-                score += ret_5y * 1.8
-            else:
-                ret_3y = returns.get('3y')
-                if ret_3y is not None:
-                    score += ret_3y * 1.2
+        sector_mask is the bitmask of preferred sectors (see _query_mask);
+        a fund earns the sector bonus when any of its tag bits match.
+        """
+        tag_matched = sector_mask is not None and bool(fund['_tag_mask'] & sector_mask)
+        return _SCORE_FNS.get(horizon, _score_no_horizon)(fund, tag_matched)
 
-        # Bonus for risk-adjusted returns (weight: 30%)
-        sharpe = risk_metrics.get('sharpe', 0)
-        alpha = risk_metrics.get('alpha', 0)
+    def ingest_mutual_fund_data_bulk(self, funds: List[Dict[str, Any]], db=None) -> Dict[str, Any]:
+        """
+        Write fund records to the mutual_funds collection through a BulkWriter.
 
-        if sharpe:
-            score += sharpe * 10  # Sharpe ratio bonus
+        Documents are keyed by a slug of the fund name, so re-running an
+        ingest overwrites the funds instead of duplicating them. The result
+        is only reported once the writer has closed, so the count covers
+        writes Firestore actually acknowledged.
+        """
+        if firestore is None:
+            return {"success": False, "error": "firebase_admin is not installed"}
 
-        if alpha and alpha > 0:
-            score += alpha * 2  # Alpha generation bonus
+        db = db or firestore.client()
+        collection = db.collection(MF_COLLECTION)
+        written = 0
 
-        # Bonus for index funds (lower cost) (weight: 10%)
-        if fund.get('is_index_fund'):
-            score += 5
+        def on_write_result(_reference, _result, _writer):
+            nonlocal written
+            written += 1
 
-        # Bonus for sector/tag match (weight: 10%)
-        if preferred_sectors:
-            tags = fund.get('tags', [])
-            tags_str = ','.join(tags).lower()
-            if any(s.lower() in tags_str for s in preferred_sectors):
-                score += 10
+        try:
+            bulk_writer = db.bulk_writer()
+            bulk_writer.on_write_result(on_write_result)
+            bulk_writer.on_write_error(lambda failure, _writer: failure.attempts < MAX_WRITE_ATTEMPTS)
+            for fund in funds:
+                fund_id = _FUND_ID_JUNK.sub('_', fund['fund_name'].lower()).strip('_')
+                bulk_writer.set(collection.document(fund_id), fund)
+            bulk_writer.flush()
+            bulk_writer.close()
+        except Exception as e:
+            self.logger.error(f"Error ingesting mutual fund data: {e}")
+            return {"success": False, "error": str(e), "count": written}
 
-        return round(score, 2)
+        if written < len(funds):
+            return {"success": False, "error": f"{len(funds) - written} of {len(funds)} funds failed to write", "count": written}
+        return {"success": True, "count": written}
 
     def _generate_reason(self, fund: Dict[str, Any], horizon: str) -> str:
         """Generate human-readable reason for recommendation"""
         reasons = []
-        returns = fund.get('trailing_returns_cagr_percent', {})
         risk_metrics = fund.get('risk_metrics_est', {})
 
         # Add return-based reason
-        if horizon == "short" and returns.get('1y') is not None:
-            reasons.append(f"1Y return: {returns['1y']}%")
-        elif horizon == "medium" and returns.get('3y') is not None:
-            reasons.append(f"3Y CAGR: {returns['3y']}%")
-        elif horizon == "long" and returns.get('5y') is not None:
-            reasons.append(f"5Y CAGR: {returns['5y']}%")
+        template = _RETURN_REASONS.get(horizon)
+        if template is not None:
+            period, text = template
+            ret = fund.get('trailing_returns_cagr_percent', {}).get(period)
+            if ret is not None:
+                reasons.append(text.format(ret))
 
         # Add risk metric reasons
-        if risk_metrics.get('sharpe', 0) > 0.8:
-            reasons.append(f"Good risk-adjusted returns (Sharpe: {risk_metrics['sharpe']})")
+        sharpe = risk_metrics.get('sharpe', 0)
+        if sharpe > 0.8:
+            reasons.append(f"Good risk-adjusted returns (Sharpe: {sharpe})")
 
-        if risk_metrics.get('alpha', 0) > 3:
-            reasons.append(f"Strong alpha generation ({risk_metrics['alpha']}%)")
+        alpha = risk_metrics.get('alpha', 0)
+        if alpha > 3:
+            reasons.append(f"Strong alpha generation ({alpha}%)")
 
         # Add fund type
         if fund.get('is_index_fund'):
@@ -280,13 +800,35 @@ class MutualFundKnowledge:
         else:
             reasons.append("Active fund with potential for outperformance")
 
-        return "; ".join(reasons[:3]) if reasons else "Good overall performance"
+        return "; ".join(reasons[:3])
 
 
 # Global instance
 mf_knowledge = MutualFundKnowledge()
 
 
+def _precompute_rankings(knowledge: MutualFundKnowledge, k: int = 20):
+    """
+    Rank the top k funds for every (risk profile, horizon, category
+    preference) combination that has no sector or category filter.
+    """
+    rankings = {}
+    for risk_profile in _ALLOWED_RISK:
+        for horizon in _SCORE_FNS:
+            for category_preference in (None, 'equity', 'commodity'):
+                all_funds = knowledge._scan(risk_profile, horizon, None, category_preference, None)
+                rankings[(risk_profile, horizon, category_preference)] = (
+                    heapq.nlargest(k, all_funds, key=_SCORE_KEY),
+                    len(all_funds)
+                )
+    return rankings
+
+
+# (risk_profile, horizon, category_preference) -> (top-k (score, fund) pairs, total matches)
+_PRECOMPUTED: Dict[Tuple[str, str, Optional[str]], Tuple[List[Tuple[float, Dict[str, Any]]], int]] = \
+    _precompute_rankings(mf_knowledge)
+
+
 def get_mutual_fund_recommendations(
     user_id: str,
     user_profile: Optional[Dict[str, Any]] = None,
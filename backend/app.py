@@ -1,16 +1,70 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Annotated, Optional, Dict, Any, List
+import asyncio
+import atexit
+import hashlib
+import orjson
+import logging
+import logging.handlers
+import queue
 import uvicorn
 import os
+import time
 from datetime import datetime, timedelta
+from ulid import ULID
 
+from http_pool import get_http, close_http
 from setu_service import setu_service, SETU_REDIRECT_URL
-from firestore_service import firestore_service
-from agents.ai_coach_langgraph import get_financial_coaching_langgraph
+from firestore_service import firestore_service, BATCH_WRITE_LIMIT
+from agents.ai_coach_langgraph import get_financial_coaching_langgraph, flush_memory
 
-app = FastAPI(title="FinPath API", version="1.0.0")
+def _configure_logging() -> logging.Logger:
+    """
+    Route app logs through a QueueHandler so request handlers only enqueue
+    records; a background QueueListener does the blocking stream writes.
+    LOG_LEVEL defaults to INFO (set WARNING in production).
+    """
+    log = logging.getLogger("finpath")
+    if not log.handlers:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        listener.start()
+        atexit.register(listener.stop)
+        log.addHandler(logging.handlers.QueueHandler(log_queue))
+        log.propagate = False
+    log.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    return log
+
+logger = _configure_logging()
+
+# Worker threads for blocking calls (Firestore, Setu parsing) made with asyncio.to_thread
+IO_THREADS = int(os.getenv("IO_THREADS", "64"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Size the blocking-I/O thread pool. On shutdown, send queued Mem0 writes
+    and close the shared outbound HTTP client (see http_pool).
+    """
+    # Firestore calls run via asyncio.to_thread, so this bounds concurrent Firestore RPCs
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=IO_THREADS))
+    app.state.http = get_http()
+    try:
+        yield
+    finally:
+        await asyncio.to_thread(flush_memory)
+        await close_http()
+
+app = FastAPI(title="FinPath API", version="1.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -19,10 +73,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Transaction lists are large and compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Pydantic models
+NonNegativeFloat = Annotated[float, Field(ge=0)]
+
 class InitiateConsentRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra='ignore', frozen=True)
+
     mobile: str
     userId: Optional[str] = None
 
@@ -33,16 +95,18 @@ class ConsentCallbackData(BaseModel):
     transactions: Optional[List[Dict[str, Any]]] = None
 
 class GoalData(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra='ignore', frozen=True)
+
     title: str
-    target_amount: float
-    current_amount: float = 0
+    target_amount: NonNegativeFloat
+    current_amount: NonNegativeFloat = 0
     deadline: Optional[str] = None
     description: Optional[str] = None
-    duration_months: Optional[int] = None
+    duration_months: Optional[Annotated[int, Field(ge=0)]] = None
     priority: Optional[str] = None
     category: Optional[str] = None
     emoji: Optional[str] = None
-    monthly_contribution: Optional[float] = None
+    monthly_contribution: Optional[NonNegativeFloat] = None
 
 class ReminderData(BaseModel):
     title: str
@@ -52,8 +116,10 @@ class ReminderData(BaseModel):
     recurrence_type: Optional[str] = None
 
 class ConfirmPaymentRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, extra='ignore', frozen=True)
+
     due_date: str
-    amount: float
+    amount: NonNegativeFloat
 
 
 class AIChatRequest(BaseModel):
@@ -61,12 +127,72 @@ class AIChatRequest(BaseModel):
     question: str
     conversationContext: Optional[Dict[str, Any]] = None
 
+# Short-lived cache of Setu consent status lookups (frontends poll this).
+# Entries are dropped when a webhook or status update arrives for the consent,
+# but only in the worker process that received it.
+CONSENT_CACHE_TTL = 5.0
+CONSENT_CACHE_TERMINAL_TTL = 60.0
+CONSENT_CACHE_MAX_SIZE = 10_000
+# ACTIVE is not final: an active consent can still be paused or revoked
+_TERMINAL_CONSENT_STATUSES = frozenset({"REJECTED", "REVOKED", "EXPIRED"})
+_consent_cache: Dict[str, tuple] = {}
+# Per-consent lock plus the number of requests holding or waiting on it
+_consent_locks: Dict[str, list] = {}
+
+def _invalidate_consent_cache(consent_id: Optional[str]) -> None:
+    if consent_id:
+        _consent_cache.pop(consent_id, None)
+
+@asynccontextmanager
+async def _consent_lock(consent_id: str):
+    """Hold the consent's lock; it is forgotten once no request is using or waiting on it"""
+    entry = _consent_locks.get(consent_id)
+    if entry is None:
+        entry = _consent_locks[consent_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _consent_locks[consent_id]
+
+def _etag_response(request: Request, payload: Any) -> Response:
+    """
+    JSON response tagged with a hash of its body; 304 when the client's
+    If-None-Match already holds it. Polling clients then only download
+    data that actually changed.
+    """
+    body = orjson.dumps(jsonable_encoder(payload))
+    etag = f'"{hashlib.md5(body, usedforsecurity=False).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now().isoformat()}
 
 # Setu Integration Endpoints
+
+# Consent fields returned by the consents listing
+CONSENT_LIST_FIELDS = ['consentId', 'status', 'initiatedAt', 'consentUrl']
+
+# Fixed parts of the consent record stored for every initiated consent
+_CONSENT_PURPOSE = {
+    "code": "101",
+    "text": "Wealth management and financial planning",
+    "refUri": "https://api.rebit.org.in/aa/purpose/101.xml",
+    "category": {"type": "string"}
+}
+_CONSENT_TYPES = ("TRANSACTIONS", "PROFILE", "SUMMARY")
+_CONSENT_FI_TYPES = ("DEPOSIT",)
+_CONSENT_DURATION = {"unit": "MONTH", "value": 6}
+_CONSENT_DATA_LIFE = {"unit": "MONTH", "value": 1}
+_CONSENT_FREQUENCY = {"unit": "MONTH", "value": 1}
 @app.post("/setu/initiate-consent")
 async def initiate_consent(request: InitiateConsentRequest):
     """Initiate consent for bank account linking"""
@@ -75,28 +201,24 @@ async def initiate_consent(request: InitiateConsentRequest):
         
         # Save comprehensive consent to Firestore
         if request.userId:
+            now = datetime.now()
             consent_data = {
                 "consentId": result["consentId"],
                 "status": result["status"],
                 "mobile": request.mobile,
                 "userId": request.userId,
                 "consentUrl": result["consentUrl"],
-                "initiatedAt": datetime.now(),
-                "purpose": {
-                    "code": "101",
-                    "text": "Wealth management and financial planning",
-                    "refUri": "https://api.rebit.org.in/aa/purpose/101.xml",
-                    "category": {"type": "string"}
-                },
-                "consentTypes": ["TRANSACTIONS", "PROFILE", "SUMMARY"],
-                "fiTypes": ["DEPOSIT"],
+                "initiatedAt": now,
+                "purpose": _CONSENT_PURPOSE,
+                "consentTypes": _CONSENT_TYPES,
+                "fiTypes": _CONSENT_FI_TYPES,
                 "dataRange": {
-                    "from": (datetime.now() - timedelta(days=365)).strftime("%Y-%m-%dT00:00:00Z"),
-                    "to": datetime.now().strftime("%Y-%m-%dT00:00:00Z")
+                    "from": (now - timedelta(days=365)).strftime("%Y-%m-%dT00:00:00Z"),
+                    "to": now.strftime("%Y-%m-%dT00:00:00Z")
                 },
-                "consentDuration": {"unit": "MONTH", "value": 6},
-                "dataLife": {"unit": "MONTH", "value": 1},
-                "frequency": {"unit": "MONTH", "value": 1},
+                "consentDuration": _CONSENT_DURATION,
+                "dataLife": _CONSENT_DATA_LIFE,
+                "frequency": _CONSENT_FREQUENCY,
                 "fetchType": "PERIODIC",
                 "consentMode": "STORE",
                 "redirectUrl": SETU_REDIRECT_URL
@@ -104,7 +226,8 @@ async def initiate_consent(request: InitiateConsentRequest):
             
             success = await firestore_service.save_consent(request.userId, consent_data)
             if not success:
-                print(f"Warning: Failed to save consent data for user {request.userId}")
+                logger.warning("Failed to save consent data for user %s", request.userId)
+            await firestore_service.save_consent_index(result["consentId"], request.userId)
         
         # Return the result directly (don't wrap in success/data)
         return result
@@ -128,6 +251,7 @@ async def update_consent_status(consent_id: str, status_data: Dict[str, Any]):
         success = await firestore_service.update_consent_status(user_id, consent_id, status, additional_data)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to update consent status")
+        _invalidate_consent_cache(consent_id)
         
         return {"message": "Consent status updated successfully"}
     except HTTPException:
@@ -139,71 +263,113 @@ async def update_consent_status(consent_id: str, status_data: Dict[str, Any]):
 async def get_consent_status(consent_id: str):
     """Get consent request status from Setu API"""
     try:
-        result = await setu_service.get_consent_status(consent_id, expanded=True)
-        return result
+        cached = _consent_cache.get(consent_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        # Concurrent polls for the same consent share a single Setu request
+        async with _consent_lock(consent_id):
+            cached = _consent_cache.get(consent_id)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+            result = await setu_service.get_consent_status(consent_id, expanded=True)
+
+            ttl = CONSENT_CACHE_TERMINAL_TTL if result.get("status") in _TERMINAL_CONSENT_STATUSES else CONSENT_CACHE_TTL
+            if len(_consent_cache) >= CONSENT_CACHE_MAX_SIZE:
+                _consent_cache.pop(next(iter(_consent_cache)))
+            _consent_cache[consent_id] = (time.monotonic() + ttl, result)
+            return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get consent status: {str(e)}")
 
 @app.get("/users/{user_id}/consents")
-async def get_user_consents(user_id: str):
-    """Get user's consents"""
+async def get_user_consents(user_id: str, response: Response, limit: Optional[int] = None, start_after: Optional[str] = None):
+    """
+    Get user's consents, newest first. Pass limit to page instead (in
+    document-ID order); the X-Next-Cursor header goes back as start_after.
+    """
     try:
-        # Get all consents for user
         consents_ref = firestore_service.db.collection('users').document(user_id).collection('consents')
-        docs = consents_ref.stream()
-        consents = []
-        for doc in docs:
-            consent_data = doc.to_dict()
-            consents.append(consent_data)
-        
+
+        def fetch():
+            # Only the fields clients use are read back from Firestore
+            query = consents_ref.select(CONSENT_LIST_FIELDS)
+            if limit is None:
+                return list(query.stream())
+
+            # Ordering on initiatedAt would drop consents stored without it;
+            # every document has an ID
+            query = query.order_by('__name__')
+            if start_after:
+                cursor = consents_ref.document(start_after).get()
+                if not cursor.exists:
+                    return []
+                query = query.start_after(cursor)
+            return list(query.limit(limit).stream())
+
+        # The blocking reads run in a worker thread
+        docs = await asyncio.to_thread(fetch)
+        if limit is not None and len(docs) == limit:
+            response.headers["X-Next-Cursor"] = docs[-1].id
+
+        consents = [doc.to_dict() for doc in docs]
+        if limit is None:
+            # Consents without initiatedAt sort last
+            dated = sorted((c for c in consents if c.get('initiatedAt')), key=lambda c: c['initiatedAt'], reverse=True)
+            consents = dated + [c for c in consents if not c.get('initiatedAt')]
         return consents
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get consents: {str(e)}")
 
+def _flatten_fi_account(account: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Flatten one FI account's transactions into transaction rows"""
+    link = account.get("linkRefNumber")
+    return [
+        {
+            'txnId': txn.get("txnId"),
+            'accountId': link,
+            'valueDate': txn.get('valueDate'),
+            'type': txn.get('type'),
+            'narration': txn.get('narration'),
+            'amount': txn.get('amount'),
+            'description': txn.get('narration', ''),
+            'reference': txn.get('reference')
+        }
+        for txn in account.get("data", {}).get("account", {}).get("transactions", {}).get("transaction", ())
+    ]
+
 @app.get("/setu/fetch-transactions/{consent_id}")
 async def fetch_transactions(consent_id: str, user_id: str, from_date: Optional[str] = None, to_date: Optional[str] = None):
     """Fetch transactions for a consent and store them in Firestore"""
     try:
-        print(f"🔹 Step 1: Creating data session for consent: {consent_id} (user: {user_id})")
-        
-        # Fetch transactions from Setu API
-        fi_data = await setu_service.fetch_transactions(consent_id, from_date, to_date)
-        
-        # Extract and transform transactions from FI data
-        transactions = []
-        fips = fi_data.get("fips", [])
-        print(f"🔹 Step 4: Found {len(fips)} FIPs in response")
-        
-        for fip in fips:
-            accounts = fip.get("accounts", [])
-            print(f"  FIP has {len(accounts)} accounts")
-            for account in accounts:
-                data = account.get("data", {}).get("account", {})
-                transactions_data = data.get("transactions", {}).get("transaction", [])
-                print(f"  Account has {len(transactions_data)} transactions")
-                
-                for txn in transactions_data:
-                    transformed_txn = {
-                        'txnId': txn.get("txnId"),
-                        'accountId': account.get("linkRefNumber"),
-                        'valueDate': txn.get('valueDate'),
-                        'type': txn.get('type'),
-                        'narration': txn.get('narration'),
-                        'amount': txn.get('amount'),
-                        'description': txn.get('narration', ''),
-                        'reference': txn.get('reference')
-                    }
-                    transactions.append(transformed_txn)
-        
-        print(f"🔹 Step 5: Extracted {len(transactions)} transactions")
-        
+        logger.debug("🔹 Step 1: Creating data session for consent: %s (user: %s)", consent_id, user_id)
+
+        # Accounts are parsed from the FI response as it streams in; each
+        # full batch of rows is handed to Firestore while parsing continues
+        transactions: List[Dict[str, Any]] = []
+        saves = []
+        saved = 0
+        accounts = 0
+        async for account in setu_service.stream_fi_accounts(consent_id, from_date, to_date):
+            accounts += 1
+            transactions.extend(_flatten_fi_account(account))
+            while len(transactions) - saved >= BATCH_WRITE_LIMIT:
+                chunk = transactions[saved:saved + BATCH_WRITE_LIMIT]
+                saves.append(asyncio.create_task(firestore_service.save_transactions(user_id, chunk)))
+                saved += BATCH_WRITE_LIMIT
+        if saved < len(transactions):
+            saves.append(asyncio.create_task(firestore_service.save_transactions(user_id, transactions[saved:])))
+
+        logger.debug("🔹 Step 5: Extracted %d transactions from %d accounts", len(transactions), accounts)
+
         # Store transactions in Firestore if we got any
-        if transactions:
-            success = await firestore_service.save_transactions(user_id, transactions)
+        if saves:
+            success = all(await asyncio.gather(*saves))
             if success:
-                print(f"✅ Successfully stored {len(transactions)} transactions in Firestore for user {user_id}")
+                logger.info("✅ Successfully stored %d transactions in Firestore for user %s", len(transactions), user_id)
             else:
-                print(f"❌ Warning: Failed to save transactions for user {user_id}")
+                logger.warning("❌ Failed to save transactions for user %s", user_id)
         
         return {
             "success": True,
@@ -214,7 +380,7 @@ async def fetch_transactions(consent_id: str, user_id: str, from_date: Optional[
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Error in fetch_transactions: {str(e)}")
+        logger.error("❌ Error in fetch_transactions: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to fetch transactions: {str(e)}")
 
 @app.post("/setu/webhook")
@@ -222,7 +388,7 @@ async def setu_webhook(request: Request, background_tasks: BackgroundTasks):
     """Handle Setu webhook callbacks"""
     try:
         webhook_data = await request.json()
-        print(f"Received webhook: {webhook_data}")
+        logger.debug("Received webhook: %s", webhook_data)
 
         # Extract consent information
         consent_id = webhook_data.get("consentId")
@@ -237,7 +403,7 @@ async def setu_webhook(request: Request, background_tasks: BackgroundTasks):
         return {"status": "received"}
 
     except Exception as e:
-        print(f"Webhook processing error: {e}")
+        logger.error("Webhook processing error: %s", e)
         raise HTTPException(status_code=500, detail=f"Webhook processing failed: {str(e)}")
 
 async def process_setu_webhook(webhook_data: Dict[str, Any]):
@@ -245,13 +411,16 @@ async def process_setu_webhook(webhook_data: Dict[str, Any]):
     try:
         consent_id = webhook_data.get("consentId")
         status = webhook_data.get("status")
+        _invalidate_consent_cache(consent_id)
 
-        # Find user by consent ID (this is a simplified approach)
-        # In production, you'd want a more robust way to map consent IDs to users
-        user_id = webhook_data.get("userId")  # This should be passed in webhook data
+        # Find user by consent ID: prefer the webhook payload, else the
+        # consent_index written when the consent was initiated
+        user_id = webhook_data.get("userId")
+        if not user_id and consent_id:
+            user_id = await firestore_service.get_consent_user(consent_id)
 
         if not user_id:
-            print(f"No userId found for consent {consent_id}")
+            logger.warning("No userId found for consent %s", consent_id)
             return
 
         # Update consent status
@@ -273,13 +442,13 @@ async def process_setu_webhook(webhook_data: Dict[str, Any]):
                 if transactions:
                     await firestore_service.save_transactions(user_id, transactions)
 
-                print(f"Successfully processed data for user {user_id}, consent {consent_id}")
+                logger.info("Successfully processed data for user %s, consent %s", user_id, consent_id)
 
             except Exception as e:
-                print(f"Error fetching FI data for consent {consent_id}: {e}")
+                logger.error("Error fetching FI data for consent %s: %s", consent_id, e)
 
     except Exception as e:
-        print(f"Error processing webhook: {e}")
+        logger.error("Error processing webhook: %s", e)
 
 # User Management Endpoints
 @app.get("/users/{user_id}/profile")
@@ -323,32 +492,41 @@ async def delete_user_account(user_id: str):
 
 # Bank Accounts Endpoints
 @app.get("/users/{user_id}/accounts")
-async def get_user_accounts(user_id: str):
+async def get_user_accounts(user_id: str, request: Request):
     """Get user's bank accounts"""
     try:
         accounts = await firestore_service.get_bank_accounts(user_id)
-        return accounts
+        return _etag_response(request, accounts)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get accounts: {str(e)}")
 
 # Transactions Endpoints
+# Deepest legacy offset still served; Firestore bills every skipped document
+MAX_LEGACY_OFFSET = 200
+
 @app.get("/users/{user_id}/transactions")
-async def get_user_transactions(user_id: str, limit: int = 100, offset: int = 0):
-    """Get user's transactions"""
+async def get_user_transactions(user_id: str, response: Response, limit: int = 100, start_after: Optional[str] = None, offset: int = 0):
+    """Get user's transactions; pass the X-Next-Cursor header back as start_after for the next page"""
+    if offset:
+        if offset > MAX_LEGACY_OFFSET:
+            raise HTTPException(status_code=400, detail=f"offset above {MAX_LEGACY_OFFSET} is not supported; page with start_after")
+        logger.warning("Deprecated offset=%d paging for user %s; use start_after", offset, user_id)
     try:
-        transactions = await firestore_service.get_transactions(user_id, limit, offset)
-        return transactions
+        page = await firestore_service.get_transactions(user_id, limit, start_after, offset)
+        if page["next_cursor"]:
+            response.headers["X-Next-Cursor"] = page["next_cursor"]
+        return page["items"]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get transactions: {str(e)}")
 
 # Goals Endpoints
 # Goals Endpoints
 @app.get("/users/{user_id}/goals")
-async def get_user_goals(user_id: str):
+async def get_user_goals(user_id: str, request: Request):
     """Get user's financial goals"""
     try:
         goals = await firestore_service.get_goals(user_id)
-        return goals
+        return _etag_response(request, goals)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get goals: {str(e)}")
 
@@ -356,8 +534,9 @@ async def get_user_goals(user_id: str):
 async def create_goal(user_id: str, goal: GoalData, background_tasks: BackgroundTasks):
     """Create a new financial goal"""
     try:
-        goal_data = goal.dict(exclude_none=True)
-        goal_data["id"] = f"{user_id}_{datetime.now().isoformat()}"
+        goal_data = goal.model_dump(exclude_none=True)
+        # ULIDs sort by creation time and cannot collide on same-instant creates
+        goal_data["id"] = f"{user_id}_{ULID()}"
         goal_data["ai_processing"] = True  # Mark as AI processing
 
         success = await firestore_service.save_goal(user_id, goal_data)
@@ -377,13 +556,40 @@ async def create_goal(user_id: str, goal: GoalData, background_tasks: Background
         raise HTTPException(status_code=500, detail=f"Failed to create goal: {str(e)}")
 
 
+# In-flight goal analyses keyed by (user_id, goal_id); a newer request for the
+# same goal cancels the older one so only the latest edit is analyzed
+_goal_analyses: Dict[tuple, asyncio.Task] = {}
+
 async def process_goal_analysis(user_id: str, goal_data: Dict[str, Any], context: str):
-    """Background task to process goal AI analysis"""
+    """Background task to process goal AI analysis, superseding any in-flight run for the goal"""
+    key = (user_id, goal_data["id"])
+    previous = _goal_analyses.get(key)
+    if previous is not None and not previous.done():
+        previous.cancel()
+
+    task = asyncio.create_task(_run_goal_analysis(user_id, goal_data, context))
+    _goal_analyses[key] = task
+    try:
+        await task
+    except asyncio.CancelledError:
+        if not task.cancelled():
+            raise
+        logger.debug("Goal analysis for %s superseded by a newer request", key)
+    finally:
+        if _goal_analyses.get(key) is task:
+            del _goal_analyses[key]
+
+async def _run_goal_analysis(user_id: str, goal_data: Dict[str, Any], context: str):
+    """Run the goal AI analysis and store its results on the goal"""
     try:
-        print(f"🚀 Triggering unified goal analysis for user {user_id} goal {goal_data.get('title')}")
+        logger.debug("🚀 Triggering unified goal analysis for user %s goal %s", user_id, goal_data.get('title'))
         from agents.goals_agent import analyze_goal
-        ai_result = await analyze_goal(user_id, goal_data, context)
-        print(f"✅ Unified analysis result: {ai_result}")
+        from crewai_service import get_ai_semaphore
+        # Shares the AI_CONCURRENCY cap with transaction processing, so a burst
+        # of goal edits queues instead of tripping the provider's rate limit
+        async with get_ai_semaphore():
+            ai_result = await analyze_goal(user_id, goal_data, context)
+        logger.debug("✅ Unified analysis result: %s", ai_result)
         
         # Update goal with AI results
         mc = goal_data.get("monthly_contribution")
@@ -399,7 +605,7 @@ async def process_goal_analysis(user_id: str, goal_data: Dict[str, Any], context
             updates["monthly_contribution"] = float(ai_result.get("monthly_contribution") or 0)
         await firestore_service.update_goal_fields(user_id, goal_data["id"], updates)
     except Exception as e:
-        print(f"❌ Unified analysis failed: {e}")
+        logger.error("❌ Unified analysis failed: %s", e)
         # Mark as failed
         await firestore_service.update_goal_fields(user_id, goal_data["id"], {
             "ai_processing": False,
@@ -410,7 +616,7 @@ async def process_goal_analysis(user_id: str, goal_data: Dict[str, Any], context
 async def update_goal(user_id: str, goal_id: str, goal: GoalData, background_tasks: BackgroundTasks):
     """Update a financial goal"""
     try:
-        goal_data = goal.dict(exclude_none=True)
+        goal_data = goal.model_dump(exclude_none=True)
         goal_data["id"] = goal_id
         goal_data["ai_processing"] = True  # Mark as AI processing
 
@@ -523,19 +729,19 @@ async def ai_chat_fast(request: AIChatRequest):
     Chat with the AI financial coach (LangGraph path).
     Same response shape as /ai/chat to allow frontend switching.
     """
-    print(f"[/ai/chat-fast] Received request: userId={request.userId}, question={request.question[:50]}")
+    logger.debug("[/ai/chat-fast] Received request: userId=%s, question=%s", request.userId, request.question[:50])
     try:
-        print(f"[/ai/chat-fast] Calling get_financial_coaching_langgraph...")
+        logger.debug("[/ai/chat-fast] Calling get_financial_coaching_langgraph...")
         result = get_financial_coaching_langgraph(
             user_id=request.userId,
             user_query=request.question,
             conversation_context=request.conversationContext or {},
         )
-        print(f"[/ai/chat-fast] Result received: success={result.get('success')}")
+        logger.debug("[/ai/chat-fast] Result received: success=%s", result.get('success'))
 
         if not result.get("success"):
             detail = f"Financial coaching failed: {result.get('error', 'Unknown error')}"
-            print(f"[/ai/chat-fast] ERROR: {detail}")
+            logger.error("[/ai/chat-fast] %s", detail)
             raise HTTPException(status_code=500, detail=detail)
 
         coach_response = result.get("coach_response", {}) or {}
@@ -549,15 +755,13 @@ async def ai_chat_fast(request: AIChatRequest):
             "model": result.get("model"),
             "timestamp": result.get("timestamp"),
         }
-        print(f"[/ai/chat-fast] Returning response successfully")
+        logger.debug("[/ai/chat-fast] Returning response successfully")
         return response
     except HTTPException as e:
-        print(f"[/ai/chat-fast] HTTPException: {e.detail}")
+        logger.debug("[/ai/chat-fast] HTTPException: %s", e.detail)
         raise
     except Exception as e:
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"[/ai/chat-fast] EXCEPTION: {str(e)}\n{error_trace}")
+        logger.exception("[/ai/chat-fast] EXCEPTION: %s", e)
         raise HTTPException(status_code=500, detail=f"AI coach error: {str(e)}")
 
 
@@ -1,24 +1,46 @@
 """
-CrewAI Service - Sequential AI Processing for Transaction Analysis
+CrewAI Service - AI Processing for Transaction Analysis
 
-This service provides sequential processing:
+This service runs two independent agents on each transaction:
 1. Transaction categorization
-2. Anomaly detection (only if categorization succeeds)
+2. Anomaly detection
+
+Anomaly detection does not use the new category, so both agents run at
+the same time. A transaction counts as processed once categorization
+succeeds; a transaction retried after a failed categorization runs anomaly
+detection again, but its anomaly and alerts are keyed on the transaction
+ID, so they are not written twice.
 
 Used by transaction_monitor_service for clean separation of concerns.
 """
 
 import asyncio
-from typing import Dict, Any
+import os
+from typing import Dict, Any, Optional
 
 # Import crew functions
 from agents.categorization_agent import categorize_transaction_agent
 from agents.anomaly_agent import detect_anomaly_agent
 
 
+# Cap on AI agent runs at once (transactions here, goal analyses in app.py),
+# so a burst of work queues instead of tripping the provider's rate limit
+AI_CONCURRENCY = int(os.getenv("AI_CONCURRENCY", "20"))
+
+_ai_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_ai_semaphore() -> asyncio.Semaphore:
+    """Process-wide AI semaphore, created on first use inside the running loop"""
+    global _ai_semaphore
+    if _ai_semaphore is None:
+        _ai_semaphore = asyncio.Semaphore(AI_CONCURRENCY)
+    return _ai_semaphore
+
+
 class TransactionCrewService:
     """
-    Service for sequential transaction AI processing.
+    Service for transaction AI processing.
     """
 
     def __init__(self):
@@ -31,7 +53,11 @@ class TransactionCrewService:
         transaction_data: Dict[str, Any]
     ) -> Dict[str, Any]:
         """
-        Process transaction sequentially: categorization first, then anomaly detection.
+        Process transaction: categorization and anomaly detection run concurrently.
+
+        Both agents block on synchronous crew kickoffs, so each runs on its
+        own event loop in a worker thread; total latency is the slower of
+        the two rather than their sum.
 
         Args:
             user_id: User identifier
@@ -41,13 +67,18 @@ class TransactionCrewService:
         Returns:
             Dict containing processing results
         """
-        print(f"🔄 Sequential AI processing for transaction {transaction_id}")
+        print(f"🔄 AI processing for transaction {transaction_id}")
 
-        # Step 1: Categorization
-        print(f"🤖 Step 1: Running categorization...")
-        categorization_result = await categorize_transaction_agent(
-            user_id, transaction_id, transaction_data
-        )
+        print(f"🤖 Running categorization and anomaly detection...")
+        async with get_ai_semaphore():
+            categorization_result, anomaly_result = await asyncio.gather(
+                asyncio.to_thread(asyncio.run, categorize_transaction_agent(
+                    user_id, transaction_id, transaction_data
+                )),
+                asyncio.to_thread(asyncio.run, self._run_anomaly_detection_with_retry(
+                    user_id, transaction_id, transaction_data
+                ))
+            )
 
         if categorization_result.get('status') != 'completed':
             return {
@@ -55,15 +86,9 @@ class TransactionCrewService:
                 'stage': 'categorization',
                 'error': categorization_result.get('error', 'Categorization failed'),
                 'categorization': categorization_result,
-                'anomaly': None
+                'anomaly': anomaly_result
             }
 
-        # Step 2: Anomaly Detection (with retry logic)
-        print(f"🔍 Step 2: Running anomaly detection...")
-        anomaly_result = await self._run_anomaly_detection_with_retry(
-            user_id, transaction_id, transaction_data
-        )
-
         return {
             'status': 'completed',
             'stage': 'both',
@@ -122,7 +147,7 @@ async def process_transaction_ai(
     transaction_data: Dict[str, Any]
 ) -> Dict[str, Any]:
     """
-    Main entry point for sequential AI transaction processing.
+    Main entry point for AI transaction processing.
 
     Args:
         user_id: User identifier
@@ -1,13 +1,73 @@
 import os
+import asyncio
+import functools
+import itertools
+import re
+import time
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud.firestore import FieldFilter
 from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 import json
 from dotenv import load_dotenv
 
+from transaction_fields import normalize_amount, normalize_merchant
+
 load_dotenv()
 
+# Firestore rejects write batches with more than 500 operations
+BATCH_WRITE_LIMIT = 500
+
+# Firestore clients (each with its own gRPC channel) that calls are spread over
+FIRESTORE_CLIENT_POOL = max(1, int(os.getenv("FIRESTORE_CLIENT_POOL", "4")))
+
+# Narration keywords per category, in priority order: the first category
+# with any keyword in the narration wins
+_CATEGORY_KEYWORDS = (
+    ('dining', ('swiggy', 'zomato', 'food', 'restaurant', 'cafe', 'dining')),
+    ('transport', ('uber', 'ola', 'taxi', 'auto', 'transport')),
+    ('shopping', ('amazon', 'flipkart', 'shopping', 'store')),
+    ('income', ('salary', 'income', 'credit')),
+    ('groceries', ('grocery', 'supermarket', 'bigbasket')),
+    ('entertainment', ('entertainment', 'movie', 'netflix', 'hotstar')),
+)
+
+_CATEGORY_OF_KEYWORD = {keyword: category for category, keywords in _CATEGORY_KEYWORDS for keyword in keywords}
+_CATEGORY_RANK = {category: rank for rank, (category, _) in enumerate(_CATEGORY_KEYWORDS)}
+_CATEGORY_PATTERNS = tuple(
+    (category, re.compile('|'.join(map(re.escape, keywords))))
+    for category, keywords in _CATEGORY_KEYWORDS
+)
+# Any keyword of any category, so narrations without one are rejected in a single scan
+_ANY_CATEGORY_KEYWORD = re.compile('|'.join(map(re.escape, _CATEGORY_OF_KEYWORD)))
+
+@functools.lru_cache(maxsize=8192)
+def _categorize_narration(narration: str) -> str:
+    """
+    Keyword category for a narration.
+
+    Cached because bulk pulls repeat the same narrations (recurring
+    merchants, UPI handles) many times.
+    """
+    narration_lower = narration.lower()
+    match = _ANY_CATEGORY_KEYWORD.search(narration_lower)
+    if match is None:
+        return 'other'
+
+    # The leftmost keyword decides unless a higher-priority category also
+    # appears; nothing matches before the leftmost keyword, so the
+    # higher-priority scans start there
+    category = _CATEGORY_OF_KEYWORD[match.group()]
+    start = match.start()
+    for higher, pattern in _CATEGORY_PATTERNS[:_CATEGORY_RANK[category]]:
+        if pattern.search(narration_lower, start):
+            return higher
+    return category
+
+# How long transaction summaries and bank account lists are served from memory
+READ_CACHE_TTL = 300.0
+
 class FirestoreService:
     def __init__(self):
         # Initialize Firebase Admin SDK
@@ -46,16 +106,69 @@ class FirestoreService:
                     print(f"Failed to initialize Firebase even in development mode: {e2}")
                     raise e
 
-        self.db = firestore.client()
+        # The Firestore clients (and their gRPC channels) are built on first
+        # use rather than at import, keeping them off the process start-up path
+        self._db_pool: Optional[List[Any]] = None
+        self._db_turn = itertools.count()
+        # consent_id -> user_id never changes once issued, so lookups are cached
+        self._consent_users: Dict[str, str] = {}
+        # (user_id, period) / user_id -> (monotonic time cached, value);
+        # entries are dropped when this service writes the underlying data
+        self._summary_cache: Dict[tuple, tuple] = {}
+        self._accounts_cache: Dict[str, tuple] = {}
+
+    def _clients(self) -> List[Any]:
+        """
+        FIRESTORE_CLIENT_POOL clients, created on first access.
+
+        One client multiplexes every call over a single gRPC channel; extra
+        named Firebase apps with the default app's credentials give each
+        client its own channel.
+        """
+        if self._db_pool is None:
+            default_app = firebase_admin.get_app()
+            options = {'projectId': default_app.project_id} if default_app.project_id else None
+            clients = [firestore.client(default_app)]
+            for i in range(1, FIRESTORE_CLIENT_POOL):
+                name = f"firestore-pool-{i}"
+                try:
+                    app = firebase_admin.get_app(name)
+                except ValueError:
+                    app = firebase_admin.initialize_app(default_app.credential, options, name=name)
+                clients.append(firestore.client(app))
+            self._db_pool = clients
+        return self._db_pool
+
+    @property
+    def db(self):
+        """Firestore client for calls not tied to a user, taken round-robin from the pool"""
+        clients = self._clients()
+        return clients[next(self._db_turn) % len(clients)]
+
+    def _db_for(self, user_id: str):
+        """The pool client that serves a user; fixed per user so cached references and batches agree"""
+        clients = self._clients()
+        return clients[hash(user_id) % len(clients)]
+
+    @functools.lru_cache(maxsize=4096)
+    def _user_collection(self, user_id: str, name: str):
+        """users/{user_id}/{name} collection reference, built once per user and collection"""
+        return self._db_for(user_id).collection('users').document(user_id).collection(name)
+
+    def _invalidate_user_reads(self, user_id: str) -> None:
+        """Drop cached summaries and accounts for a user after a write"""
+        self._accounts_cache.pop(user_id, None)
+        for key in [key for key in self._summary_cache if key[0] == user_id]:
+            self._summary_cache.pop(key, None)
 
     # User Management
     async def create_user(self, user_id: str, user_data: Dict[str, Any]) -> bool:
         """Create or update user profile"""
         try:
-            user_ref = self.db.collection('users').document(user_id)
-            user_data['created_at'] = datetime.now()
-            user_data['updated_at'] = datetime.now()
-            user_ref.set(user_data, merge=True)
+            user_ref = self._db_for(user_id).collection('users').document(user_id)
+            user_data['created_at'] = firestore.SERVER_TIMESTAMP
+            user_data['updated_at'] = firestore.SERVER_TIMESTAMP
+            await asyncio.to_thread(user_ref.set, user_data, merge=True)
             return True
         except Exception as e:
             print(f"Error creating user: {e}")
@@ -64,8 +177,8 @@ class FirestoreService:
     async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user profile"""
         try:
-            user_ref = self.db.collection('users').document(user_id)
-            doc = user_ref.get()
+            user_ref = self._db_for(user_id).collection('users').document(user_id)
+            doc = await asyncio.to_thread(user_ref.get)
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -76,9 +189,9 @@ class FirestoreService:
     async def update_user(self, user_id: str, user_data: Dict[str, Any]) -> bool:
         """Update user profile"""
         try:
-            user_ref = self.db.collection('users').document(user_id)
+            user_ref = self._db_for(user_id).collection('users').document(user_id)
             user_data['updated_at'] = datetime.now()
-            user_ref.update(user_data)
+            await asyncio.to_thread(user_ref.update, user_data)
             return True
         except Exception as e:
             print(f"Error updating user: {e}")
@@ -88,13 +201,12 @@ class FirestoreService:
     async def save_bank_accounts(self, user_id: str, accounts: List[Dict[str, Any]]) -> bool:
         """Save user's bank accounts"""
         try:
-            batch = self.db.batch()
+            batch = self._db_for(user_id).batch()
 
-            # Delete existing accounts
-            accounts_ref = self.db.collection('users').document(user_id).collection('accounts')
-            existing_accounts = accounts_ref.stream()
-            for account in existing_accounts:
-                batch.delete(account.reference)
+            # Delete existing accounts (by ID only; contents are never read)
+            accounts_ref = self._user_collection(user_id, 'accounts')
+            for account_id in await self.get_bank_account_ids(user_id):
+                batch.delete(accounts_ref.document(account_id))
 
             # Add new accounts
             for account in accounts:
@@ -103,146 +215,231 @@ class FirestoreService:
                 account_data = {
                     **account,
                     'user_id': user_id,
-                    'created_at': datetime.now(),
-                    'updated_at': datetime.now()
+                    'created_at': firestore.SERVER_TIMESTAMP,
+                    'updated_at': firestore.SERVER_TIMESTAMP
                 }
                 batch.set(account_ref, account_data)
 
-            batch.commit()
+            await asyncio.to_thread(batch.commit)
+            self._invalidate_user_reads(user_id)
             return True
         except Exception as e:
             print(f"Error saving bank accounts: {e}")
             return False
 
+    async def get_bank_account_ids(self, user_id: str) -> List[str]:
+        """IDs of user's bank accounts, listed without reading the account documents"""
+        accounts_ref = self._user_collection(user_id, 'accounts')
+        return await asyncio.to_thread(lambda: [ref.id for ref in accounts_ref.list_documents()])
+
     async def get_bank_accounts(self, user_id: str) -> List[Dict[str, Any]]:
         """Get user's bank accounts"""
+        cached = self._accounts_cache.get(user_id)
+        if cached is not None and time.monotonic() - cached[0] < READ_CACHE_TTL:
+            return cached[1]
         try:
-            accounts_ref = self.db.collection('users').document(user_id).collection('accounts')
-            docs = accounts_ref.stream()
-            return [doc.to_dict() for doc in docs]
+            accounts_ref = self._user_collection(user_id, 'accounts')
+            accounts = await asyncio.to_thread(lambda: [doc.to_dict() for doc in accounts_ref.stream()])
+            self._accounts_cache[user_id] = (time.monotonic(), accounts)
+            return accounts
         except Exception as e:
             print(f"Error getting bank accounts: {e}")
             return []
 
     # Transactions Management
     async def save_transactions(self, user_id: str, transactions: List[Dict[str, Any]]) -> bool:
-        """Save user's transactions"""
+        """
+        Save user's transactions.
+
+        Writes are split into batches of BATCH_WRITE_LIMIT documents that are
+        committed concurrently. Setu transactions use their txnId as the
+        document ID; IDs that already exist are looked up with get_all and
+        skipped, so re-fetching an overlapping range costs reads, not writes.
+        """
         try:
-            batch = self.db.batch()
-            transactions_ref = self.db.collection('users').document(user_id).collection('transactions')
-
-            for transaction in transactions:
-                # Handle both direct transaction objects and transformed Setu data
-                if 'txnId' in transaction:
-                    # Transformed Setu transaction data
-                    transaction_id = transaction.get('txnId')
-                    # Parse the valueDate and convert to datetime
-                    value_date_str = transaction.get('valueDate')
-                    if value_date_str:
-                        try:
-                            # Try ISO format first
-                            date_obj = datetime.fromisoformat(value_date_str.replace('Z', '+00:00'))
-                        except:
-                            # Fallback to other formats if needed
-                            date_obj = datetime.now()
-                    else:
-                        date_obj = datetime.now()
-                    
-                    transaction_data = {
-                        'id': transaction_id,
-                        'accountId': transaction.get('accountId', ''),
-                        'date': date_obj,
-                        'type': 'credit' if transaction.get('type') == 'CREDIT' else 'debit',
-                        'merchant': transaction.get('narration', transaction.get('description', 'Unknown Merchant')),
-                        'category': self._categorize_transaction(transaction.get('narration', '')),
-                        'amount': float(transaction.get('amount', 0)),
-                        'description': transaction.get('narration', ''),
-                        'setuTransactionId': transaction_id,
-                        'user_id': user_id,
-                        'created_at': datetime.now(),
-                        'updated_at': datetime.now()
-                    }
-                else:
-                    # Fallback for other formats
-                    transaction_id = transaction.get('id', f"{user_id}_{transaction.get('reference', datetime.now().isoformat())}")
-                    transaction_data = {
-                        **transaction,
-                        'user_id': user_id,
-                        'created_at': datetime.now(),
-                        'updated_at': datetime.now()
-                    }
-                
-                transaction_ref = transactions_ref.document(transaction_id)
-                batch.set(transaction_ref, transaction_data)
-
-            batch.commit()
+            transactions_ref = self._user_collection(user_id, 'transactions')
+            now = datetime.now()
+            docs = [self._build_transaction_doc(user_id, transaction, now) for transaction in transactions]
+
+            db = self._db_for(user_id)
+            existing = await asyncio.to_thread(
+                self._existing_doc_ids, db, transactions_ref, [transaction_id for transaction_id, _ in docs]
+            )
+            if existing:
+                docs = [(transaction_id, data) for transaction_id, data in docs if transaction_id not in existing]
+
+            batches = []
+            for i in range(0, len(docs), BATCH_WRITE_LIMIT):
+                batch = db.batch()
+                for transaction_id, transaction_data in docs[i:i + BATCH_WRITE_LIMIT]:
+                    batch.set(transactions_ref.document(transaction_id), transaction_data)
+                batches.append(batch)
+
+            await asyncio.gather(*(asyncio.to_thread(batch.commit) for batch in batches))
+            self._invalidate_user_reads(user_id)
             return True
         except Exception as e:
             print(f"Error saving transactions: {e}")
             return False
 
-    def _categorize_transaction(self, narration: str) -> str:
-        """Categorize transaction based on narration"""
-        narration_lower = narration.lower()
-        
-        if any(keyword in narration_lower for keyword in ['swiggy', 'zomato', 'food', 'restaurant', 'cafe', 'dining']):
-            return 'dining'
-        elif any(keyword in narration_lower for keyword in ['uber', 'ola', 'taxi', 'auto', 'transport']):
-            return 'transport'
-        elif any(keyword in narration_lower for keyword in ['amazon', 'flipkart', 'shopping', 'store']):
-            return 'shopping'
-        elif any(keyword in narration_lower for keyword in ['salary', 'income', 'credit']):
-            return 'income'
-        elif any(keyword in narration_lower for keyword in ['grocery', 'supermarket', 'bigbasket']):
-            return 'groceries'
-        elif any(keyword in narration_lower for keyword in ['entertainment', 'movie', 'netflix', 'hotstar']):
-            return 'entertainment'
+    def _existing_doc_ids(self, db, collection_ref, doc_ids: List[str]) -> set:
+        """Return the subset of doc_ids that already exist in collection_ref"""
+        existing = set()
+        unique_ids = list(dict.fromkeys(doc_ids))
+        for i in range(0, len(unique_ids), BATCH_WRITE_LIMIT):
+            refs = [collection_ref.document(doc_id) for doc_id in unique_ids[i:i + BATCH_WRITE_LIMIT]]
+            # Only existence matters, so ask for a single small field
+            for snapshot in db.get_all(refs, field_paths=['id']):
+                if snapshot.exists:
+                    existing.add(snapshot.id)
+        return existing
+
+    def _build_transaction_doc(self, user_id: str, transaction: Dict[str, Any], now: datetime):
+        """
+        Return (document ID, document data) for a transaction to store.
+
+        now is the batch's timestamp, used when a transaction has no usable
+        date; created_at/updated_at are set by the Firestore server.
+        """
+        # Handle both direct transaction objects and transformed Setu data
+        if 'txnId' in transaction:
+            # Transformed Setu transaction data
+            transaction_id = transaction.get('txnId')
+            # Parse the valueDate and convert to datetime
+            value_date_str = transaction.get('valueDate')
+            if value_date_str:
+                try:
+                    # Try ISO format first
+                    date_obj = datetime.fromisoformat(value_date_str.replace('Z', '+00:00'))
+                except:
+                    # Fallback to other formats if needed
+                    date_obj = now
+            else:
+                date_obj = now
+
+            merchant = transaction.get('narration', transaction.get('description', 'Unknown Merchant'))
+            transaction_data = {
+                'id': transaction_id,
+                'accountId': transaction.get('accountId', ''),
+                'date': date_obj,
+                'type': 'credit' if transaction.get('type') == 'CREDIT' else 'debit',
+                'merchant': merchant,
+                'category': self._categorize_transaction(transaction.get('narration', '')),
+                'amount': float(transaction.get('amount', 0)),
+                'description': transaction.get('narration', ''),
+                'setuTransactionId': transaction_id,
+                'user_id': user_id,
+                # Lookup key for recurring-transaction detection
+                'merchant_normalized': normalize_merchant(merchant),
+                # The keyword category is provisional; the transaction monitor
+                # picks the document up for AI categorization
+                'uncategorized': True,
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'updated_at': firestore.SERVER_TIMESTAMP
+            }
         else:
-            return 'other'
+            # Fallback for other formats
+            transaction_id = transaction.get('id', f"{user_id}_{transaction.get('reference', datetime.now().isoformat())}")
+            transaction_data = {
+                **transaction,
+                'user_id': user_id,
+                'uncategorized': True,
+                'created_at': firestore.SERVER_TIMESTAMP,
+                'updated_at': firestore.SERVER_TIMESTAMP
+            }
+            if transaction.get('merchant'):
+                transaction_data['merchant_normalized'] = normalize_merchant(transaction['merchant'])
+            # Numeric, so the summary's sum('amount') aggregation counts it
+            amount = normalize_amount(transaction.get('amount'))
+            if amount is not None:
+                transaction_data['amount'] = amount
 
-    async def get_transactions(self, user_id: str, limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
-        """Get user's transactions"""
+        return transaction_id, transaction_data
+
+    def _categorize_transaction(self, narration: str) -> str:
+        """Categorize transaction based on narration"""
+        return _categorize_narration(narration)
+
+    async def get_transactions(self, user_id: str, limit: int = 100, start_after: Optional[str] = None, offset: int = 0) -> Dict[str, Any]:
+        """
+        Get one page of user's transactions, newest first.
+
+        start_after is the next_cursor of the previous page (a transaction
+        document ID). Paging resumes from that document's snapshot, so each
+        page costs O(limit) reads however deep it is. offset is only kept for
+        old clients; it is applied server-side but still billed per skipped
+        document.
+        """
         try:
-            transactions_ref = self.db.collection('users').document(user_id).collection('transactions')
-            query = transactions_ref.order_by('date', direction=firestore.Query.DESCENDING).limit(limit)
+            transactions_ref = self._user_collection(user_id, 'transactions')
+            query = transactions_ref.order_by('date', direction=firestore.Query.DESCENDING)
+            if start_after:
+                cursor = await asyncio.to_thread(transactions_ref.document(start_after).get)
+                if not cursor.exists:
+                    return {"items": [], "next_cursor": None}
+                query = query.start_after(cursor)
             if offset > 0:
-                # This is a simplified offset implementation
-                docs = list(query.stream())[offset:]
-            else:
-                docs = query.stream()
+                query = query.offset(offset)
+            docs = await asyncio.to_thread(lambda: list(query.limit(limit).stream()))
             
-            transactions = []
-            for doc in docs:
-                data = doc.to_dict()
-                # Ensure date is properly serialized
-                if 'date' in data and hasattr(data['date'], 'isoformat'):
-                    data['date'] = data['date'].isoformat()
-                transactions.append(data)
+            # Dates stay native datetimes; the API layer's JSON encoder
+            # serializes them, so internal callers can compare them directly
+            transactions = [doc.to_dict() for doc in docs]
             
-            return transactions
+            next_cursor = docs[-1].id if len(docs) == limit else None
+            return {"items": transactions, "next_cursor": next_cursor}
         except Exception as e:
             print(f"Error getting transactions: {e}")
-            return []
+            return {"items": [], "next_cursor": None}
 
     # Consent Management
     async def save_consent(self, user_id: str, consent_data: Dict[str, Any]) -> bool:
         """Save consent information"""
         try:
-            consent_ref = self.db.collection('users').document(user_id).collection('consents').document(consent_data['consentId'])
+            consent_ref = self._user_collection(user_id, 'consents').document(consent_data['consentId'])
             consent_data['user_id'] = user_id
             consent_data['created_at'] = datetime.now()
             consent_data['updated_at'] = datetime.now()
-            consent_ref.set(consent_data)
+            await asyncio.to_thread(consent_ref.set, consent_data)
             return True
         except Exception as e:
             print(f"Error saving consent: {e}")
             return False
 
+    async def save_consent_index(self, consent_id: str, user_id: str) -> bool:
+        """Record which user owns a consent so webhooks can be routed without a userId"""
+        try:
+            index_ref = self.db.collection('consent_index').document(consent_id)
+            await asyncio.to_thread(index_ref.set, {'userId': user_id, 'created_at': datetime.now()})
+            self._consent_users[consent_id] = user_id
+            return True
+        except Exception as e:
+            print(f"Error saving consent index: {e}")
+            return False
+
+    async def get_consent_user(self, consent_id: str) -> Optional[str]:
+        """Look up the user that initiated a consent"""
+        user_id = self._consent_users.get(consent_id)
+        if user_id:
+            return user_id
+        try:
+            index_ref = self.db.collection('consent_index').document(consent_id)
+            doc = await asyncio.to_thread(index_ref.get)
+            if doc.exists:
+                user_id = (doc.to_dict() or {}).get('userId')
+                if user_id:
+                    self._consent_users[consent_id] = user_id
+                return user_id
+            return None
+        except Exception as e:
+            print(f"Error getting consent user: {e}")
+            return None
+
     async def get_consent(self, user_id: str, consent_id: str) -> Optional[Dict[str, Any]]:
         """Get consent information"""
         try:
-            consent_ref = self.db.collection('users').document(user_id).collection('consents').document(consent_id)
-            doc = consent_ref.get()
+            consent_ref = self._user_collection(user_id, 'consents').document(consent_id)
+            doc = await asyncio.to_thread(consent_ref.get)
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -253,7 +450,7 @@ class FirestoreService:
     async def update_consent_status(self, user_id: str, consent_id: str, status: str, additional_data: Optional[Dict] = None) -> bool:
         """Update consent status and merge additional data"""
         try:
-            consent_ref = self.db.collection('users').document(user_id).collection('consents').document(consent_id)
+            consent_ref = self._user_collection(user_id, 'consents').document(consent_id)
             
             update_data = {
                 'status': status,
@@ -267,7 +464,7 @@ class FirestoreService:
                     if key not in ['userId', 'status']:  # Don't overwrite these
                         update_data[key] = value
             
-            consent_ref.update(update_data)
+            await asyncio.to_thread(consent_ref.update, update_data)
             return True
         except Exception as e:
             print(f"Error updating consent status: {e}")
@@ -275,10 +472,18 @@ class FirestoreService:
 
     # Process FI Data
     async def process_fi_data(self, user_id: str, consent_id: str, fi_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Process and store FI data from Setu"""
+        """
+        Process and store FI data from Setu.
+
+        Writes are collected per document first: the same account or txnId
+        can appear in several FIP pulls, and a batch may not write one
+        document twice. A later occurrence overrides an earlier one.
+        """
         try:
-            accounts_saved = 0
-            transactions_saved = 0
+            accounts_ref = self._user_collection(user_id, 'accounts')
+            transactions_ref = self._user_collection(user_id, 'transactions')
+            pending_accounts: Dict[str, Dict[str, Any]] = {}
+            pending_transactions: Dict[str, Dict[str, Any]] = {}
             
             fips = fi_data.get("fips", [])
             
@@ -303,39 +508,57 @@ class FirestoreService:
                         "summary": data.get("summary", {}),
                         "type": data.get("type"),
                         "user_id": user_id,
-                        "created_at": datetime.now(),
-                        "updated_at": datetime.now()
+                        "created_at": firestore.SERVER_TIMESTAMP,
+                        "updated_at": firestore.SERVER_TIMESTAMP
                     }
-                    
-                    # Save account
-                    account_ref = self.db.collection('users').document(user_id).collection('accounts').document(account_info["id"])
-                    account_ref.set(account_info, merge=True)
-                    accounts_saved += 1
+                    pending_accounts[account_info["id"]] = account_info
                     
                     # Save transactions
                     transactions_data = data.get("transactions", {}).get("transaction", [])
-                    if transactions_data:
-                        batch = self.db.batch()
-                        for txn in transactions_data:
-                            txn_id = txn.get("txnId") or txn.get("reference")
-                            if txn_id:
-                                txn_ref = self.db.collection('users').document(user_id).collection('transactions').document(txn_id)
-                                txn_data = {
-                                    **txn,
-                                    "user_id": user_id,
-                                    "account_id": account.get("linkRefNumber"),
-                                    "fipID": fip_id,
-                                    "created_at": datetime.now()
-                                }
-                                batch.set(txn_ref, txn_data, merge=True)
-                                transactions_saved += 1
-                        
-                        batch.commit()
+                    for txn in transactions_data:
+                        txn_id = txn.get("txnId") or txn.get("reference")
+                        if txn_id:
+                            doc = {
+                                **txn,
+                                "user_id": user_id,
+                                "account_id": account.get("linkRefNumber"),
+                                "fipID": fip_id,
+                                "created_at": firestore.SERVER_TIMESTAMP
+                            }
+                            # Setu amounts are strings; store a number so sum('amount') counts it
+                            amount = normalize_amount(txn.get("amount"))
+                            if amount is not None:
+                                doc["amount"] = amount
+                            pending_transactions[txn_id] = doc
+
+            db = self._db_for(user_id)
+
+            # New transactions are queued for AI categorization; re-pulled ones
+            # keep their flag so the merge does not undo a categorization
+            if pending_transactions:
+                existing = await asyncio.to_thread(
+                    self._existing_doc_ids, db, transactions_ref, list(pending_transactions)
+                )
+                for txn_id, doc in pending_transactions.items():
+                    if txn_id not in existing:
+                        doc["uncategorized"] = True
+
+            writes = [(accounts_ref.document(doc_id), doc) for doc_id, doc in pending_accounts.items()]
+            writes += [(transactions_ref.document(doc_id), doc) for doc_id, doc in pending_transactions.items()]
+
+            batches = []
+            for i in range(0, len(writes), BATCH_WRITE_LIMIT):
+                batch = db.batch()
+                for doc_ref, doc in writes[i:i + BATCH_WRITE_LIMIT]:
+                    batch.set(doc_ref, doc, merge=True)
+                batches.append(batch)
+            await asyncio.gather(*(asyncio.to_thread(batch.commit) for batch in batches))
             
+            self._invalidate_user_reads(user_id)
             return {
                 "success": True,
-                "accounts_saved": accounts_saved,
-                "transactions_saved": transactions_saved
+                "accounts_saved": len(pending_accounts),
+                "transactions_saved": len(pending_transactions)
             }
         except Exception as e:
             print(f"Error processing FI data: {e}")
@@ -350,13 +573,13 @@ class FirestoreService:
     async def save_goal(self, user_id: str, goal_data: Dict[str, Any]) -> bool:
         """Save a financial goal"""
         try:
-            goals_ref = self.db.collection('users').document(user_id).collection('goals')
+            goals_ref = self._user_collection(user_id, 'goals')
             goal_id = goal_data.get('id', f"{user_id}_{datetime.now().isoformat()}")
             goal_ref = goals_ref.document(goal_id)
             goal_data['user_id'] = user_id
             goal_data['created_at'] = datetime.now()
             goal_data['updated_at'] = datetime.now()
-            goal_ref.set(goal_data)
+            await asyncio.to_thread(goal_ref.set, goal_data)
             return True
         except Exception as e:
             print(f"Error saving goal: {e}")
@@ -365,18 +588,17 @@ class FirestoreService:
     async def get_goals(self, user_id: str) -> List[Dict[str, Any]]:
         """Get user's financial goals"""
         try:
-            goals_ref = self.db.collection('users').document(user_id).collection('goals')
-            docs = goals_ref.stream()
-            return [doc.to_dict() for doc in docs]
+            goals_ref = self._user_collection(user_id, 'goals')
+            return await asyncio.to_thread(lambda: [doc.to_dict() for doc in goals_ref.stream()])
         except Exception as e:
             print(f"Error getting goals: {e}")
             return []
 
     async def update_goal_fields(self, user_id: str, goal_id: str, updates: Dict[str, Any]) -> bool:
         try:
-            goal_ref = self.db.collection('users').document(user_id).collection('goals').document(goal_id)
+            goal_ref = self._user_collection(user_id, 'goals').document(goal_id)
             updates['updated_at'] = datetime.now()
-            goal_ref.set(updates, merge=True)
+            await asyncio.to_thread(goal_ref.set, updates, merge=True)
             return True
         except Exception as e:
             print(f"Error updating goal: {e}")
@@ -384,8 +606,8 @@ class FirestoreService:
 
     async def get_goal(self, user_id: str, goal_id: str) -> Optional[Dict[str, Any]]:
         try:
-            goal_ref = self.db.collection('users').document(user_id).collection('goals').document(goal_id)
-            doc = goal_ref.get()
+            goal_ref = self._user_collection(user_id, 'goals').document(goal_id)
+            doc = await asyncio.to_thread(goal_ref.get)
             if doc.exists:
                 return doc.to_dict()
             return None
@@ -395,8 +617,8 @@ class FirestoreService:
 
     async def delete_goal(self, user_id: str, goal_id: str) -> bool:
         try:
-            goal_ref = self.db.collection('users').document(user_id).collection('goals').document(goal_id)
-            goal_ref.delete()
+            goal_ref = self._user_collection(user_id, 'goals').document(goal_id)
+            await asyncio.to_thread(goal_ref.delete)
             return True
         except Exception as e:
             print(f"Error deleting goal: {e}")
@@ -404,10 +626,10 @@ class FirestoreService:
 
     async def save_reminder(self, user_id: str, reminder_id: str, reminder_data: Dict[str, Any]) -> bool:
         try:
-            rem_ref = self.db.collection('users').document(user_id).collection('reminders').document(reminder_id)
+            rem_ref = self._user_collection(user_id, 'reminders').document(reminder_id)
             reminder_data['user_id'] = user_id
             reminder_data['created_at'] = datetime.now()
-            rem_ref.set(reminder_data, merge=True)
+            await asyncio.to_thread(rem_ref.set, reminder_data, merge=True)
             return True
         except Exception as e:
             print(f"Error saving reminder: {e}")
@@ -415,13 +637,8 @@ class FirestoreService:
 
     async def get_reminders(self, user_id: str) -> List[Dict[str, Any]]:
         try:
-            rem_ref = self.db.collection('users').document(user_id).collection('reminders')
-            docs = rem_ref.stream()
-            reminders = []
-            for doc in docs:
-                data = doc.to_dict()
-                reminders.append(data)
-            return reminders
+            rem_ref = self._user_collection(user_id, 'reminders')
+            return await asyncio.to_thread(lambda: [doc.to_dict() for doc in rem_ref.stream()])
         except Exception as e:
             print(f"Error getting reminders: {e}")
             return []
@@ -429,9 +646,10 @@ class FirestoreService:
     # Analytics helpers
     async def get_transaction_summary(self, user_id: str, period: str = 'month') -> Dict[str, Any]:
         """Get transaction summary for analytics"""
+        cached = self._summary_cache.get((user_id, period))
+        if cached is not None and time.monotonic() - cached[0] < READ_CACHE_TTL:
+            return cached[1]
         try:
-            transactions = await self.get_transactions(user_id, limit=1000)
-
             # Calculate date range based on period
             now = datetime.now()
             if period == 'month':
@@ -444,26 +662,61 @@ class FirestoreService:
             else:
                 start_date = now - timedelta(days=30)
 
-            # Filter transactions by date
-            filtered_transactions = [
-                t for t in transactions
-                if datetime.fromisoformat(t.get('date', '2000-01-01')) >= start_date
-            ]
+            # Only transactions in the period are considered
+            transactions_ref = self._user_collection(user_id, 'transactions')
+            query = (
+                transactions_ref
+                .where(filter=FieldFilter('date', '>=', start_date))
+                .where(filter=FieldFilter('date', '<=', now))
+            )
 
             # Calculate summary
-            total_income = sum(float(t.get('amount', 0)) for t in filtered_transactions if t.get('type') == 'credit')
-            total_expenses = sum(float(t.get('amount', 0)) for t in filtered_transactions if t.get('type') == 'debit')
-
-            return {
+            if hasattr(query, 'sum'):
+                # Server-side aggregations: three small RPCs, no documents downloaded.
+                # Needs the (type, date) composite index on transactions.
+                credits = query.where(filter=FieldFilter('type', '==', 'credit')).sum('amount')
+                debits = query.where(filter=FieldFilter('type', '==', 'debit')).sum('amount')
+                total_income, total_expenses, transaction_count = await asyncio.gather(
+                    asyncio.to_thread(_aggregate_value, credits),
+                    asyncio.to_thread(_aggregate_value, debits),
+                    asyncio.to_thread(_aggregate_value, query.count())
+                )
+                total_income = float(total_income or 0)
+                total_expenses = float(total_expenses or 0)
+                transaction_count = int(transaction_count or 0)
+            else:
+                # Older google-cloud-firestore without sum(): stream only the fields the totals need
+                def summarize():
+                    total_income = 0.0
+                    total_expenses = 0.0
+                    transaction_count = 0
+                    for doc in query.select(['type', 'amount']).stream():
+                        t = doc.to_dict()
+                        transaction_count += 1
+                        if t.get('type') == 'credit':
+                            total_income += float(t.get('amount', 0))
+                        elif t.get('type') == 'debit':
+                            total_expenses += float(t.get('amount', 0))
+                    return total_income, total_expenses, transaction_count
+
+                total_income, total_expenses, transaction_count = await asyncio.to_thread(summarize)
+
+            summary = {
                 'total_income': total_income,
                 'total_expenses': total_expenses,
                 'net_amount': total_income - total_expenses,
-                'transaction_count': len(filtered_transactions),
+                'transaction_count': transaction_count,
                 'period': period
             }
+            self._summary_cache[(user_id, period)] = (time.monotonic(), summary)
+            return summary
         except Exception as e:
             print(f"Error getting transaction summary: {e}")
             return {}
 
+def _aggregate_value(aggregation_query) -> Any:
+    """Run a single-aggregation query and return its value"""
+    return aggregation_query.get()[0][0].value
+
 # Global instance
 firestore_service = FirestoreService()
\ No newline at end of file
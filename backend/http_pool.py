@@ -0,0 +1,33 @@
+"""
+Process-wide pooled HTTP client for outbound API calls.
+
+Every outbound async call (Setu today) shares one HTTP/2 client so
+connections are kept alive between requests instead of paying a TLS
+handshake per call.
+"""
+
+from typing import Optional
+
+import httpx
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http() -> httpx.AsyncClient:
+    """Shared client, created on first use (and again if it was closed)"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+            timeout=30.0
+        )
+    return _http_client
+
+
+async def close_http() -> None:
+    """Close the shared client; called on app shutdown"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,99 @@
+import os
+import sys
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from transaction_fields import normalize_amount, normalize_merchant
+
+# Attempts per document before BulkWriter gives up on it
+MAX_WRITE_ATTEMPTS = 3
+
+# Documents queued in the BulkWriter before waiting for them to be sent
+FLUSH_EVERY = 450
+
+def initialize_firebase():
+    """Initialize Firebase with service account credentials"""
+    try:
+        # Check if Firebase is already initialized
+        firebase_admin.get_app()
+        print("Firebase already initialized")
+    except ValueError:
+        # Initialize Firebase
+        cred = credentials.Certificate('mumbaihacks-63c0c-firebase-adminsdk-fbsvc-a7a6cd0780.json')
+        firebase_admin.initialize_app(cred)
+        print("Firebase initialized successfully with service account")
+
+def _backfill_updates(data):
+    """Return the fields a transaction document written before they existed is missing"""
+    updates = {}
+
+    # The transaction monitor only queries uncategorized == True; anything the
+    # categorization agent has not stamped still needs AI processing
+    if 'uncategorized' not in data:
+        updates['uncategorized'] = 'categorized_at' not in data
+
+    # Recurring detection queries merchant_normalized, derived from merchant;
+    # this also corrects keys earlier derived from the refined merchant name
+    if data.get('merchant'):
+        merchant_key = normalize_merchant(data['merchant'])
+        if data.get('merchant_normalized') != merchant_key:
+            updates['merchant_normalized'] = merchant_key
+
+    # Firestore sum() skips string amounts, as older Setu imports stored them
+    if isinstance(data.get('amount'), str):
+        amount = normalize_amount(data['amount'])
+        if amount is not None:
+            updates['amount'] = amount
+
+    return updates
+
+def backfill_transactions():
+    """Add the derived fields to every existing transaction document"""
+    # Initialize Firebase
+    initialize_firebase()
+
+    # Initialize Firestore client
+    db = firestore.client()
+
+    failed = []
+
+    def on_write_error(failure, _writer):
+        if failure.attempts < MAX_WRITE_ATTEMPTS:
+            return True
+        failed.append(failure)
+        return False
+
+    bulk_writer = db.bulk_writer()
+    bulk_writer.on_write_error(on_write_error)
+    scanned = 0
+    count = 0
+
+    # Every user's transactions subcollection
+    for doc in db.collection_group('transactions').stream():
+        scanned += 1
+        updates = _backfill_updates(doc.to_dict() or {})
+        if not updates:
+            continue
+
+        bulk_writer.update(doc.reference, updates)
+        count += 1
+
+        # Keep the writer's queue (and memory) bounded on large collections
+        if count % FLUSH_EVERY == 0:
+            bulk_writer.flush()
+
+    # Wait for all pending writes
+    try:
+        bulk_writer.close()
+    except Exception as e:
+        print(f"Error committing updates to Firestore: {e}")
+        return
+
+    for failure in failed:
+        print(f"Error updating {failure.operation.reference.path}: {failure.message}")
+    print(f"Backfilled {count - len(failed)} of {count} transactions ({scanned} scanned)")
+
+if __name__ == "__main__":
+    backfill_transactions()
@@ -1,8 +1,31 @@
 import json
+import os
+import sys
 import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Attempts per document before BulkWriter gives up on it
+MAX_WRITE_ATTEMPTS = 3
+
+# Documents queued in the BulkWriter before waiting for them to be sent
+FLUSH_EVERY = 450
+
+# Characters of a merchant name replaced in transaction IDs: spaces as before,
+# and '/' which would otherwise split the Firestore document path
+_ID_TABLE = str.maketrans({' ': '_', '/': '_'})
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from transaction_fields import normalize_merchant
+
+JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError) if ijson is not None else (json.JSONDecodeError,)
+
 def initialize_firebase():
     """Initialize Firebase with service account credentials"""
     try:
@@ -15,6 +38,13 @@ def initialize_firebase():
         firebase_admin.initialize_app(cred)
         print("Firebase initialized successfully with service account")
 
+def _iter_transactions(f):
+    """Yield the transactions of the file's top-level JSON array one at a time"""
+    if ijson is None:
+        yield from json.load(f)
+    else:
+        yield from ijson.items(f, 'item', use_float=True)
+
 def ingest_transactions_from_json(user_id, json_file_path):
     """Ingest transactions from JSON file to Firestore"""
     # Initialize Firebase
@@ -23,65 +53,97 @@ def ingest_transactions_from_json(user_id, json_file_path):
     # Initialize Firestore client
     db = firestore.client()
 
-    # Load transactions from JSON file
+    # Stream transactions from the JSON file; with ijson only one
+    # transaction is in memory at a time, however large the file
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            transactions = json.load(f)
-        print(f"Loaded {len(transactions)} transactions from JSON file")
+        f = open(json_file_path, 'rb')
     except FileNotFoundError:
         print(f"Error: JSON file '{json_file_path}' not found")
         return
-    except json.JSONDecodeError as e:
-        print(f"Error parsing JSON file: {e}")
-        return
 
-    if not transactions:
-        print("No transactions found in JSON file")
-        return
+    # Save transactions to Firestore (each as separate document in user subcollection).
+    # BulkWriter sends the writes as parallel, rate-limited RPCs instead of one
+    # atomic batch, so large files are not capped at 500 documents and a single
+    # bad document does not fail the rest.
+    failed = []
 
-    # Save transactions to Firestore (each as separate document in user subcollection)
-    batch = db.batch()
+    def on_write_error(failure, _writer):
+        if failure.attempts < MAX_WRITE_ATTEMPTS:
+            return True
+        failed.append(failure)
+        return False
+
+    bulk_writer = db.bulk_writer()
+    bulk_writer.on_write_error(on_write_error)
     transactions_ref = db.collection('users').document(user_id).collection('transactions')
+    count = 0
+    # One timestamp for the run, used for transactions without a usable date
+    now = datetime.now()
+
+    with f:
+        try:
+            for transaction in _iter_transactions(f):
+                # Prepare transaction data for Firestore
+                date_str = transaction.get('date')
+                if date_str:
+                    try:
+                        # Parse ISO format date
+                        date_obj = datetime.fromisoformat(date_str)
+                    except:
+                        date_obj = now
+                else:
+                    date_obj = now
+
+                # Generate a unique transaction ID
+                txn_id = f"{user_id}_{date_str}_{transaction.get('merchant', 'unknown').translate(_ID_TABLE)}_{abs(transaction.get('amount', 0))}"
+
+                merchant = transaction.get('merchant', 'Unknown Merchant')
+                transaction_data = {
+                    'id': txn_id,
+                    'accountId': 'primary_account',  # Default account ID
+                    'date': date_obj,
+                    'type': transaction.get('type', 'debit'),
+                    'merchant': merchant,
+                    # Lookup key for recurring-transaction detection
+                    'merchant_normalized': normalize_merchant(merchant),
+                    'category': transaction.get('category', 'other'),
+                    'amount': float(transaction.get('amount', 0)),
+                    'description': transaction.get('description', ''),
+                    'user_id': user_id,
+                    # Picked up by the transaction monitor for AI categorization
+                    'uncategorized': True,
+                    'created_at': firestore.SERVER_TIMESTAMP
+                }
+
+                transaction_ref = transactions_ref.document(txn_id)
+                bulk_writer.set(transaction_ref, transaction_data)
+                count += 1
+
+                # Keep the writer's queue (and memory) bounded on large files
+                if count % FLUSH_EVERY == 0:
+                    bulk_writer.flush()
+        except JSON_ERRORS as e:
+            print(f"Error parsing JSON file: {e}")
+            bulk_writer.close()
+            print(f"Stopped after {count} transactions")
+            return
 
-    for transaction in transactions:
-        # Prepare transaction data for Firestore
-        date_str = transaction.get('date')
-        if date_str:
-            try:
-                # Parse ISO format date
-                date_obj = datetime.fromisoformat(date_str)
-            except:
-                date_obj = datetime.now()
-        else:
-            date_obj = datetime.now()
-
-        # Generate a unique transaction ID
-        txn_id = f"{user_id}_{date_str}_{transaction.get('merchant', 'unknown').replace(' ', '_')}_{abs(transaction.get('amount', 0))}"
-
-        transaction_data = {
-            'id': txn_id,
-            'accountId': 'primary_account',  # Default account ID
-            'date': date_obj,
-            'type': transaction.get('type', 'debit'),
-            'merchant': transaction.get('merchant', 'Unknown Merchant'),
-            'category': transaction.get('category', 'other'),
-            'amount': float(transaction.get('amount', 0)),
-            'description': transaction.get('description', ''),
-            'user_id': user_id,
-            'created_at': datetime.now(),
-            'updated_at': datetime.now()
-        }
-
-        transaction_ref = transactions_ref.document(txn_id)
-        batch.set(transaction_ref, transaction_data)
-
-    # Commit the batch
+    if not count:
+        bulk_writer.close()
+        print("No transactions found in JSON file")
+        return
+
+    # Wait for all pending writes
     try:
-        batch.commit()
-        print(f"Successfully ingested {len(transactions)} transactions for user {user_id}")
-        print("Each transaction stored as a separate document in the user's transactions subcollection")
+        bulk_writer.close()
     except Exception as e:
         print(f"Error committing transactions to Firestore: {e}")
+        return
+
+    for failure in failed:
+        print(f"Error writing {failure.operation.reference.id}: {failure.message}")
+    print(f"Successfully ingested {count - len(failed)} of {count} transactions for user {user_id}")
+    print("Each transaction stored as a separate document in the user's transactions subcollection")
 
 # Example usage
 if __name__ == "__main__":
@@ -8,17 +8,40 @@ Usage:
     python scripts/test_transaction_trigger.py
 """
 
+import asyncio
 import os
 import sys
+import time
 from datetime import datetime, timedelta
+from itertools import islice
 import random
-import pytz
+from zoneinfo import ZoneInfo
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
+from google.api_core.exceptions import Aborted, AlreadyExists, DeadlineExceeded, ServiceUnavailable
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Timezone of the generated transaction dates
+IST = ZoneInfo('Asia/Kolkata')
+
+# Firestore's limit on writes in one WriteBatch commit
+BATCH_SIZE = 500
+
+# Attempts per WriteBatch commit or BulkWriter write on transient errors
+MAX_WRITE_ATTEMPTS = 5
+
+# Errors after which a WriteBatch commit is retried
+RETRYABLE_ERRORS = (Aborted, DeadlineExceeded, ServiceUnavailable)
+
+# Write rate ramp-up following Firestore's 500/50/5 rule: start at 500
+# writes/sec and grow 50% every 5 minutes, up to the 10k writes/sec
+# database limit. WriteBatch commits are paced at the initial rate.
+INITIAL_WRITES_PER_SECOND = 500
+MAX_WRITES_PER_SECOND = 10_000
+
 # Initialize Firebase
 def initialize_firebase():
     """Initialize Firebase Admin SDK."""
@@ -39,6 +62,17 @@ def initialize_firebase():
             print(f"❌ Firebase initialization error: {e}")
             sys.exit(1)
 
+# One Firestore client (and connection pool) serves the whole script
+_db = None
+
+def get_db():
+    """Return the script's Firestore client, creating it on first use."""
+    global _db
+    if _db is None:
+        initialize_firebase()
+        _db = firestore.client()
+    return _db
+
 # Sample test transactions from real bank statement
 TEST_TRANSACTIONS = [
     {
@@ -143,31 +177,31 @@ TEST_TRANSACTIONS = [
     }
 ]
 
-def add_test_transaction(user_id: str, transaction_data: dict, delay_days: int = 0) -> str:
+def _print_transaction(transaction_id: str, transaction_data: dict):
+    """Print a summary of an added transaction in a single write."""
+    sys.stdout.write(
+        f"✅ Added transaction: {transaction_id}\n"
+        f"   Type: {transaction_data['type']}\n"
+        f"   Amount: ₹{transaction_data['amount']}\n"
+        f"   Description: {transaction_data['description'][:60]}...\n"
+        "\n"
+    )
+
+def _build_record(txn_coll, transaction_data: dict, delay_days: int, now: datetime):
     """
-    Add a test transaction to Firestore.
-    
-    Args:
-        user_id: User ID
-        transaction_data: Transaction data dictionary
-        delay_days: Number of days to backdate the transaction (default: 0)
+    Create a new transaction document reference and the data to write to it.
     
-    Returns:
-        Transaction document ID
+    Transactions that are not backdated take the server's commit time as
+    their date instead of a client-side timestamp.
     """
-    db = firestore.client()
-    
-    # Create transaction document
-    transaction_ref = db.collection('users').document(user_id).collection('transactions').document()
-    transaction_id = transaction_ref.id
-    
-    # Calculate transaction date
-    ist = pytz.timezone('Asia/Kolkata')
-    transaction_date = datetime.now(ist) - timedelta(days=delay_days)
+    if delay_days:
+        transaction_date = now - timedelta(days=delay_days)
+    else:
+        transaction_date = firestore.SERVER_TIMESTAMP
     
-    # Prepare transaction data
+    transaction_ref = txn_coll.document()
     transaction = {
-        'id': transaction_id,
+        'id': transaction_ref.id,
         'accountId': f'acc_{random.randint(1000, 9999)}',
         'date': transaction_date,
         'type': transaction_data['type'],
@@ -175,21 +209,90 @@ def add_test_transaction(user_id: str, transaction_data: dict, delay_days: int =
         'description': transaction_data['description'],
         'created_at': firestore.SERVER_TIMESTAMP,
         'updated_at': firestore.SERVER_TIMESTAMP,
-        'source': 'test_script'
+        'source': 'test_script',
+        # Picked up by the transaction monitor; cleared once categorized
+        'uncategorized': True
     }
+    return transaction_ref, transaction
+
+def add_test_transaction(user_id: str, transaction_data: dict, delay_days: int = 0, db=None, txn_coll=None) -> str:
+    """
+    Add a test transaction to Firestore.
+    
+    Args:
+        user_id: User ID
+        transaction_data: Transaction data dictionary
+        delay_days: Number of days to backdate the transaction (default: 0)
+        db: Firestore client to use (default: the script's shared client)
+        txn_coll: The user's transactions collection, for callers adding
+            several transactions (default: resolved from db and user_id)
+    
+    Returns:
+        Transaction document ID
+    """
+    if txn_coll is None:
+        txn_coll = (db or get_db()).collection('users').document(user_id).collection('transactions')
+    
+    transaction_ref, transaction = _build_record(txn_coll, transaction_data, delay_days, datetime.now(IST))
     
     # Add to Firestore (this will trigger the Cloud Function)
     transaction_ref.set(transaction)
+    _print_transaction(transaction_ref.id, transaction_data)
     
-    print(f"✅ Added transaction: {transaction_id}")
-    print(f"   Type: {transaction_data['type']}")
-    print(f"   Amount: ₹{transaction_data['amount']}")
-    print(f"   Description: {transaction_data['description'][:60]}...")
-    print()
+    return transaction_ref.id
+
+def commit_with_retry(batch, max_attempts: int = MAX_WRITE_ATTEMPTS):
+    """
+    Commit a WriteBatch of creates, retrying with jittered exponential backoff
+    on transient errors.
     
-    return transaction_id
+    A commit that timed out may still have been applied; the batch is
+    all-or-nothing, so AlreadyExists on a retry means it was.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return batch.commit()
+        except AlreadyExists:
+            if attempt == 0:
+                raise
+            return None
+        except RETRYABLE_ERRORS:
+            if attempt == max_attempts - 1:
+                raise
+            time.sleep(2 ** attempt * 0.1 + random.random() * 0.1)
 
-def add_multiple_transactions(user_id: str, count: int = 5, spread_days: int = 30):
+async def add_many(user_id: str, selected_transactions: list, spread_days: int, now: datetime) -> list:
+    """
+    Write test transactions concurrently on a Firestore AsyncClient.
+    
+    Each create runs as a task on one event loop rather than a thread per
+    in-flight write. The client is created here, inside the loop its gRPC
+    channel binds to.
+    
+    Returns:
+        The document ID written for each transaction, or None where the write failed
+    """
+    db = firestore_async.client()
+    txn_coll = db.collection('users').document(user_id).collection('transactions')
+    records = [
+        _build_record(txn_coll, txn_data, random.randint(0, spread_days), now)
+        for txn_data in selected_transactions
+    ]
+    results = await asyncio.gather(
+        *(transaction_ref.create(transaction) for transaction_ref, transaction in records),
+        return_exceptions=True
+    )
+    
+    transaction_ids = []
+    for (transaction_ref, _), result in zip(records, results):
+        if isinstance(result, Exception):
+            print(f"❌ Error writing transaction {transaction_ref.id}: {result}")
+            transaction_ids.append(None)
+        else:
+            transaction_ids.append(transaction_ref.id)
+    return transaction_ids
+
+def add_multiple_transactions(user_id: str, count: int = 5, spread_days: int = 30, atomic: bool = False, use_async: bool = False, quiet: bool = False):
     """
     Add multiple test transactions spread over a time period.
     
@@ -197,20 +300,82 @@ def add_multiple_transactions(user_id: str, count: int = 5, spread_days: int = 3
         user_id: User ID
         count: Number of transactions to add
         spread_days: Number of days to spread transactions over
+        atomic: Commit in WriteBatches of up to BATCH_SIZE writes, each applied
+            all-or-nothing, instead of through a BulkWriter
+        use_async: Write through add_many on an AsyncClient instead
+        quiet: Only print the final summary, not each added transaction
     """
     print(f"🚀 Adding {count} test transactions for user: {user_id}\n")
     
     # Select random transactions
     selected_transactions = random.sample(TEST_TRANSACTIONS, min(count, len(TEST_TRANSACTIONS)))
     
-    transaction_ids = []
-    for i, txn_data in enumerate(selected_transactions):
-        # Spread transactions over the time period
-        delay = random.randint(0, spread_days)
-        txn_id = add_test_transaction(user_id, txn_data, delay_days=delay)
-        transaction_ids.append(txn_id)
+    now = datetime.now(IST)
+    
+    if use_async:
+        initialize_firebase()
+        transaction_ids = asyncio.run(add_many(user_id, selected_transactions, spread_days, now))
+    else:
+        db = get_db()
+        txn_coll = db.collection('users').document(user_id).collection('transactions')
+        
+        # Build every document up front (references, account IDs, dates spread
+        # over the time period), so the write phase below only sends RPCs
+        records = [
+            _build_record(txn_coll, txn_data, random.randint(0, spread_days), now)
+            for txn_data in selected_transactions
+        ]
+        
+        # Paths of documents whose write failed; they are not reported as added
+        failed = set()
+        
+        if atomic:
+            # Commit the batches one after another, each taking at least as
+            # long as its writes are allowed at the initial write rate
+            pending = iter(records)
+            while chunk := list(islice(pending, BATCH_SIZE)):
+                started = time.monotonic()
+                batch = db.batch()
+                for transaction_ref, transaction in chunk:
+                    batch.create(transaction_ref, transaction)
+                try:
+                    commit_with_retry(batch)
+                except Exception as e:
+                    failed.update(transaction_ref.path for transaction_ref, _ in chunk)
+                    print(f"❌ Error committing batch of {len(chunk)} transactions: {e}")
+                time.sleep(max(0.0, len(chunk) / INITIAL_WRITES_PER_SECOND - (time.monotonic() - started)))
+        else:
+            # Queue the writes on a BulkWriter, which sends them in parallel
+            # instead of waiting for one round-trip per transaction
+            bulk_writer = db.bulk_writer(options=BulkWriterOptions(
+                initial_ops_per_second=INITIAL_WRITES_PER_SECOND,
+                max_ops_per_second=MAX_WRITES_PER_SECOND
+            ))
+            def on_write_error(failure, _writer):
+                if failure.attempts < MAX_WRITE_ATTEMPTS:
+                    return True
+                failed.add(failure.operation.reference.path)
+                print(f"❌ Error adding transaction {failure.operation.reference.id}: {failure.message}")
+                return False
+            
+            bulk_writer.on_write_error(on_write_error)
+            for transaction_ref, transaction in records:
+                bulk_writer.create(transaction_ref, transaction)
+            bulk_writer.flush()
+            bulk_writer.close()
+        
+        transaction_ids = [
+            None if transaction_ref.path in failed else transaction_ref.id
+            for transaction_ref, _ in records
+        ]
+    
+    if not quiet:
+        for txn_id, txn_data in zip(transaction_ids, selected_transactions):
+            if txn_id:
+                _print_transaction(txn_id, txn_data)
+    transaction_ids = [txn_id for txn_id in transaction_ids if txn_id]
     
-    print(f"\n✅ Successfully added {len(transaction_ids)} transactions")
+    print(f"\n✅ Successfully added {len(transaction_ids)} of {len(selected_transactions)} transactions")
     print(f"   User ID: {user_id}")
     print(f"   Transaction IDs: {transaction_ids[:3]}{'...' if len(transaction_ids) > 3 else ''}")
     print(f"\n⏳ Cloud Function will automatically categorize these transactions using AI")
@@ -1,13 +1,28 @@
 import os
-import httpx
+import asyncio
+import contextlib
 import json
-from typing import Dict, List, Optional, Any
+import logging
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
 import base64
+import httpx
 from dotenv import load_dotenv
 
+from http_pool import get_http
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 load_dotenv()
 
+# Child of the app's "finpath" logger, whose queue handler does the writes
+logger = logging.getLogger("finpath.setu")
+
 # Setu API Configuration
 SETU_BASE_URL = os.getenv("SETU_BASE_URL")
 SETU_CLIENT_ID = os.getenv("SETU_CLIENT_ID")
@@ -15,20 +30,107 @@ SETU_CLIENT_SECRET = os.getenv("SETU_CLIENT_SECRET")
 SETU_PRODUCT_INSTANCE_ID = os.getenv("SETU_PRODUCT_INSTANCE_ID")
 SETU_REDIRECT_URL = os.getenv("SETU_REDIRECT_URL")
 
+# Per-request timeouts for Setu calls on the shared client: 5s to connect,
+# 10s for each read/write/pool wait
+SETU_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# HTTP methods _make_api_call sends
+_API_METHODS = frozenset({"GET", "POST", "PUT"})
+
+# Refresh the OAuth token this long before Setu says it expires
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
+
+# Token lifetime assumed when the login response has no expires_in
+DEFAULT_TOKEN_LIFETIME = timedelta(hours=1)
+
+# Retry backoff for rate-limited calls: capped exponential with jitter,
+# starting at POLL_BASE_DELAY seconds and never longer than POLL_MAX_DELAY
+POLL_BASE_DELAY = 1.0
+POLL_MAX_DELAY = 30.0
+
+# Data session polling: the first poll after POLL_INITIAL_INTERVAL seconds,
+# each later interval POLL_GROWTH times longer up to POLL_MAX_INTERVAL, and
+# no new poll once SESSION_POLL_TIMEOUT seconds have passed
+POLL_INITIAL_INTERVAL = 0.5
+POLL_GROWTH = 1.5
+POLL_MAX_INTERVAL = 5.0
+SESSION_POLL_TIMEOUT = 60.0
+
+# Retries of a Setu call answered with 429 Too Many Requests
+RATE_LIMIT_RETRIES = 3
+
+# Circuit breaker: after FAIL_THRESHOLD consecutive failed Setu calls
+# (transport errors, 429 or 5xx), fail fast for OPEN_SECONDS, then let a
+# single probe call through to decide whether to close the circuit again
+FAIL_THRESHOLD = 5
+OPEN_SECONDS = 30.0
+
+# Data session states in which FI data is available
+FI_READY_STATUSES = ("PARTIAL", "COMPLETED")
+
+# ijson prefix of one account object inside a data session response
+_FI_ACCOUNT_PREFIX = "fips.item.accounts.item"
+
+def _backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retry number attempt (0-based), with up to 50% jitter"""
+    return min(POLL_MAX_DELAY, POLL_BASE_DELAY * 2 ** attempt) * (1 + random.random() * 0.5)
+
+
+def _retry_after(response) -> Optional[float]:
+    """Delay in seconds requested by a Retry-After header, if it gives one"""
+    try:
+        return min(POLL_MAX_DELAY, max(0.0, float(response.headers["Retry-After"])))
+    except (KeyError, ValueError):
+        return None
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Setu while the circuit breaker is open"""
+
+
 class SetuService:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        # Injected client, or None to use the process-wide pool from http_pool
+        self._client = client
         self.base_url = SETU_BASE_URL
         self.client_id = SETU_CLIENT_ID
         self.client_secret = SETU_CLIENT_SECRET
         self.product_instance_id = SETU_PRODUCT_INSTANCE_ID
         self._access_token = None
         self._token_expires_at = None
+        self._token_lock = asyncio.Lock()
+        # Reused for every authenticated call; only Authorization changes,
+        # when the token is refreshed
+        self._headers = {
+            "Authorization": "",
+            "Content-Type": "application/json",
+            "x-product-instance-id": self.product_instance_id
+        }
+        self._failures = 0
+        self._circuit_open_until = 0.0
+        self._probe_in_flight = False
+
+    def _http(self) -> httpx.AsyncClient:
+        """HTTP client for Setu calls"""
+        return self._client if self._client is not None else get_http()
 
     async def _get_access_token(self) -> str:
         """Get OAuth2 access token from Setu"""
-        if self._access_token and self._token_expires_at and datetime.now() < self._token_expires_at:
+        if self._token_valid():
             return self._access_token
 
+        # Only one caller refreshes; the others wait and reuse its token
+        async with self._token_lock:
+            if self._token_valid():
+                return self._access_token
+            return await self._refresh_access_token()
+
+    def _token_valid(self) -> bool:
+        """Whether the cached access token can still be used"""
+        return bool(self._access_token and self._token_expires_at and datetime.now() < self._token_expires_at)
+
+    async def _refresh_access_token(self) -> str:
+        """Log in to Setu and cache the new access token"""
         # Use the correct Setu OAuth endpoint
         url = "https://orgservice-prod.setu.co/v1/users/login"
         headers = {
@@ -42,45 +144,139 @@ class SetuService:
             "secret": self.client_secret
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=data)
+        response = await self._http().post(url, headers=headers, json=data, timeout=SETU_TIMEOUT)
 
         if response.status_code != 200:
             raise Exception(f"Failed to get access token: {response.status_code} - {response.text}")
 
         token_data = response.json()
         self._access_token = token_data["access_token"]
-        # Token expires in 1 hour, set expiry to 50 minutes for safety
-        self._token_expires_at = datetime.now() + timedelta(minutes=50)
+        try:
+            lifetime = timedelta(seconds=float(token_data["expires_in"]))
+        except (KeyError, TypeError, ValueError):
+            lifetime = DEFAULT_TOKEN_LIFETIME
+        self._token_expires_at = datetime.now() + lifetime - TOKEN_EXPIRY_MARGIN
+        self._headers["Authorization"] = f"Bearer {self._access_token}"
 
         return self._access_token
 
-    async def _make_api_call(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Dict:
-        """Make authenticated API call to Setu"""
-        token = await self._get_access_token()
-        url = f"{self.base_url}{endpoint}"
-
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json",
-            "x-product-instance-id": self.product_instance_id
-        }
+    async def _auth_headers(self) -> Dict[str, str]:
+        """Headers for authenticated Setu API calls"""
+        await self._get_access_token()
+        return self._headers
+
+    def _enter_circuit(self) -> bool:
+        """Fail fast while the circuit is open; returns True if this call is the half-open probe"""
+        if not self._circuit_open_until:
+            return False
+        if time.monotonic() < self._circuit_open_until or self._probe_in_flight:
+            raise CircuitOpenError("Setu API circuit breaker is open; not calling Setu")
+        self._probe_in_flight = True
+        return True
+
+    def _record_result(self, ok: bool, probe: bool) -> None:
+        """Update the circuit breaker with the outcome of a Setu call"""
+        if ok:
+            self._failures = 0
+            self._circuit_open_until = 0.0
+            return
+        self._failures += 1
+        if probe or self._failures >= FAIL_THRESHOLD:
+            logger.warning(f"⚠️  Setu API failing, opening circuit for {OPEN_SECONDS:.0f}s")
+            self._circuit_open_until = time.monotonic() + OPEN_SECONDS
+            self._failures = 0
+
+    async def _make_api_call(self, method: str, endpoint: str, data: Optional[Dict] = None, params: Optional[Dict[str, Any]] = None) -> Dict:
+        """Make authenticated API call to Setu; params with a None value are left out of the query string"""
+        method = method.upper()
+        if method not in _API_METHODS:
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        probe = self._enter_circuit()
+        try:
+            headers = await self._auth_headers()
+            url = f"{self.base_url}{endpoint}"
+
+            # Keep-alive connections come from the process-wide pool (http_pool),
+            # which the app closes on shutdown
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                response = await self._http().request(
+                    method, url, headers=headers,
+                    json=data if method != "GET" else None,
+                    params={k: v for k, v in params.items() if v is not None} if params else None,
+                    timeout=SETU_TIMEOUT
+                )
+                if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                    break
+                delay = _retry_after(response)
+                await asyncio.sleep(delay if delay is not None else _backoff_delay(attempt))
+        except httpx.HTTPError:
+            self._record_result(False, probe)
+            raise
+        finally:
+            if probe:
+                self._probe_in_flight = False
 
-        async with httpx.AsyncClient() as client:
-            if method.upper() == "GET":
-                response = await client.get(url, headers=headers)
-            elif method.upper() == "POST":
-                response = await client.post(url, headers=headers, json=data)
-            elif method.upper() == "PUT":
-                response = await client.put(url, headers=headers, json=data)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
+        # Client errors (4xx other than 429) mean Setu is up and answering
+        self._record_result(response.status_code != 429 and response.status_code < 500, probe)
 
         if response.status_code not in [200, 201, 202]:
             raise Exception(f"Setu API call failed: {response.status_code} - {response.text}")
 
         return response.json()
 
+    @contextlib.asynccontextmanager
+    async def _stream_api_call(self, method: str, endpoint: str, params: Optional[Dict[str, Any]] = None) -> AsyncIterator[httpx.Response]:
+        """
+        Streaming variant of _make_api_call: yields the response with its body
+        still unread, once Setu has answered with a success status.
+
+        Goes through the same circuit breaker, timeouts and 429 retry; a
+        transport error while the caller reads the body counts as a failure.
+        """
+        method = method.upper()
+        if method not in _API_METHODS:
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        probe = self._enter_circuit()
+        # Outcome for the circuit breaker; None if Setu was never reached
+        ok = None
+        try:
+            headers = await self._auth_headers()
+            url = f"{self.base_url}{endpoint}"
+            http = self._http()
+
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                request = http.build_request(
+                    method, url, headers=headers,
+                    params={k: v for k, v in params.items() if v is not None} if params else None,
+                    timeout=SETU_TIMEOUT
+                )
+                response = await http.send(request, stream=True)
+                if response.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+                    break
+                await response.aclose()
+                delay = _retry_after(response)
+                await asyncio.sleep(delay if delay is not None else _backoff_delay(attempt))
+
+            try:
+                # Client errors (4xx other than 429) mean Setu is up and answering
+                ok = response.status_code != 429 and response.status_code < 500
+                if response.status_code not in [200, 201, 202]:
+                    await response.aread()
+                    raise Exception(f"Setu API call failed: {response.status_code} - {response.text}")
+                yield response
+            finally:
+                await response.aclose()
+        except httpx.HTTPError:
+            ok = False
+            raise
+        finally:
+            if ok is not None:
+                self._record_result(ok, probe)
+            if probe:
+                self._probe_in_flight = False
+
     async def initiate_consent(self, mobile: str, user_id: Optional[str] = None) -> Dict[str, Any]:
         """Initiate consent for bank account linking"""
         endpoint = "/consents"  # Use /consents endpoint
@@ -123,9 +319,7 @@ class SetuService:
     async def get_consent_status(self, consent_id: str, expanded: bool = False) -> Dict[str, Any]:
         """Get consent request status"""
         endpoint = f"/consents/{consent_id}"
-        if expanded:
-            endpoint += "?expanded=true"
-        response = await self._make_api_call("GET", endpoint)
+        response = await self._make_api_call("GET", endpoint, params={"expanded": "true" if expanded else None})
         return response
 
     async def create_data_session(self, consent_id: str, from_date: Optional[str] = None, to_date: Optional[str] = None) -> Dict[str, Any]:
@@ -161,75 +355,180 @@ class SetuService:
         
         try:
             # Step 1: Create data session (POST /v2/sessions)
-            print(f"🔹 Step 1: Creating data session for consent: {consent_id}")
+            logger.info(f"🔹 Step 1: Creating data session for consent: {consent_id}")
             session = await self.create_data_session(consent_id, from_date, to_date)
             session_id = session.get("id")
 
             if not session_id:
                 raise Exception("Failed to create data session - no session ID returned")
 
-            print(f"✅ Session created: {session_id}, Initial status: {session.get('status')}")
+            logger.info(f"✅ Session created: {session_id}, Initial status: {session.get('status')}")
 
             # Step 2: Poll until session status is PARTIAL or COMPLETED
             status = session.get("status", "PENDING")
-            retries = 20
             poll_data = session
-
-            while retries > 0 and status in ["ACTIVE", "PENDING"]:
-                print(f"🔹 Step 2: Polling... Status: {status}, Retries left: {retries}")
-                await asyncio.sleep(3)  # Wait 3 seconds between polls
+            delay = POLL_INITIAL_INTERVAL
+            started = time.monotonic()
+            deadline = started + SESSION_POLL_TIMEOUT
+
+            while status in ["ACTIVE", "PENDING"] and time.monotonic() < deadline:
+                logger.info(f"🔹 Step 2: Polling in {delay:.1f}s... Status: {status}")
+                # A real wait for the FIP to deliver data; a zero-length
+                # yield here would turn the loop into a busy-poll of Setu
+                await asyncio.sleep(delay)
+                delay = min(delay * POLL_GROWTH, POLL_MAX_INTERVAL)
                 
-                poll_data = await self.fetch_fi_data(session_id)
-                status = poll_data.get("status")
+                # Read only the status while waiting; the FI payload is
+                # downloaded once, when it is ready
+                status = await self._session_status(session_id)
                 
                 if status in ["PARTIAL", "COMPLETED"]:
-                    print(f"✅ Data ready! Status: {status}")
+                    logger.info(f"✅ Data ready after {time.monotonic() - started:.1f}s! Status: {status}")
+                    poll_data = await self.fetch_fi_data(session_id)
+                    status = poll_data.get("status")
                     break
-                    
-                retries -= 1
 
             # Step 3: Check if we got data
             if status not in ["PARTIAL", "COMPLETED"]:
-                raise Exception(f"❌ Timeout or failed to fetch FI data. Final status: {status}")
+                raise Exception(f"❌ Timeout or failed to fetch FI data after {time.monotonic() - started:.1f}s. Final status: {status}")
 
-            print(f"🔹 Step 3: Successfully fetched FI data")
+            logger.info(f"🔹 Step 3: Successfully fetched FI data")
             # Return the final data
             return poll_data
 
         except Exception as e:
-            print(f"❌ Error in fetch_transactions: {e}")
+            logger.error(f"❌ Error in fetch_transactions: {e}")
             raise
 
+    async def stream_fi_accounts(self, consent_id: str, from_date: Optional[str] = None, to_date: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Like fetch_transactions, but yields the FI accounts one at a time.
+
+        With ijson installed, session polls are parsed incrementally as the
+        response streams in, so a large FI payload is never held in memory
+        as a whole; only one account object is built at a time.
+        """
+        if ijson is None:
+            fi_data = await self.fetch_transactions(consent_id, from_date, to_date)
+            for fip in fi_data.get("fips", []):
+                for account in fip.get("accounts", []):
+                    yield account
+            return
+
+        session = await self.create_data_session(consent_id, from_date, to_date)
+        session_id = session.get("id")
+        if not session_id:
+            raise Exception("Failed to create data session - no session ID returned")
+
+        status = session.get("status", "PENDING")
+        if status in FI_READY_STATUSES:
+            for fip in session.get("fips", []):
+                for account in fip.get("accounts", []):
+                    yield account
+            return
+
+        delay = POLL_INITIAL_INTERVAL
+        started = time.monotonic()
+        deadline = started + SESSION_POLL_TIMEOUT
+        while status in ["ACTIVE", "PENDING"] and time.monotonic() < deadline:
+            # Real wait between polls, as in fetch_transactions
+            await asyncio.sleep(delay)
+            delay = min(delay * POLL_GROWTH, POLL_MAX_INTERVAL)
+
+            # Accounts parsed before the status field are held until it is known
+            status = None
+            pending: List[Dict[str, Any]] = []
+            async for kind, value in self._stream_session(session_id):
+                if kind == "status":
+                    status = value
+                    if status in FI_READY_STATUSES:
+                        for account in pending:
+                            yield account
+                    pending = []
+                elif status in FI_READY_STATUSES:
+                    yield value
+                elif status is None:
+                    pending.append(value)
+
+            if status in FI_READY_STATUSES:
+                return
+
+        raise Exception(f"❌ Timeout or failed to fetch FI data after {time.monotonic() - started:.1f}s. Final status: {status}")
+
+    async def _session_status(self, session_id: str) -> Optional[str]:
+        """
+        Read just the status of a data session.
+
+        With ijson installed the response is parsed as it streams in and the
+        download is abandoned once the top-level status has been read, so
+        polls of a pending session do not pull down the whole body.
+        """
+        if ijson is None:
+            return (await self.fetch_fi_data(session_id)).get("status")
+
+        events = ijson.sendable_list()
+        parser = ijson.parse_coro(events)
+
+        async with self._stream_api_call("GET", f"/sessions/{session_id}") as response:
+            async for chunk in response.aiter_bytes():
+                parser.send(chunk)
+                for prefix, event, value in events:
+                    if prefix == "status" and event == "string":
+                        # Leaving the block closes the response mid-body
+                        return value
+                del events[:]
+
+        return None
+
+    async def _stream_session(self, session_id: str) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream GET /sessions/{id}, yielding ("status", str) and ("account", dict) as they are parsed"""
+        events = ijson.sendable_list()
+        parser = ijson.parse_coro(events, use_float=True)
+        builder = None
+
+        def drain():
+            nonlocal builder
+            parsed = []
+            for prefix, event, value in events:
+                if builder is not None:
+                    builder.event(event, value)
+                    if prefix == _FI_ACCOUNT_PREFIX and event == "end_map":
+                        parsed.append(("account", builder.value))
+                        builder = None
+                elif prefix == _FI_ACCOUNT_PREFIX and event == "start_map":
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                elif prefix == "status" and event == "string":
+                    parsed.append(("status", value))
+            del events[:]
+            return parsed
+
+        async with self._stream_api_call("GET", f"/sessions/{session_id}") as response:
+            async for chunk in response.aiter_bytes():
+                parser.send(chunk)
+                for item in drain():
+                    yield item
+
+        parser.close()
+        for item in drain():
+            yield item
+
     async def get_active_fips(self, status: Optional[str] = None, aa: Optional[str] = None, expanded: bool = False) -> Dict[str, Any]:
         """Get list of active Financial Information Providers"""
-        endpoint = "/fips"
-        params = []
-        if status:
-            params.append(f"status={status}")
-        if aa:
-            params.append(f"aa={aa}")
-        if expanded:
-            params.append("expanded=true")
-
-        if params:
-            endpoint += "?" + "&".join(params)
-
-        response = await self._make_api_call("GET", endpoint)
+        response = await self._make_api_call("GET", "/fips", params={
+            "status": status or None,
+            "aa": aa or None,
+            "expanded": "true" if expanded else None
+        })
         return response
 
     async def get_fip_by_id(self, fip_id: str, aa: Optional[str] = None, expanded: bool = False) -> Dict[str, Any]:
         """Get specific FIP details by ID"""
         endpoint = f"/fips/{fip_id}"
-        params = []
-        if aa:
-            params.append(f"aa={aa}")
-        if expanded:
-            params.append("expanded=true")
-
-        if params:
-            endpoint += "?" + "&".join(params)
-
-        response = await self._make_api_call("GET", endpoint)
+        response = await self._make_api_call("GET", endpoint, params={
+            "aa": aa or None,
+            "expanded": "true" if expanded else None
+        })
         return response
 
     async def revoke_consent(self, consent_id: str) -> Dict[str, Any]:
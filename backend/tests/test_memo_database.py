@@ -0,0 +1,155 @@
+"""Tests for the in-process semantic search cache in front of Mem0."""
+
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('hnswlib')
+pytest.importorskip('mem0')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents import memo_database
+
+DIM = 32
+
+
+def _vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def small_threshold(monkeypatch):
+    monkeypatch.setattr(memo_database._SemanticCache, 'HNSW_THRESHOLD', 16)
+
+
+def test_default_size_reaches_hnsw_threshold():
+    assert memo_database.CACHE_MAX_SIZE > memo_database._SemanticCache.HNSW_THRESHOLD
+
+
+def test_lookups_switch_to_hnsw_past_threshold(small_threshold):
+    cache = memo_database._SemanticCache(tau=0.9, max_size=64)
+    vectors = _vectors(40)
+    for i, vector in enumerate(vectors):
+        cache.put(vector, scope=i % 4, user_id=f'user{i % 2}', results=[i])
+
+    assert cache._hnsw is not None
+    for i, vector in enumerate(vectors):
+        assert cache.get(vector, scope=i % 4) == [i]
+        assert cache.get(vector, scope=(i + 1) % 4) is None
+
+    hits = cache.get_many(vectors[:5], [i % 4 for i in range(5)])
+    assert hits == [[i] for i in range(5)]
+
+
+def test_hnsw_index_dropped_below_threshold(small_threshold):
+    cache = memo_database._SemanticCache(tau=0.9, max_size=64)
+    vectors = _vectors(20, seed=1)
+    for i, vector in enumerate(vectors):
+        cache.put(vector, scope=0, user_id=f'user{i % 2}', results=[i])
+    assert cache._hnsw is not None
+
+    cache.invalidate_user('user0')
+
+    assert cache._hnsw is None
+    assert cache.get(vectors[1], scope=0) == [1]
+    assert cache.get(vectors[0], scope=0) is None
+
+
+def test_hnsw_index_rebuilt_after_eviction_churn(small_threshold):
+    cache = memo_database._SemanticCache(tau=0.9, max_size=20)
+    vectors = _vectors(200, seed=2)
+    for i, vector in enumerate(vectors):
+        cache.put(vector, scope=0, user_id=None, results=[i])
+
+    assert len(cache._ids) == 20
+    assert cache._hnsw.get_current_count() <= 4 * len(cache._ids)
+    assert cache.get(vectors[-1], scope=0) == [199]
+
+
+class _FakeMemoryClient:
+    """Stands in for mem0.MemoryClient: one memory store, no network."""
+
+    def __init__(self, api_key=None):
+        self.memories = {'mem_1': {'id': 'mem_1', 'memory': 'Prefers index funds', 'user_id': 'alice'}}
+        self.searches = 0
+        self.bare_list = False
+
+    def get_all(self, user_id=None, limit=100):
+        results = [dict(m) for m in self.memories.values() if m['user_id'] == user_id][:limit]
+        return results if self.bare_list else {'results': results}
+
+    def search(self, query, filters=None, limit=10, rerank=True):
+        self.searches += 1
+        return {'results': [dict(m) for m in self.memories.values()]}
+
+    def update(self, memory_id, text=None, metadata=None):
+        self.memories[memory_id]['memory'] = text
+        return {'id': memory_id}
+
+    def delete(self, memory_id):
+        del self.memories[memory_id]
+        return {'message': 'deleted'}
+
+
+def _fake_embed(text):
+    rng = np.random.default_rng(abs(hash(text)) % 2**32)
+    vector = rng.standard_normal(DIM).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def memory(monkeypatch):
+    monkeypatch.setattr(memo_database, 'MemoryClient', _FakeMemoryClient)
+    monkeypatch.setattr(memo_database, '_local_embed', _fake_embed)
+    return memo_database.FinancialCoachMemory(api_key='test', semantic_cache=True, disk_cache_path=None)
+
+
+@pytest.mark.parametrize('search_kwargs', [
+    {'user_id': 'alice'},
+    {'filters': {'AND': [{'user_id': 'alice'}]}},
+])
+def test_update_memory_invalidates_cached_search(memory, search_kwargs):
+    first = memory.search_memories('investment preferences', **search_kwargs)
+    assert memory.search_memories('investment preferences', **search_kwargs).get('cached')
+
+    assert memory.update_memory('mem_1', text='Prefers gold ETFs')['success']
+
+    result = memory.search_memories('investment preferences', **search_kwargs)
+    assert not result.get('cached')
+    assert [m['memory'] for m in result['results']] == ['Prefers gold ETFs']
+    assert first['results'][0]['memory'] == 'Prefers index funds'
+
+
+def test_delete_memory_invalidates_cached_search(memory):
+    memory.search_memories('investment preferences', user_id='alice')
+
+    assert memory.delete_memory('mem_1')['success']
+
+    result = memory.search_memories('investment preferences', user_id='alice')
+    assert result['results'] == []
+
+
+@pytest.mark.parametrize('bare_list', [False, True])
+def test_get_user_context_lists_memories_for_both_response_shapes(memory, bare_list):
+    memory.client.bare_list = bare_list
+
+    context = memory.get_user_context('alice')
+
+    assert context['success']
+    assert [m['id'] for m in context['raw_memories']] == ['mem_1']
+
+
+@pytest.mark.parametrize('insights, expected', [
+    ({}, 'Session completed'),
+    ({'spending_summary': {}}, 'Spending: ₹0'),
+    ({'spending_summary': {'total_spent': 1200, 'top_category': None}}, 'Spending: ₹1200; Top category: None'),
+    ({'goals_summary': {}, 'recommendations': []}, 'Goals: 0 on track, 0 at risk'),
+    ({'recommendations': ['a', 'b']}, 'Recommendations given: 2'),
+])
+def test_format_insights(memory, insights, expected):
+    assert memory._format_insights(insights) == expected
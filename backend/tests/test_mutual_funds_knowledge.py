@@ -0,0 +1,88 @@
+"""
+Regression tests for preferred-sector matching in the mutual funds knowledge base.
+
+The reference below is the substring check the bitmask filter replaced: a
+fund matched when any lowercased term appeared in its comma-joined tags.
+"""
+
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from agents import mutual_funds_knowledge as mfk
+
+RISK_PROFILES = ('low', 'moderate', 'high', 'very_high')
+HORIZONS = ('short', 'medium', 'long')
+CATEGORY_PREFERENCES = (None, 'equity', 'commodity')
+
+# Every tag and sector name, plus partial and unknown terms
+TERMS = sorted(mfk._TAG_BIT) + ['cap', 'it', 'old', 'high', 'core', 'xyz']
+
+
+def _old_sector_match(fund, terms):
+    tags_lower = ','.join(fund.get('tags', [])).lower()
+    return any(s in tags_lower for s in terms)
+
+
+def _sector_queries():
+    yield from ((t,) for t in TERMS)
+    yield from itertools.combinations(('it', 'gold', 'cap', 'banking', 'xyz'), 2)
+
+
+@pytest.mark.parametrize('terms', list(_sector_queries()))
+def test_query_mask_matches_substring_semantics(terms):
+    sector_mask = mfk._query_mask(terms)
+    for fund in mfk._FLAT_FUNDS:
+        assert bool(fund['_tag_mask'] & sector_mask) == _old_sector_match(fund, terms), (
+            fund['scheme_name'], terms
+        )
+
+
+@pytest.mark.parametrize('vectorized', [False, True])
+def test_scan_matches_substring_semantics(vectorized):
+    if vectorized and mfk._FUND_ARRAYS is None:
+        pytest.skip('NumPy is not installed')
+
+    kb = mfk.mf_knowledge
+    scan = kb._filter_and_score_vectorized if vectorized else kb._filter_and_score
+
+    for risk, horizon, preference in itertools.product(RISK_PROFILES, HORIZONS, CATEGORY_PREFERENCES):
+        unfiltered = scan(risk, horizon, None, preference, None)
+        for terms in _sector_queries():
+            expected = {id(fund) for _, fund in unfiltered if _old_sector_match(fund, terms)}
+            result = scan(risk, horizon, mfk._query_mask(terms), preference, None)
+            assert {id(fund) for _, fund in result} == expected, (risk, horizon, preference, terms)
+
+
+@pytest.fixture
+def funds_json(tmp_path, monkeypatch):
+    path = tmp_path / 'funds.json'
+    path.write_text('{"meta": {"version": "test"}, "categories": []}')
+    monkeypatch.setattr(mfk, 'FUNDS_JSON_PATH', str(path))
+    monkeypatch.delenv('MF_DISABLE_PKL_CACHE', raising=False)
+    return path
+
+
+@pytest.mark.parametrize('snapshot', [
+    b'c' + mfk.__name__.encode() + b'\nNoSuchClass\n.',  # AttributeError on load
+    b'cno_such_module\nthing\n.',                         # ImportError on load
+    b'not a pickle',
+])
+def test_unreadable_snapshot_falls_back_to_json(funds_json, snapshot):
+    funds_json.with_suffix('.pkl').write_bytes(snapshot)
+
+    assert mfk._load_funds_data()['meta'] == {'version': 'test'}
+    # The snapshot is rewritten from the JSON and used next time
+    assert mfk._load_funds_data()['meta'] == {'version': 'test'}
+
+
+def test_snapshot_is_ignored_once_json_changes(funds_json):
+    mfk._load_funds_data()
+    funds_json.write_text('{"meta": {"version": "newer"}, "categories": []}')
+    os.utime(funds_json, ns=(0, 0))
+
+    assert mfk._load_funds_data()['meta'] == {'version': 'newer'}
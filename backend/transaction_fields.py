@@ -0,0 +1,30 @@
+"""
+Derived and normalized fields stored on transaction documents.
+
+Kept free of Firebase/CrewAI imports so producers (firestore_service, the
+ingest scripts) and the categorization agent can share one definition.
+"""
+
+from typing import Optional
+
+
+def normalize_merchant(merchant) -> str:
+    """Normalize a merchant name into the key stored as `merchant_normalized`."""
+    return (merchant or "").casefold().strip()
+
+
+def normalize_amount(amount) -> Optional[float]:
+    """
+    Transaction amount as a float, or None if it is not numeric.
+
+    Setu sends amounts as strings ("1,250.00"); Firestore sum() aggregations
+    skip non-numeric values, so amounts are stored as numbers.
+    """
+    if isinstance(amount, bool):
+        return None
+    if isinstance(amount, str):
+        amount = amount.replace(',', '').strip()
+    try:
+        return float(amount)
+    except (TypeError, ValueError):
+        return None
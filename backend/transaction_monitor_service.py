@@ -11,14 +11,20 @@ Usage:
 """
 
 import os
+import logging
+import logging.handlers
+import queue
+import random
 import sys
 import time
 from datetime import datetime
-from typing import Dict, Any, Set
+from typing import Dict, Any
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.cloud.firestore import FieldFilter
 import asyncio
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from itertools import chain
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -26,8 +32,53 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # Import the AI processing service
 from crewai_service import process_transaction_ai
 
-# Track processed transactions to avoid duplicates
-processed_transactions: Set[str] = set()
+logger = logging.getLogger("finpath.monitor")
+
+# Transactions fetched per user on each poll
+PENDING_BATCH_SIZE = 100
+
+# Matches transactions still waiting for AI categorization
+UNCATEGORIZED_FILTER = FieldFilter('uncategorized', '==', True)
+
+# Transactions processed at once; bounds concurrent Gemini calls
+PROCESS_CONCURRENCY = 5
+_process_semaphore = asyncio.Semaphore(PROCESS_CONCURRENCY)
+
+# Seconds between heartbeat messages while the listener is idle
+HEARTBEAT_INTERVAL = 60
+
+# Transaction IDs remembered as processed; the oldest are forgotten past this
+PROCESSED_CACHE_SIZE = 10_000
+
+class LRUSet:
+    """
+    Set of strings that keeps only the most recently added cap entries.
+    
+    total counts every new key ever added, including ones since evicted.
+    """
+    
+    def __init__(self, cap: int):
+        self._d = OrderedDict()
+        self._cap = cap
+        self.total = 0
+    
+    def add(self, key: str):
+        if key in self._d:
+            self._d.move_to_end(key)
+            return
+        self._d[key] = None
+        self.total += 1
+        if len(self._d) > self._cap:
+            self._d.popitem(last=False)
+    
+    def __contains__(self, key) -> bool:
+        return key in self._d
+    
+    def __len__(self) -> int:
+        return len(self._d)
+
+# Track processed transactions to avoid duplicates, in bounded memory
+processed_transactions = LRUSet(PROCESSED_CACHE_SIZE)
 user_last_processed: Dict[str, datetime] = {}
 
 # Initialize Firebase
@@ -50,6 +101,22 @@ def initialize_firebase():
             print(f"❌ Firebase initialization error: {e}")
             sys.exit(1)
 
+def _configure_logging() -> logging.handlers.QueueListener:
+    """
+    Route monitor logs through a QueueHandler so concurrent workers only
+    enqueue records; a background QueueListener does the stdout writes.
+    Returns the listener so main() can flush it before exiting.
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+    return listener
+
 def get_all_users(db) -> list:
     """
     Get all user IDs from Firestore.
@@ -64,7 +131,7 @@ def get_all_users(db) -> list:
         
         # If no user documents exist, try to find users by scanning collection groups
         if not user_ids:
-            print("⚠️  No user documents found, scanning for users with transactions...")
+            logger.warning("⚠️  No user documents found, scanning for users with transactions...")
             # Get all transactions across all users using collection group query
             all_transactions = db.collection_group('transactions').limit(100).stream()
             user_ids_set = set()
@@ -75,60 +142,110 @@ def get_all_users(db) -> list:
                     user_ids_set.add(path_parts[1])
             user_ids = list(user_ids_set)
             if user_ids:
-                print(f"✅ Found {len(user_ids)} user(s) with transactions: {user_ids}")
+                logger.info(f"✅ Found {len(user_ids)} user(s) with transactions: {user_ids}")
         
         return user_ids
     except Exception as e:
-        print(f"⚠️  Error fetching users: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"⚠️  Error fetching users: {e}")
         return []
 
+# Seconds the user list from get_all_users is reused before it is re-read
+USER_CACHE_TTL = 60
+
+# (user IDs, time.monotonic() when fetched)
+_user_cache = ([], 0.0)
+
+def get_all_users_cached(db, ttl: float = USER_CACHE_TTL) -> list:
+    """get_all_users, re-read from Firestore at most once every ttl seconds."""
+    global _user_cache
+    users, fetched_at = _user_cache
+    if fetched_at and time.monotonic() - fetched_at < ttl:
+        return users
+    users = get_all_users(db)
+    _user_cache = (users, time.monotonic())
+    return users
+
+# users/{user_id}/transactions references, built once per user
+_txn_refs: Dict[str, Any] = {}
+
+def _txn_ref(db, user_id: str):
+    """Return the user's transactions CollectionReference, reusing it across polls."""
+    ref = _txn_refs.get(user_id)
+    if ref is None:
+        ref = db.collection('users').document(user_id).collection('transactions')
+        _txn_refs[user_id] = ref
+    return ref
+
+def _pending_transaction(doc, user_id: str):
+    """
+    Return the monitor's record for a transaction document that still needs
+    AI processing, or None if it was already processed or categorized.
+    
+    Producers store a provisional keyword category along with
+    uncategorized=True, so only categorized_at (written by the
+    categorization agent) marks a transaction as done.
+    """
+    txn_id = doc.id
+    
+    # Skip if already processed
+    if txn_id in processed_transactions:
+        return None
+    
+    txn_data = doc.to_dict() or {}
+    
+    # Skip if it has categorized_at (already categorized)
+    if 'categorized_at' in txn_data:
+        processed_transactions.add(txn_id)
+        return None
+    
+    return {
+        'id': txn_id,
+        'data': txn_data,
+        'user_id': user_id
+    }
+
 def check_new_transactions(db, user_id: str) -> list:
     """
     Check for new transactions for a specific user.
     Returns list of new transactions that haven't been categorized.
     """
     try:
-        transactions_ref = db.collection('users').document(user_id).collection('transactions')
+        transactions_ref = _txn_ref(db, user_id)
         
-        # Get all transactions and filter in memory
-        # (Firestore can't efficiently query for missing fields)
-        all_transactions = transactions_ref.stream()
+        # Only transactions written with uncategorized=True, which the
+        # categorization agent flips to False once it has run. The query
+        # returns IDs only; full documents are fetched just for the ones
+        # not already in processed_transactions
+        pending_refs = [
+            doc.reference
+            for doc in (
+                transactions_ref
+                .where(filter=UNCATEGORIZED_FILTER)
+                .select([])
+                .limit(PENDING_BATCH_SIZE)
+                .stream()
+            )
+            if doc.id not in processed_transactions
+        ]
+        if not pending_refs:
+            return []
         
         new_transactions = []
-        for doc in all_transactions:
-            txn_data = doc.to_dict()
-            txn_id = doc.id
-            
-            # Skip if already processed
-            if txn_id in processed_transactions:
-                continue
-            
-            # Skip if it has a category (already categorized)
-            if 'category' in txn_data:
-                processed_transactions.add(txn_id)
-                continue
-            
-            # Skip if it has categorized_at (already categorized)
-            if 'categorized_at' in txn_data:
-                processed_transactions.add(txn_id)
-                continue
-            
-            new_transactions.append({
-                'id': txn_id,
-                'data': txn_data,
-                'user_id': user_id
-            })
+        for doc in db.get_all(pending_refs):
+            txn = _pending_transaction(doc, user_id)
+            if txn is not None:
+                new_transactions.append(txn)
         
         return new_transactions
         
     except Exception as e:
-        print(f"⚠️  Error checking transactions for user {user_id}: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"⚠️  Error checking transactions for user {user_id}: {e}")
         return []
 
+def _retry_delay(retry_count: int) -> float:
+    """Backoff before rate-limit retry number retry_count: exponential, capped at 30s, with up to 50% jitter."""
+    return min(30.0, 1.0 * 2 ** retry_count) * (1 + random.random() * 0.5)
+
 async def process_transaction(user_id: str, transaction_id: str, transaction_data: Dict[str, Any], max_retries: int = 3):
     """Process a single transaction with AI categorization and anomaly detection."""
     retry_count = 0
@@ -136,81 +253,140 @@ async def process_transaction(user_id: str, transaction_id: str, transaction_dat
     while retry_count <= max_retries:
         try:
             if retry_count == 0:
-                print(f"\n🔔 New transaction detected!")
-                print(f"   User: {user_id}")
-                print(f"   Transaction: {transaction_id}")
-                print(f"   Amount: ₹{transaction_data.get('amount', 0)}")
-                print(f"   Merchant: {transaction_data.get('merchant', 'N/A')}")
-                print(f"   Description: {transaction_data.get('description', 'N/A')[:60]}...")
+                logger.info(
+                    f"\n🔔 New transaction detected!\n"
+                    f"   User: {user_id}\n"
+                    f"   Transaction: {transaction_id}\n"
+                    f"   Amount: ₹{transaction_data.get('amount', 0)}\n"
+                    f"   Merchant: {transaction_data.get('merchant', 'N/A')}\n"
+                    f"   Description: {transaction_data.get('description', 'N/A')[:60]}..."
+                )
             else:
-                print(f"🔄 Retry attempt {retry_count}/{max_retries} for transaction {transaction_id}")
+                logger.info(f"🔄 Retry attempt {retry_count}/{max_retries} for transaction {transaction_id}")
 
             # Use the centralized CrewAI service for sequential processing
-            print(f"🤖 Starting AI processing (categorization + anomaly detection)...")
+            logger.info(f"🤖 Starting AI processing (categorization + anomaly detection)...")
             result = await process_transaction_ai(user_id, transaction_id, transaction_data)
 
             # Check overall status
             if result.get('status') == 'completed':
                 # Mark as processed only on success
                 processed_transactions.add(transaction_id)
-                print(f"✅ AI processing completed successfully!")
-                print(f"   Categorization: ✅")
-                if result.get('anomaly', {}).get('status') == 'completed':
-                    print(f"   Anomaly Detection: ✅")
-                else:
-                    print(f"   Anomaly Detection: ⚠️ (Failed but retried)")
-                print("-" * 70)
+                anomaly_status = "✅" if result.get('anomaly', {}).get('status') == 'completed' else "⚠️ (Failed but retried)"
+                logger.info(
+                    f"✅ AI processing completed successfully for {transaction_id}!\n"
+                    f"   Categorization: ✅\n"
+                    f"   Anomaly Detection: {anomaly_status}\n" + "-" * 70
+                )
                 return True
             else:
                 error_msg = result.get('error', 'Unknown error')
-                print(f"⚠️  AI processing failed: {error_msg}")
+                logger.warning(f"⚠️  AI processing failed: {error_msg}")
 
                 # Check if it's a rate limit error that might be resolved with retry
                 if "RATE_LIMIT_RETRY" in str(error_msg) or "429" in str(error_msg):
                     retry_count += 1
                     if retry_count <= max_retries:
-                        print(f"⏳ Waiting 5 seconds before retry...")
-                        await asyncio.sleep(5)
+                        delay = _retry_delay(retry_count)
+                        logger.info(f"⏳ Waiting {delay:.1f} seconds before retry...")
+                        await asyncio.sleep(delay)
                         continue
 
                 # For other errors, don't retry
-                print(f"❌ AI processing failed permanently: {error_msg}")
-                print("-" * 70)
+                logger.error(f"❌ AI processing failed permanently for {transaction_id}: {error_msg}\n" + "-" * 70)
                 return False
 
         except Exception as e:
             error_str = str(e)
-            print(f"⚠️  Error processing transaction {transaction_id}: {e}")
+            logger.warning(f"⚠️  Error processing transaction {transaction_id}: {e}")
 
             # Check if we should retry
             if "RATE_LIMIT_RETRY" in error_str or "429" in error_str:
                 retry_count += 1
                 if retry_count <= max_retries:
-                    print(f"⏳ Waiting 5 seconds before retry...")
-                    await asyncio.sleep(5)
+                    delay = _retry_delay(retry_count)
+                    logger.info(f"⏳ Waiting {delay:.1f} seconds before retry...")
+                    await asyncio.sleep(delay)
                     continue
 
             # For other errors, don't retry
-            print(f"❌ Failed permanently")
-            print("-" * 70)
+            logger.error(f"❌ Failed permanently: {transaction_id}\n" + "-" * 70)
             return False
 
-    print(f"❌ Max retries ({max_retries}) exceeded for transaction {transaction_id}")
-    print("-" * 70)
+    logger.error(f"❌ Max retries ({max_retries}) exceeded for transaction {transaction_id}\n" + "-" * 70)
     return False
 
-async def monitor_transactions(db, check_interval: int = 5):
+async def process_transactions(transactions: list):
+    """Process new transactions concurrently, at most PROCESS_CONCURRENCY at a time."""
+    async def _run(txn):
+        async with _process_semaphore:
+            return await process_transaction(txn['user_id'], txn['id'], txn['data'])
+    
+    return await asyncio.gather(*(_run(txn) for txn in transactions), return_exceptions=True)
+
+async def monitor_transactions(db):
+    """
+    Main monitoring loop, driven by a Firestore listener.
+    
+    A collection-group snapshot listener on every user's uncategorized
+    transactions pushes them as they are written, so the loop sleeps until
+    there is work instead of re-reading Firestore on a timer. The first
+    snapshot delivers the ones left uncategorized while the service was down.
+    
+    Args:
+        db: Firestore client
+    """
+    logger.info(f"\n👂 Listening to Firestore for new transactions...")
+    logger.info(f"   Press Ctrl+C to stop")
+    logger.info("=" * 70)
+    
+    loop = asyncio.get_running_loop()
+    changes_queue: asyncio.Queue = asyncio.Queue()
+    
+    # Called on the listener's background thread; hand the changes to the loop
+    def on_snapshot(_docs, changes, _read_time):
+        loop.call_soon_threadsafe(changes_queue.put_nowait, changes)
+    
+    watch = db.collection_group('transactions').where(filter=UNCATEGORIZED_FILTER).on_snapshot(on_snapshot)
+    try:
+        while True:
+            try:
+                changes = await asyncio.wait_for(changes_queue.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                # Heartbeat - show we're still running
+                logger.info(f"💚 Monitoring... [{datetime.now().strftime('%H:%M:%S')}] - {processed_transactions.total} transactions processed so far")
+                continue
+            
+            new_transactions = []
+            for change in changes:
+                if change.type.name == 'REMOVED':
+                    continue
+                # Path: users/{user_id}/transactions/{txn_id}
+                path_parts = change.document.reference.path.split('/')
+                if len(path_parts) != 4 or path_parts[0] != 'users':
+                    continue
+                txn = _pending_transaction(change.document, path_parts[1])
+                if txn is not None:
+                    new_transactions.append(txn)
+            
+            if new_transactions:
+                logger.info(f"\n🎯 Found {len(new_transactions)} new transaction(s) to process")
+                await process_transactions(new_transactions)
+    finally:
+        watch.unsubscribe()
+
+async def poll_transactions(db, check_interval: int = 5):
     """
-    Main monitoring loop that checks for new transactions periodically.
+    Fallback monitoring loop that checks for new transactions periodically.
     
     Args:
         db: Firestore client
         check_interval: Seconds between checks (default: 5)
     """
-    print(f"\n👀 Monitoring Firestore for new transactions...")
-    print(f"   Check interval: {check_interval} seconds")
-    print(f"   Press Ctrl+C to stop")
-    print("=" * 70)
+    logger.info(f"\n👀 Monitoring Firestore for new transactions...")
+    logger.info(f"   Check interval: {check_interval} seconds")
+    logger.info(f"   Press Ctrl+C to stop")
+    logger.info("=" * 70)
     
     iteration = 0
     
@@ -218,45 +394,39 @@ async def monitor_transactions(db, check_interval: int = 5):
         try:
             iteration += 1
             
-            # Get all users
-            user_ids = get_all_users(db)
+            # Get all users (blocking Firestore reads run off the event loop)
+            user_ids = await asyncio.to_thread(get_all_users_cached, db)
             
             if not user_ids and iteration == 1:
-                print("⚠️  No users found in Firestore")
+                logger.warning("⚠️  No users found in Firestore")
             
-            # Check each user for new transactions
-            all_new_transactions = []
-            for user_id in user_ids:
-                new_txns = check_new_transactions(db, user_id)
-                all_new_transactions.extend(new_txns)
+            # Check all users for new transactions in parallel
+            per_user = await asyncio.gather(*(
+                asyncio.to_thread(check_new_transactions, db, user_id)
+                for user_id in user_ids
+            ))
+            all_new_transactions = list(chain.from_iterable(per_user))
             
             # Process new transactions
             if all_new_transactions:
-                print(f"\n🎯 Found {len(all_new_transactions)} new transaction(s) to process")
+                logger.info(f"\n🎯 Found {len(all_new_transactions)} new transaction(s) to process")
                 
-                # Process transactions sequentially
-                for txn in all_new_transactions:
-                    await process_transaction(
-                        txn['user_id'],
-                        txn['id'],
-                        txn['data']
-                    )
+                await process_transactions(all_new_transactions)
             else:
                 # Heartbeat - show we're still running
                 if iteration % 12 == 0:  # Every minute (if check_interval=5)
-                    print(f"💚 Monitoring... [{datetime.now().strftime('%H:%M:%S')}] - {len(processed_transactions)} transactions processed so far")
+                    logger.info(f"💚 Monitoring... [{datetime.now().strftime('%H:%M:%S')}] - {processed_transactions.total} transactions processed so far")
             
-            # Wait before next check
+            # Wait before next check: a real interval between Firestore reads,
+            # not a yield (monitor_transactions needs no timer at all)
             await asyncio.sleep(check_interval)
             
         except KeyboardInterrupt:
-            print("\n\n⏹️  Stopping monitor service...")
+            logger.info("\n\n⏹️  Stopping monitor service...")
             break
         except Exception as e:
-            print(f"\n❌ Error in monitor loop: {e}")
-            import traceback
-            traceback.print_exc()
-            print(f"   Retrying in {check_interval} seconds...")
+            logger.exception(f"\n❌ Error in monitor loop: {e}")
+            logger.info(f"   Retrying in {check_interval} seconds...")
             await asyncio.sleep(check_interval)
 
 def main():
@@ -283,24 +453,33 @@ def main():
     
     # Get monitoring settings
     print("\n⚙️  Configuration:")
-    check_interval = input("   Check interval in seconds (default: 5): ").strip()
-    try:
-        check_interval = int(check_interval) if check_interval else 5
-    except ValueError:
-        check_interval = 5
-    
-    print(f"   ✓ Will check for new transactions every {check_interval} seconds")
+    use_polling = input("   Poll on an interval instead of listening for changes? (y/n, default: n): ").strip().lower() == 'y'
+    if use_polling:
+        check_interval = input("   Check interval in seconds (default: 5): ").strip()
+        try:
+            check_interval = int(check_interval) if check_interval else 5
+        except ValueError:
+            check_interval = 5
+        
+        print(f"   ✓ Will check for new transactions every {check_interval} seconds")
+        monitor = poll_transactions(db, check_interval)
+    else:
+        print(f"   ✓ Will process new transactions as soon as they are written")
+        monitor = monitor_transactions(db)
     print()
     
     # Start monitoring
+    listener = _configure_logging()
     try:
-        asyncio.run(monitor_transactions(db, check_interval))
+        asyncio.run(monitor)
     except KeyboardInterrupt:
         print("\n👋 Goodbye!")
+    finally:
+        listener.stop()
     
     print()
     print("=" * 70)
-    print(f"✅ Service stopped. Processed {len(processed_transactions)} transactions total.")
+    print(f"✅ Service stopped. Processed {processed_transactions.total} transactions total.")
     print("=" * 70)
 
 if __name__ == "__main__":